@@ -0,0 +1,224 @@
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fuzzer_cov.commands.libfuzzer import Opts, create_container
+from fuzzer_cov.core import CommandExecutor
+from fuzzer_cov.platform.covstore import lcov_to_store, store_to_lcov
+from fuzzer_cov.platform.demangle import CxxFiltDemangler
+from fuzzer_cov.platform.lcov import filter_lcov_file
+from fuzzer_cov.platform.tracefile import merge_tracefiles, read_tracefile
+
+from benchmarks.synthetic import generate_tracefile, generate_tracefiles, generate_project, build_project
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCALES = {
+    'small': { 'files': 200, 'functions': 20, 'lines': 10, 'branches': 2, 'shards': 4,
+        'project_files': 4, 'project_functions': 20, 'corpus': 200, 'output_lines': 100000 },
+    'medium': { 'files': 2000, 'functions': 30, 'lines': 12, 'branches': 3, 'shards': 8,
+        'project_files': 16, 'project_functions': 50, 'corpus': 2000, 'output_lines': 1000000 },
+    'large': { 'files': 10000, 'functions': 40, 'lines': 15, 'branches': 4, 'shards': 16,
+        'project_files': 64, 'project_functions': 100, 'corpus': 20000, 'output_lines': 5000000 },
+}
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo_dir,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def bench_opts(work_dir: str, executor: str='async') -> Opts:
+    opts = Opts()
+    opts.fuzzer_path = opts.source_dir = opts.output_dir = work_dir
+    opts.lcov_output_dir = os.path.join(work_dir, 'lcov')
+    opts.gen_html_output_dir = os.path.join(work_dir, 'web')
+    opts.shard_output_dir = os.path.join(work_dir, 'shards')
+    opts.executor = executor
+    return opts
+
+class Suite(object):
+    def __init__(self, work_dir: str, params: dict, repeat: int):
+        self.work_dir = work_dir
+        self.params = params
+        self.repeat = repeat
+        self.results = {}
+
+    def measure(self, name: str, fn, setup=None):
+        seconds, counts = [], {}
+        for _ in range(self.repeat):
+            if setup is not None:
+                setup()
+            begin = time.perf_counter()
+            counts = fn() or {}
+            seconds.append(time.perf_counter() - begin)
+        self.results[name] = {
+            'seconds': seconds,
+            'min': min(seconds),
+            'median': statistics.median(seconds),
+            'counts': counts,
+        }
+        print(f"{name:<28} median {self.results[name]['median']:>9.3f}s  min {self.results[name]['min']:>9.3f}s  {counts}",
+            file=sys.stderr)
+
+    def tracefile_kwargs(self):
+        return { key: self.params[key] for key in ('files', 'functions', 'lines', 'branches') }
+
+    def bench_tracefiles(self):
+        trace_dir = os.path.join(self.work_dir, 'traces')
+        shards = generate_tracefiles(trace_dir, self.params['shards'], **self.tracefile_kwargs())
+        tracefile = shards[0]
+        size = os.path.getsize(tracefile)
+        output_file = os.path.join(self.work_dir, 'filtered.info')
+
+        self.measure('tracefile.read', lambda: { 'records': sum(1 for _ in read_tracefile(tracefile)), 'bytes': size })
+        self.measure('tracefile.filter', lambda: filter_lcov_file(tracefile, output_file))
+        self.measure('tracefile.merge', lambda: {
+            'source_files': len(merge_tracefiles(shards, os.path.join(self.work_dir, 'merged.info')).files),
+            'bytes': sum(map(os.path.getsize, shards)),
+        })
+        store_file = os.path.join(self.work_dir, 'trace.fzcov')
+        self.measure('store.import', lambda: { 'source_files': lcov_to_store(tracefile, store_file) })
+        self.measure('store.export', lambda: store_to_lcov(store_file, os.path.join(self.work_dir, 'export.info')))
+
+    def bench_demangle(self):
+        if shutil.which('c++filt') is None:
+            print("c++filt not found, skipping demangle benchmark", file=sys.stderr)
+            return
+        symbols = [name for record in read_tracefile(os.path.join(self.work_dir, 'traces', 'trace.0.info'))
+            for name in record.functions]
+        def run():
+            demangler = CxxFiltDemangler()
+            try:
+                demangler.demangle_all(symbols)
+                return demangler.stats()
+            finally:
+                demangler.close()
+        self.measure('demangle.batch', run)
+
+    def bench_executor(self):
+        cmd = [sys.executable, '-c', f"import sys\nfor i in range({self.params['output_lines']}): sys.stdout.write('Running: %08d\\n' % i)"]
+        for executor in ('async', 'subprocess'):
+            container = create_container(bench_opts(self.work_dir, executor))
+            try:
+                cmd_executor = container.resolve(CommandExecutor)
+                self.measure(f"executor.{executor}", lambda: { 'lines': len(cmd_executor.exec(cmd, silent=1)[1]) })
+                self.measure(f"executor.{executor}.many", lambda: {
+                    'commands': len(cmd_executor.exec_many([cmd] * 4, silent=1)) })
+            finally:
+                container.close()
+
+    def bench_pipeline(self, jobs: int):
+        if shutil.which('g++') is None or shutil.which('gcov') is None:
+            print("g++/gcov not found, skipping pipeline benchmark", file=sys.stderr)
+            return
+        project_dir = os.path.join(self.work_dir, 'project')
+        generate_project(project_dir, files=self.params['project_files'],
+            functions=self.params['project_functions'], corpus=self.params['corpus'])
+        fuzzer_path = build_project(project_dir)
+        output_dir = os.path.join(self.work_dir, 'pipeline')
+        cmd = [sys.executable, '-m', 'fuzzer_cov.commands.libfuzzer', '--fuzzer', fuzzer_path,
+            '-s', project_dir, '-o', output_dir, '-c', os.path.join(project_dir, 'corpus'),
+            '--capture-backend', 'gcov', '--report-backend', 'native', '-j', str(jobs)]
+        def run():
+            subprocess.check_call(cmd, cwd=repo_dir, stdout=subprocess.DEVNULL)
+            return { 'inputs': self.params['corpus'], 'jobs': jobs }
+        self.measure('pipeline.total', run, setup=lambda: shutil.rmtree(output_dir, ignore_errors=True))
+        # per-stage times of the last run, from its span metrics
+        stages = {}
+        with open(os.path.join(output_dir, 'metrics.jsonl'), 'r') as f:
+            for line in f:
+                record = json.loads(line)
+                stages[record['span']] = stages.get(record['span'], 0.0) + record['wall']
+        for span, wall in stages.items():
+            self.results[f"pipeline.{span}"] = { 'seconds': [wall], 'min': wall, 'median': wall, 'counts': {} }
+
+def compare(baseline_file: str, results: dict, threshold: float):
+    with open(baseline_file, 'r') as f:
+        baseline = json.load(f)
+    print(f"{'benchmark':<28} {baseline['commit']:>10} {results['commit']:>10}   ratio")
+    regressions = 0
+    for name, result in results['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        ratio = result['median'] / old['median'] if old['median'] > 0 else float('inf')
+        flag = '  REGRESSION' if ratio > 1 + threshold else ''
+        regressions += 1 if flag else 0
+        print(f"{name:<28} {old['median']:>9.3f}s {result['median']:>9.3f}s {ratio:>7.2f}x{flag}")
+    return regressions
+
+def main():
+    p = argparse.ArgumentParser()
+    p.prog = 'benchmarks.run'
+    p.add_argument("--scale", type=str, choices=sorted(SCALES), default='small',
+        help="Size preset of the synthetic inputs")
+    p.add_argument("--only", type=str, action='append', default=[],
+        choices=['tracefile', 'demangle', 'executor', 'pipeline'],
+        help="Run only these benchmark groups, may be repeated")
+    p.add_argument("--repeat", type=int, default=3,
+        help="Runs per benchmark, the median is compared")
+    p.add_argument("-j", "--jobs", type=int, default=4,
+        help="Shards of the end-to-end pipeline run")
+    p.add_argument("-o", "--output", type=str, default=None,
+        help="Result file (default: benchmarks/results/<commit>-<scale>.json)")
+    p.add_argument("--compare", type=str, default=None,
+        help="Compare against a previous result file, exit non-zero on regressions")
+    p.add_argument("--threshold", type=float, default=0.1,
+        help="Relative slowdown of the median counted as a regression")
+    p.add_argument("--keep", action='store_true', default=False,
+        help="Keep the generated work directory")
+    args = p.parse_args()
+
+    groups = args.only or ['tracefile', 'demangle', 'executor', 'pipeline']
+    params = SCALES[args.scale]
+    work_dir = tempfile.mkdtemp(prefix='fuzzer-cov-bench-')
+    suite = Suite(work_dir, params, args.repeat)
+    try:
+        if 'tracefile' in groups or 'demangle' in groups:
+            suite.bench_tracefiles()
+        if 'demangle' in groups:
+            suite.bench_demangle()
+        if 'executor' in groups:
+            suite.bench_executor()
+        if 'pipeline' in groups:
+            suite.bench_pipeline(args.jobs)
+    finally:
+        if args.keep:
+            print(f"work directory: {work_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    commit = git_commit()
+    results = {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'scale': args.scale,
+        'params': params,
+        'repeat': args.repeat,
+        'results': suite.results,
+    }
+    output_file = args.output or os.path.join(repo_dir, 'benchmarks', 'results', f"{commit}-{args.scale}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    with open(output_file, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output_file}", file=sys.stderr)
+
+    if args.compare:
+        return 1 if compare(args.compare, results, args.threshold) else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+
+import os
+import random
+import subprocess
+
+from fuzzer_cov.platform.tracefile import write_tracefile_record
+
+def mangle(*names, params='i') -> str:
+    # Itanium mangled name of a function nested in namespaces, e.g.
+    # _ZN5bench4mod03fn0Ei for bench::mod0::fn0(int)
+    return '_ZN' + ''.join(f"{len(name)}{name}" for name in names) + 'E' + params
+
+def generate_tracefile(path: str, files: int=100, functions: int=20, lines: int=10, branches: int=2,
+        mangled: bool=True, seed: int=0, test_name: str=''):
+    # functions per file, lines per function, branch pairs per function
+    rnd = random.Random(seed)
+    with open(path, 'w', buffering=1 << 20) as f:
+        for i in range(files):
+            source_file = f"/bench/src/dir{i % 16}/mod{i}.cc"
+            fn_records, line_records, branch_records = [], [], []
+            lineno = 1
+            for j in range(functions):
+                name = mangle('bench', f"mod{i}", f"fn{j}") if mangled else f"mod{i}_fn{j}"
+                hits = rnd.choice((0, 0, 1, rnd.randrange(1, 1 << 16)))
+                fn_records.append((name, lineno, hits))
+                for k in range(lines):
+                    line_records.append((lineno + k, hits if k % 3 else hits * rnd.randrange(0, 4)))
+                for k in range(branches):
+                    taken = rnd.randrange(0, hits + 1) if hits else None
+                    branch_records.append((lineno + 1 + k, k, 0, taken))
+                    branch_records.append((lineno + 1 + k, k, 1, None if taken is None else hits - taken))
+                lineno += lines + 2
+            write_tracefile_record(f, source_file, line_records, fn_records, branch_records, test_name)
+    return os.path.getsize(path)
+
+def generate_tracefiles(directory: str, count: int, **kwargs):
+    os.makedirs(directory, exist_ok=True)
+    seed, paths = kwargs.pop('seed', 0), []
+    for i in range(count):
+        path = os.path.join(directory, f"trace.{i}.info")
+        generate_tracefile(path, seed=seed + i, **kwargs)
+        paths.append(path)
+    return paths
+
+_HARNESS = r'''
+#include <dirent.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+%(declarations)s
+
+extern "C" int LLVMFuzzerTestOneInput(const uint8_t *data, size_t size) {
+  if (size < 2) return 0;
+  switch (data[0] %% %(files)d) {
+%(cases)s
+  }
+  return 0;
+}
+
+static void run_file(const char *path) {
+  FILE *f = fopen(path, "rb");
+  if (!f) return;
+  static uint8_t buf[1 << 16];
+  size_t n = fread(buf, 1, sizeof buf, f);
+  fclose(f);
+  printf("Running: %%s\n", path);
+  LLVMFuzzerTestOneInput(buf, n);
+}
+
+static void run_path(const char *path) {
+  DIR *dir = opendir(path);
+  if (!dir) { run_file(path); return; }
+  struct dirent *e;
+  char child[4096];
+  while ((e = readdir(dir))) {
+    if (e->d_name[0] == '.') continue;
+    snprintf(child, sizeof child, "%%s/%%s", path, e->d_name);
+    run_path(child);
+  }
+  closedir(dir);
+}
+
+// libFuzzer compatible enough for replay: flags are ignored, every other
+// argument is an input file or a corpus directory
+int main(int argc, char **argv) {
+  for (int i = 1; i < argc; i++)
+    if (argv[i][0] != '-') run_path(argv[i]);
+  return 0;
+}
+'''
+
+def _module_source(i: int, functions: int, branches: int) -> str:
+    body = [f"#include <stddef.h>\n#include <stdint.h>\n\nnamespace bench {{\nnamespace mod{i} {{\n"]
+    for j in range(functions):
+        body.append(f"int fn{j}(const uint8_t *data, size_t size) {{\n  int r = {j};\n")
+        for k in range(branches):
+            body.append(f"  if (size > {k + 2} && data[{k + 2}] % {k + 2} == {j % (k + 2)}) r += {k + 1};\n"
+                f"  else r ^= {k};\n")
+        body.append("  return r;\n}\n\n")
+    body.append(f"int dispatch(const uint8_t *data, size_t size) {{\n  switch (data[1] % {functions}) {{\n")
+    body.extend(f"  case {j}: return fn{j}(data, size);\n" for j in range(functions))
+    body.append(f"  }}\n  return 0;\n}}\n\n}}  // namespace mod{i}\n}}  // namespace bench\n")
+    return ''.join(body)
+
+def generate_project(root: str, files: int=8, functions: int=20, branches: int=3, corpus: int=200,
+        seed: int=0):
+    # sources under src/, inputs under corpus/
+    rnd = random.Random(seed)
+    os.makedirs(os.path.join(root, 'src'), exist_ok=True)
+    os.makedirs(os.path.join(root, 'corpus'), exist_ok=True)
+    sources = []
+    for i in range(files):
+        source_file = os.path.join(root, 'src', f"mod{i}.cc")
+        with open(source_file, 'w') as f:
+            f.write(_module_source(i, functions, branches))
+        sources.append(source_file)
+    harness_file = os.path.join(root, 'src', 'harness.cc')
+    with open(harness_file, 'w') as f:
+        f.write(_HARNESS % {
+            'files': files,
+            'declarations': '\n'.join(f"namespace bench {{ namespace mod{i} {{ int dispatch(const uint8_t *, size_t); }} }}"
+                for i in range(files)),
+            'cases': '\n'.join(f"  case {i}: return bench::mod{i}::dispatch(data, size);" for i in range(files)),
+        })
+    sources.append(harness_file)
+    for i in range(corpus):
+        with open(os.path.join(root, 'corpus', f"input-{i:06d}"), 'wb') as f:
+            f.write(bytes(rnd.randrange(256) for _ in range(rnd.randrange(2, 2 + 2 * branches + 8))))
+    return sources
+
+def build_project(root: str, cxx: str='g++'):
+    # objects (and their .gcno/.gcda files) live under obj/
+    obj_dir = os.path.join(root, 'obj')
+    os.makedirs(obj_dir, exist_ok=True)
+    src_dir = os.path.join(root, 'src')
+    objects = []
+    for source in sorted(os.listdir(src_dir)):
+        if not source.endswith('.cc'):
+            continue
+        obj = os.path.join(obj_dir, source[:-len('.cc')] + '.o')
+        subprocess.check_call([cxx, '--coverage', '-O0', '-g', '-c', os.path.join(src_dir, source), '-o', obj])
+        objects.append(obj)
+    fuzzer_path = os.path.join(root, 'fuzzer')
+    subprocess.check_call([cxx, '--coverage'] + objects + ['-o', fuzzer_path])
+    return fuzzer_path
@@ -0,0 +1,51 @@
+
+import argparse
+import os
+import time
+
+from fuzzer_cov.platform.covdiff import open_stores, diff_stores, write_delta_json, write_delta_html
+from fuzzer_cov.platform.lcov import compile_source_filter
+
+def parse_cmdline():
+    p = argparse.ArgumentParser()
+    p.prog = 'fuzzer_cov.commands.diff'
+    p.add_argument("before", type=str, help="Final tracefile (or coverage store) of the old run")
+    p.add_argument("after", type=str, help="Final tracefile (or coverage store) of the new run")
+    p.add_argument("-o", "--out", type=str, required=True,
+        help="Delta output directory (delta.json, optional delta.html)")
+    p.add_argument("--html", action='store_true', default=False,
+        help="Also render delta.html")
+    p.add_argument("--exclude-pattern", type=str, action='append', default=[],
+        help="Ignore sources matching this lcov pattern, may be repeated")
+    p.add_argument("--include-pattern", type=str, action='append', default=[],
+        help="Only compare sources matching this lcov pattern, may be repeated")
+    p.add_argument("--top", type=int, default=20,
+        help="Number of files listed in the summary")
+    return p.parse_args()
+
+def main():
+    args = parse_cmdline()
+    begin = time.perf_counter()
+    os.makedirs(args.out, exist_ok=True)
+    store_a, store_b = open_stores([args.before, args.after], os.path.join(args.out, '.stores'))
+    try:
+        delta = diff_stores(store_a, store_b, compile_source_filter(args.exclude_pattern, args.include_pattern))
+    finally:
+        store_a.close()
+        store_b.close()
+    delta['before'], delta['after'] = args.before, args.after
+    write_delta_json(delta, os.path.join(args.out, 'delta.json'))
+    if args.html:
+        write_delta_html(delta, os.path.join(args.out, 'delta.html'), (args.before, args.after))
+
+    s = delta['summary']
+    print(f"lines hit: {s['lines_hit'][0]}/{s['lines_found'][0]} -> {s['lines_hit'][1]}/{s['lines_found'][1]}")
+    print(f"lines: +{s['lines_gained']} -{s['lines_lost']}, functions: +{s['functions_gained']} -{s['functions_lost']}, "
+        f"branches: +{s['branches_gained']} -{s['branches_lost']}, files: +{s['files_added']} -{s['files_removed']}")
+    ranked = sorted(delta['files'].items(), key=lambda item: -(len(item[1]['lines_gained']) + len(item[1]['lines_lost'])))
+    for source_file, file_delta in ranked[:args.top]:
+        print(f"    +{len(file_delta['lines_gained']):<6} -{len(file_delta['lines_lost']):<6} {source_file}")
+    print(f"diffed {len(delta['files'])} changed files in {time.perf_counter() - begin:.2f}s")
+
+if __name__ == '__main__':
+    main()
@@ -2,8 +2,10 @@
 import argparse
 import os
 from pathlib import Path
+import subprocess
+import sys
 
-from fuzzer_cov.core.container import BuildContainerImpl
+from fuzzer_cov.core.container import BuildContainerImpl, SCOPED, SINGLETON
 
 from fuzzer_cov.core import Logger
 from fuzzer_cov.core.logger import LoggerImpl
@@ -13,36 +15,132 @@ from fuzzer_cov.executor.libfuzzer import LibFuzzerInstanceExecutor
 
 from fuzzer_cov.core import CommandExecutor
 from fuzzer_cov.platform.executor import CommandExecutorImpl
+from fuzzer_cov.platform.asyncexec import AsyncCommandExecutorImpl
 
-from fuzzer_cov.platform.lcov import LCovRunner, LCovOutputPathPolicy
-from fuzzer_cov.platform.genhtml import GenHtmlRunner, GenHtmlOutputPathPolicy
+from fuzzer_cov.core import CoverageCapturer
+from fuzzer_cov.platform.gcov import GcovCapturer
+from fuzzer_cov.platform.llvmcov import LLVMCovCapturer
+
+from fuzzer_cov.core import CoverageReporter
+from fuzzer_cov.platform.genhtml import GenHtmlRunner
+from fuzzer_cov.platform.htmlreport import HtmlReportRunner
+
+from fuzzer_cov.platform.corpus import CorpusManifest, ReplayCheckpoint, list_corpus_files, fingerprint_file
+from fuzzer_cov.platform.lcov import LCovRunner, LCovOutputPathPolicy, LCovCapturer
+from fuzzer_cov.platform.genhtml import GenHtmlOutputPathPolicy
+from fuzzer_cov.platform.demangle import CxxFiltDemangler, default_demangler
+from fuzzer_cov.platform.pool import WorkerPool
+from fuzzer_cov.platform.sampling import sample_size, stratified_sample, split_groups, estimate_coverage, \
+    exact_coverage, format_estimate, write_estimate, load_estimate, strip_sample_arguments
 
 class InvalidOpts(Exception): pass
 
 class Opts(object):
     fuzzer_path: str
+    fuzzer_paths: list
     source_dir: str
     output_dir: str
     lcov_output_dir: str
     gen_html_output_dir: str
     enable_branch_coverage: bool
     lcov_follow_links: bool
-    lcov_exclude_pattern: str
+    lcov_exclude_patterns: list
+    lcov_include_patterns: list
     lcov_path: str
     gen_html_path: str
+    gcov_path: str
+    llvm_profdata_path: str
+    llvm_cov_path: str
+    profraw_dir: str
+    capture_backend: str
+    merge_backend: str
+    report_backend: str
+    jobs: int
+    shard_output_dir: str
+    incremental: bool
+    manifest_file: str
+    sample: float
+    sample_groups: int
+    sample_seed: int
+    estimate_file: str
+    executor: str
+    command_timeout: float
+    max_concurrency: int
+    command_log_dir: str
+    metrics_file: str
+    profile_dir: str
+    chunk_size: int
+    resume: bool
+    input_timeout: int
+    checkpoint_file: str
+    quarantine_dir: str
+    build_cache: bool
+    cache_dir: str
 
     def __init__(self):
         self.lcov_path = 'lcov'
         self.gen_html_path = 'genhtml'
+        self.gcov_path = 'gcov'
+        self.llvm_profdata_path = 'llvm-profdata'
+        self.llvm_cov_path = 'llvm-cov'
+        self.profraw_dir = None
+        self.capture_backend = 'lcov'
+        self.merge_backend = 'native'
+        self.report_backend = 'genhtml'
+        self.jobs = 1
+        self.incremental = False
+        self.sample = 0
+        self.sample_groups = 10
+        self.sample_seed = 0
+        self.estimate_file = None
+        self.executor = 'async'
+        self.command_timeout = None
+        self.max_concurrency = None
+        self.command_log_dir = None
+        self.metrics_file = None
+        self.profile_dir = None
+        self.chunk_size = 0
+        self.resume = False
+        self.input_timeout = 600
+        self.build_cache = True
+        self.cache_dir = None
         # default False
         self.enable_branch_coverage = False
         self.lcov_follow_links = False
+        self.lcov_exclude_patterns = []
+        self.lcov_include_patterns = []
     
     def validate(self):
         if not self.lcov_path:
             return InvalidOpts("must set lcov_path, got empty string")
         if not self.gen_html_path:
             return InvalidOpts("must set gen_html_path, got empty string")
+        if self.capture_backend not in ('lcov', 'gcov', 'llvm'):
+            return InvalidOpts(f"unknown capture backend: {self.capture_backend}")
+        if self.capture_backend == 'gcov' and not self.gcov_path:
+            return InvalidOpts("must set gcov_path, got empty string")
+        if self.capture_backend == 'llvm' and not (self.llvm_profdata_path and self.llvm_cov_path):
+            return InvalidOpts("must set llvm_profdata_path and llvm_cov_path, got empty string")
+        if self.merge_backend not in ('native', 'lcov'):
+            return InvalidOpts(f"unknown merge backend: {self.merge_backend}")
+        if self.report_backend not in ('genhtml', 'native'):
+            return InvalidOpts(f"unknown report backend: {self.report_backend}")
+        if self.jobs < 1:
+            return InvalidOpts(f"jobs must be positive, got {self.jobs}")
+        if self.sample < 0:
+            return InvalidOpts(f"sample must not be negative, got {self.sample}")
+        if self.sample_groups < 2:
+            return InvalidOpts(f"sample groups must be at least 2, got {self.sample_groups}")
+        if self.chunk_size < 0:
+            return InvalidOpts(f"chunk size must not be negative, got {self.chunk_size}")
+        if self.input_timeout < 1:
+            return InvalidOpts(f"input timeout must be positive, got {self.input_timeout}")
+        if self.executor not in ('async', 'subprocess'):
+            return InvalidOpts(f"unknown executor: {self.executor}")
+        if self.command_timeout is not None and self.command_timeout <= 0:
+            return InvalidOpts(f"command timeout must be positive, got {self.command_timeout}")
+        if self.max_concurrency is not None and self.max_concurrency < 1:
+            return InvalidOpts(f"max concurrency must be positive, got {self.max_concurrency}")
         if not self.fuzzer_path:
             return InvalidOpts("must set fuzzer_path, got empty string")
         if not self.source_dir:
@@ -57,33 +155,65 @@ class Opts(object):
             return InvalidOpts("must set gen_html_output_dir, got empty string")
         return None
 
-def parse_cmdline():
-
-    # opts.output_dir = os.path.realpath('.material/fuzz-cov')
-
-    p = argparse.ArgumentParser()
-    p.prog = 'fuzzer_cov.commands.libfuzzer'
-
-    p.add_argument("--fuzzer", type=str, required=True,
+def add_fuzzer_cov_arguments(p: argparse.ArgumentParser, required: bool=True):
+    p.add_argument("--fuzzer", type=str, required=required,
         help="Fuzzer Path (gcov instrumented)")
-    p.add_argument("-s", "--src", type=str, required=True,
+    p.add_argument("-s", "--src", type=str, required=required,
         help="Source root directory")
     p.add_argument("-o", "--out", type=str, required=True,
         help="Coverage output directory")
-    p.add_argument("-c", "--corpus-dir", type=str, required=True,
+    p.add_argument("-c", "--corpus-dir", type=str, required=required,
         help="Corpus (inputs) Directory")
 
+    p.add_argument("-j", "--jobs", type=int, default=1,
+        help="Replay the corpus in N shards with separate fuzzer processes")
+
+    p.add_argument("--chunk-size", type=int, default=0,
+        help="Replay the corpus in chunks of N inputs with a checkpoint, bisecting crashing chunks (0: off)")
+    p.add_argument("--resume", action='store_true', default=False,
+        help="Continue an interrupted --chunk-size replay from its checkpoint")
+    p.add_argument("--input-timeout", type=int, default=600,
+        help="libFuzzer -timeout for a single input, in seconds")
+
+    p.add_argument("--no-build-cache", action='store_true', default=False,
+        help="Walk the build tree and capture the --initial baseline on every run instead of caching them")
+
+    p.add_argument("--executor", type=str, choices=['async', 'subprocess'], default='async',
+        help="Run external commands with the asyncio executor or the line-buffered subprocess executor")
+    p.add_argument("--command-timeout", type=float, default=None,
+        help="Kill any external command running longer than SECONDS")
+    p.add_argument("--max-concurrency", type=int, default=None,
+        help="Run at most N external commands at once (default: cpu count)")
+
+    p.add_argument("--profile", action='store_true', default=False,
+        help="Dump cProfile stats of the python-side stages into <out>/profile")
+
     p.add_argument("--lcov-follow-links", action='store_true', default=False,
         help="Follow links when searching .da files")
     p.add_argument("--enable-branch-coverage", action='store_true', default=False,
         help="Include branch coverage in code coverage reports (may be slow)")
-    p.add_argument("--lcov-exclude-pattern", type=str, default="/usr/include/\\*",
-        help="Set exclude pattern for lcov results")
+    p.add_argument("--lcov-exclude-pattern", type=str, action='append', default=None,
+        help="Set exclude pattern for lcov results, may be repeated (default: /usr/include/*)")
+    p.add_argument("--lcov-include-pattern", type=str, action='append', default=[],
+        help="Only keep lcov results of sources matching this pattern, may be repeated")
     
     p.add_argument("--lcov-path", type=str,
             help="Path to lcov command", default="/usr/bin/lcov")
     p.add_argument("--gen-html-path", type=str,
             help="Path to genhtml command", default="/usr/bin/genhtml")
+    p.add_argument("--gcov-path", type=str,
+            help="Path to gcov command (used by the gcov capture backend)", default="gcov")
+    p.add_argument("--llvm-profdata-path", type=str,
+            help="Path to llvm-profdata command (used by the llvm capture backend)", default="llvm-profdata")
+    p.add_argument("--llvm-cov-path", type=str,
+            help="Path to llvm-cov command (used by the llvm capture backend)", default="llvm-cov")
+    p.add_argument("--capture-backend", type=str, choices=['lcov', 'gcov', 'llvm'], default='lcov',
+            help="Capture tracefiles with `lcov --capture`, natively with parallel `gcov --json-format`, "
+            "or with `llvm-profdata merge` and `llvm-cov export` for clang source-based coverage")
+    p.add_argument("--merge-backend", type=str, choices=['native', 'lcov'], default='native',
+            help="Merge tracefiles in-process or with `lcov -a`")
+    p.add_argument("--report-backend", type=str, choices=['genhtml', 'native'], default='genhtml',
+            help="Render the html report with genhtml or with the built-in parallel, incremental renderer")
     
     p.add_argument("-v", "--verbose", action='store_true',
             help="Verbose mode", default=False)
@@ -110,66 +240,284 @@ def parse_cmdline():
     #         help="Overwrite existing coverage results", default=False)
     # p.add_argument("--validate-args", action='store_true',
     #         help="Validate args and exit", default=False)
+    return p
+
+def parse_cmdline():
+
+    # opts.output_dir = os.path.realpath('.material/fuzz-cov')
+
+    p = argparse.ArgumentParser()
+    p.prog = 'fuzzer_cov.commands.libfuzzer'
+    add_fuzzer_cov_arguments(p)
+    p.add_argument("--incremental", action='store_true', default=False,
+        help="Only replay inputs not seen by the previous --incremental run and merge into its result")
+    p.add_argument("--sample", type=float, default=0,
+        help="Only replay a stratified random sample of the corpus, a fraction below 1 or a number of inputs, "
+        "and report estimated coverage with confidence bounds")
+    p.add_argument("--sample-groups", type=int, default=10,
+        help="Replay the sample in N independently captured groups for the confidence bounds")
+    p.add_argument("--sample-seed", type=int, default=0,
+        help="Seed of the --sample draw")
+    p.add_argument("--sample-continue", action='store_true', default=False,
+        help="After a --sample report, replay the rest of the corpus in the background with --incremental "
+        "and replace the estimate with the exact report")
 
     return p.parse_args()
 
 def get_fuzzer_cov_opts_from_command_line_options(opts: Opts, args: object):
     opts.lcov_path = args.lcov_path
     opts.gen_html_path = args.gen_html_path
+    opts.gcov_path = args.gcov_path
+    opts.llvm_profdata_path = args.llvm_profdata_path
+    opts.llvm_cov_path = args.llvm_cov_path
+    opts.capture_backend = args.capture_backend
+    opts.merge_backend = args.merge_backend
+    opts.report_backend = args.report_backend
 
     opts.fuzzer_path = args.fuzzer
+    opts.fuzzer_paths = [args.fuzzer]
     opts.source_dir = args.src
     opts.output_dir = args.out
+    opts.jobs = args.jobs
+    opts.incremental = getattr(args, 'incremental', False)
+    opts.sample = getattr(args, 'sample', 0)
+    opts.sample_groups = getattr(args, 'sample_groups', 10)
+    opts.sample_seed = getattr(args, 'sample_seed', 0)
+    opts.chunk_size = args.chunk_size
+    opts.resume = args.resume
+    opts.input_timeout = args.input_timeout
+    opts.build_cache = not args.no_build_cache
+    opts.executor = args.executor
+    opts.command_timeout = args.command_timeout
+    opts.max_concurrency = args.max_concurrency
     
-    opts.lcov_exclude_pattern = args.lcov_exclude_pattern
+    if args.lcov_exclude_pattern is None:
+        opts.lcov_exclude_patterns = ["/usr/include/*"]
+    else:
+        opts.lcov_exclude_patterns = [pattern for pattern in args.lcov_exclude_pattern if pattern]
+    opts.lcov_include_patterns = [pattern for pattern in args.lcov_include_pattern if pattern]
     opts.enable_branch_coverage = args.enable_branch_coverage
     opts.lcov_follow_links = args.lcov_follow_links
 
     opts.lcov_output_dir = os.path.join(opts.output_dir, 'lcov')
     opts.gen_html_output_dir = os.path.join(opts.output_dir, 'web')
+    opts.shard_output_dir = os.path.join(opts.output_dir, 'shards')
+    opts.manifest_file = os.path.join(opts.output_dir, 'corpus.manifest.json')
+    opts.estimate_file = os.path.join(opts.output_dir, 'estimate.json')
+    opts.command_log_dir = os.path.join(opts.output_dir, 'logs')
+    opts.checkpoint_file = os.path.join(opts.output_dir, 'replay.checkpoint.json')
+    opts.quarantine_dir = os.path.join(opts.output_dir, 'quarantine')
+    opts.cache_dir = os.path.join(opts.output_dir, 'cache')
+    opts.profraw_dir = os.path.join(opts.output_dir, 'profraw')
+    opts.metrics_file = os.path.join(opts.output_dir, 'metrics.jsonl')
+    if args.profile:
+        opts.profile_dir = os.path.join(opts.output_dir, 'profile')
 
     maybe_err = opts.validate()
     if maybe_err is not None:
         raise maybe_err # pylint: disable-msg=E0702
 
+def create_container(opts: Opts):
+    # one demangler and worker pool per process, the components of a run
+    # (or of a per-target scope) share one logger and command executor
+    container = BuildContainerImpl(opts)
+    container.register_impl(LoggerImpl, Logger, lifetime=SCOPED)
+    if opts.executor == 'async':
+        container.register_impl(AsyncCommandExecutorImpl, CommandExecutor, lifetime=SCOPED)
+    else:
+        container.register_impl(CommandExecutorImpl, CommandExecutor, lifetime=SCOPED)
+    # closing stops the c++filt coprocess, a later demangle starts a new one
+    container.register_instance(default_demangler, CxxFiltDemangler, owned=True)
+    container.register_impl(WorkerPool, lifetime=SINGLETON)
+    if opts.capture_backend == 'gcov':
+        container.register_impl(GcovCapturer, CoverageCapturer, lifetime=SCOPED)
+    elif opts.capture_backend == 'llvm':
+        container.register_impl(LLVMCovCapturer, CoverageCapturer, lifetime=SCOPED)
+    else:
+        container.register_impl(LCovCapturer, CoverageCapturer, lifetime=SCOPED)
+    container.register_impl(LibFuzzerInstanceExecutor, FuzzerExecutor, lifetime=SCOPED)
+    container.register_impl(LCovRunner, lifetime=SCOPED)
+    container.register_impl(LCovOutputPathPolicy, lifetime=SCOPED)
+    if opts.report_backend == 'native':
+        container.register_impl(HtmlReportRunner, CoverageReporter, lifetime=SCOPED)
+    else:
+        container.register_impl(GenHtmlRunner, CoverageReporter, lifetime=SCOPED)
+    container.register_impl(GenHtmlOutputPathPolicy, lifetime=SCOPED)
+    return container
+
 def main():
     # Setup Environment Values
     args = parse_cmdline()
     opts = Opts()
     get_fuzzer_cov_opts_from_command_line_options(opts, args)
-
-    clean = True
+    if opts.resume and not opts.chunk_size:
+        raise InvalidOpts("--resume needs --chunk-size")
+    if opts.sample and (opts.incremental or opts.resume or opts.chunk_size):
+        raise InvalidOpts("--sample cannot be combined with --incremental, --resume or --chunk-size")
 
     # create container
-    container = BuildContainerImpl(opts)
-    container.register_impl(LoggerImpl, Logger)
-    container.register_impl(CommandExecutorImpl, CommandExecutor)
-    container.register_impl(LibFuzzerInstanceExecutor, FuzzerExecutor)
-    container.register_impl(LCovRunner)
-    container.register_impl(LCovOutputPathPolicy)
-    container.register_impl(GenHtmlRunner)
-    container.register_impl(GenHtmlOutputPathPolicy)
-
-    # create lcov components
+    container = create_container(opts)
+    try:
+        if opts.sample:
+            return sample_main(args, opts, container)
+
+        # create lcov components
+        logger = container.resolve(Logger)
+        lcov_path_policy = container.resolve(LCovOutputPathPolicy)
+        gen_html_path_policy = container.resolve(GenHtmlOutputPathPolicy)
+        fuzzer_instance = container.resolve(FuzzerExecutor)
+        lcov_runner = container.resolve(LCovRunner)
+        gen_html_runner = container.resolve(CoverageReporter)
+
+        clean = True
+        manifest = CorpusManifest(opts.manifest_file)
+        if opts.incremental:
+            # a previous result is only reusable for the very same fuzzer build
+            if manifest.load() and manifest.fuzzer_fingerprint == fingerprint_file(opts.fuzzer_path) and \
+                    os.path.exists(lcov_path_policy.lcov_info_final_file):
+                clean = False
+            else:
+                manifest.clear()
+            manifest.fuzzer_fingerprint = fingerprint_file(opts.fuzzer_path)
+        elif os.path.exists(opts.manifest_file):
+            os.unlink(opts.manifest_file)
+
+        # main logic
+        cov_output_path = Path(opts.output_dir)
+        cov_output_path.mkdir(parents=True, exist_ok=True)
+
+        checkpoint = ReplayCheckpoint(opts.checkpoint_file)
+        resume = False
+        if clean and opts.chunk_size:
+            case_files = list_corpus_files(args.corpus_dir)
+            # only the very same replay plan can continue on the dumped counters
+            if opts.resume and checkpoint.load() and \
+                    checkpoint.matches(fingerprint_file(opts.fuzzer_path), opts.chunk_size, case_files):
+                resume = True
+                logger.info(f"resume replay: {len(checkpoint.completed)} chunks completed",
+                    { 'completed': len(checkpoint.completed), 'quarantined': len(checkpoint.quarantined) })
+            else:
+                checkpoint.reset(fingerprint_file(opts.fuzzer_path), opts.chunk_size, case_files)
+
+        lcov_path_policy.initialize_file_structure(clean=clean and not resume)
+        gen_html_path_policy.initialize_file_structure(clean=clean)
+
+        if clean:
+            with logger.span('init'):
+                # a single unchunked job replays into the build tree
+                lcov_runner.start_coverage_files(lcov_path_policy, zero_counters=not resume,
+                    background=opts.jobs > 1 or bool(opts.chunk_size), silent=0)
+            with logger.span('replay') as span:
+                case_files = list_corpus_files(args.corpus_dir)
+                if opts.incremental:
+                    manifest.add_files(case_files)
+                if opts.chunk_size:
+                    fuzzer_instance.exec_corpus_chunks(checkpoint, resume=resume, silent=0)
+                    span.add(quarantined=len(checkpoint.quarantined))
+                else:
+                    fuzzer_instance.exec_corpus_set(args.corpus_dir, silent=0)
+                span.add(inputs=len(case_files))
+            with logger.span('collect', profile=True):
+                lcov_runner.collect_coverage(lcov_path_policy, silent=0)
+        else:
+            new_files = manifest.new_files(list_corpus_files(args.corpus_dir))
+            logger.info(f"incremental run: {len(new_files)} new inputs", { 'inputs': len(new_files) })
+            if new_files:
+                lcov_path_policy.use_previous_result()
+                with logger.span('init'):
+                    lcov_runner.zero_coverage_counters(silent=0)
+                with logger.span('replay') as span:
+                    if opts.chunk_size:
+                        checkpoint.reset(fingerprint_file(opts.fuzzer_path), opts.chunk_size, new_files)
+                        fuzzer_instance.exec_corpus_chunks(checkpoint, silent=0)
+                        span.add(quarantined=len(checkpoint.quarantined))
+                    else:
+                        fuzzer_instance.exec_corpus_files(new_files, silent=0)
+                    span.add(inputs=len(new_files))
+                with logger.span('collect', profile=True):
+                    lcov_runner.collect_coverage(lcov_path_policy, silent=0)
+                manifest.add_files(new_files)
+        if opts.incremental:
+            manifest.save()
+
+        gen_html_path_policy.use_lcov_path_policy(lcov_path_policy)
+        with logger.span('report', profile=True):
+            gen_html_runner.gen_cov_report(gen_html_path_policy, silent=0)
+        estimate = load_estimate(opts.estimate_file)
+        if estimate is not None and not estimate['exact']:
+            # the corpus has been replayed in full since the sampled run
+            estimate.update(exact_coverage(lcov_path_policy.lcov_info_final_file, opts.enable_branch_coverage))
+            estimate.pop('continuation', None)
+            write_estimate(estimate, opts.estimate_file)
+            logger.info(f"estimate replaced by the exact report, {format_estimate('lines', estimate['lines'])}", estimate)
+        logger.summary()
+    finally:
+        container.close()
+
+def sample_main(args, opts: Opts, container):
+    logger = container.resolve(Logger)
     lcov_path_policy = container.resolve(LCovOutputPathPolicy)
     gen_html_path_policy = container.resolve(GenHtmlOutputPathPolicy)
     fuzzer_instance = container.resolve(FuzzerExecutor)
     lcov_runner = container.resolve(LCovRunner)
-    gen_html_runner = container.resolve(GenHtmlRunner)
+    gen_html_runner = container.resolve(CoverageReporter)
 
-    # main logic
-    cov_output_path = Path(opts.output_dir)
-    cov_output_path.mkdir(parents=True, exist_ok=True)
+    Path(opts.output_dir).mkdir(parents=True, exist_ok=True)
+    lcov_path_policy.initialize_file_structure(clean=True)
+    gen_html_path_policy.initialize_file_structure(clean=True)
 
-    lcov_path_policy.initialize_file_structure(clean=clean)
-    gen_html_path_policy.initialize_file_structure(clean=clean)
+    case_files = list_corpus_files(args.corpus_dir)
+    strata = stratified_sample(case_files, args.corpus_dir, sample_size(opts.sample, len(case_files)), opts.sample_seed)
+    groups = split_groups(strata, opts.sample_groups, opts.sample_seed)
+    sampled = [path for group in groups for path in group]
+    logger.info(f"sample {len(sampled)} of {len(case_files)} inputs from {len(strata)} strata in {len(groups)} groups",
+        { 'inputs': len(case_files), 'sampled': len(sampled), 'strata': len(strata), 'groups': len(groups) })
 
-    lcov_runner.init_coverage_files(lcov_path_policy, silent=0)
-    fuzzer_instance.exec_corpus_set(args.corpus_dir, silent=0)
-    lcov_runner.collect_coverage(lcov_path_policy, silent=0)
+    with logger.span('init'):
+        lcov_runner.start_coverage_files(lcov_path_policy, silent=0)
+    with logger.span('replay') as span:
+        fuzzer_instance.exec_corpus_groups(groups, silent=0)
+        span.add(inputs=len(sampled))
+    with logger.span('collect', profile=True):
+        shard_info_files = lcov_runner.collect_coverage(lcov_path_policy, silent=0)
+    with logger.span('estimate'):
+        # group i replays as shard i, a group without counters covered nothing
+        estimate = estimate_coverage([shard_info_files.get(i) for i in range(len(groups))],
+            lcov_path_policy.lcov_info_final_file, len(sampled), len(case_files),
+            opts.enable_branch_coverage, opts.sample_seed)
+        estimate['strata'] = len(strata)
+        estimate['seed'] = opts.sample_seed
+
+    # the sampled inputs are recorded like an --incremental run, so a later
+    # --incremental run only replays the rest and merges into this result
+    manifest = CorpusManifest(opts.manifest_file)
+    manifest.fuzzer_fingerprint = fingerprint_file(opts.fuzzer_path)
+    manifest.add_files(sampled)
+    manifest.save()
 
     gen_html_path_policy.use_lcov_path_policy(lcov_path_policy)
-    gen_html_runner.gen_cov_report(gen_html_path_policy, silent=0)
+    with logger.span('report', profile=True):
+        gen_html_runner.gen_cov_report(gen_html_path_policy, silent=0)
+
+    continuation = args.sample_continue and not estimate['exact']
+    if continuation:
+        log_file = os.path.join(opts.command_log_dir, 'continue.log')
+        estimate['continuation'] = { 'log': log_file }
+    # written before the background run starts, which replaces it with the
+    # exact result when it is done
+    write_estimate(estimate, opts.estimate_file)
+    for name in ('lines', 'branches'):
+        if name in estimate:
+            logger.info(f"{'exact' if estimate['exact'] else 'estimated'} {format_estimate(name, estimate[name])}", estimate[name])
+    if continuation:
+        os.makedirs(opts.command_log_dir, exist_ok=True)
+        with open(log_file, 'ab') as log:
+            proc = subprocess.Popen([sys.executable, '-m', 'fuzzer_cov.commands.libfuzzer'] +
+                strip_sample_arguments(sys.argv[1:]) + ['--incremental'],
+                stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+        logger.info(f"replaying the rest of the corpus in the background, pid {proc.pid}",
+            dict(estimate['continuation'], pid=proc.pid))
+    logger.summary()
 
 if __name__ == '__main__':
     main()
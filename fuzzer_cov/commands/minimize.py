@@ -0,0 +1,99 @@
+
+import argparse
+import os
+
+from fuzzer_cov.core import CoverageCapturer, FuzzerExecutor, Logger
+from fuzzer_cov.platform.attribution import CoverageAttribution
+from fuzzer_cov.platform.corpus import list_corpus_files, link_corpus_files, list_corpus_links, \
+    unlink_corpus_files
+from fuzzer_cov.platform.lcov import LCovRunner, LCovOutputPathPolicy
+
+from fuzzer_cov.commands.libfuzzer import Opts, InvalidOpts, add_fuzzer_cov_arguments, \
+    get_fuzzer_cov_opts_from_command_line_options, create_container
+
+def parse_cmdline():
+    p = argparse.ArgumentParser()
+    p.prog = 'fuzzer_cov.commands.minimize'
+    add_fuzzer_cov_arguments(p, required=False)
+
+    p.add_argument("--batch-size", type=int, default=1,
+        help="Attribute coverage to batches of N inputs instead of single inputs (faster, coarser)")
+    p.add_argument("--minimized-dir", type=str, default=None,
+        help="Link the minimized corpus into this directory")
+    p.add_argument("--query", type=str, action='append', default=[],
+        help="FILE:LINE, print the inputs hitting it from a previous attribution run (no replay)")
+
+    return p, p.parse_args()
+
+def query(attribution_file: str, queries: list):
+    attribution = CoverageAttribution.load(attribution_file)
+    for q in queries:
+        source_file, _, lineno = q.rpartition(':')
+        if not source_file or not lineno.isdigit():
+            raise InvalidOpts(f"query must be FILE:LINE, got {q}")
+        print(f"{q}:")
+        for case_file in attribution.inputs_hitting(source_file, int(lineno)):
+            print(f"    {case_file}")
+
+def main():
+    p, args = parse_cmdline()
+    # replays, tracefiles and results live below --out/minimize, a libfuzzer
+    # run in --out is left alone
+    args.out = os.path.join(args.out, 'minimize')
+    attribution_file = os.path.join(args.out, 'attribution.json')
+    if args.query:
+        return query(attribution_file, args.query)
+    if not args.fuzzer or not args.src or not args.corpus_dir:
+        p.error("--fuzzer, --src and --corpus-dir are required unless --query is given")
+    if args.batch_size < 1:
+        p.error("--batch-size must be positive")
+    if args.minimized_dir:
+        # a previous minimized corpus is replaced, any other directory is
+        # refused before the replay starts
+        try:
+            list_corpus_links(args.minimized_dir)
+        except Exception as e:
+            p.error(f"--minimized-dir: {e}")
+
+    opts = Opts()
+    get_fuzzer_cov_opts_from_command_line_options(opts, args)
+    container = create_container(opts)
+    try:
+
+        logger = container.resolve(Logger)
+        lcov_path_policy = container.resolve(LCovOutputPathPolicy)
+        fuzzer_instance = container.resolve(FuzzerExecutor)
+        lcov_runner = container.resolve(LCovRunner)
+        capturer = container.resolve(CoverageCapturer)
+
+        lcov_path_policy.initialize_file_structure(clean=True)
+        attribution = CoverageAttribution(branch_coverage=opts.enable_branch_coverage)
+        batch_info_file = os.path.join(lcov_path_policy.lcov_output_dir, 'trace.lcov_batch')
+
+        case_files = list_corpus_files(args.corpus_dir)
+        for i in range(0, len(case_files), args.batch_size):
+            batch = case_files[i:i + args.batch_size]
+            lcov_runner.zero_coverage_counters(silent=1)
+            for case_file in batch:
+                fuzzer_instance.exec_one_file(case_file, silent=1)
+            capturer.capture(opts.source_dir, batch_info_file, silent=1)
+            covered = attribution.add_tracefile(batch, batch_info_file)
+            logger.info(f"[{i + len(batch)}/{len(case_files)}] {covered} points covered", { 'inputs': batch, 'covered': covered })
+        if os.path.exists(batch_info_file):
+            os.unlink(batch_info_file)
+        attribution.save(attribution_file)
+
+        minimized = attribution.minimize()
+        with open(os.path.join(opts.output_dir, 'minimized.txt'), 'w') as f:
+            for case_file in minimized:
+                f.write(case_file + '\n')
+        if args.minimized_dir:
+            unlink_corpus_files(args.minimized_dir)
+            link_corpus_files(minimized, args.minimized_dir)
+        logger.info(f"minimized corpus: {len(minimized)}/{len(case_files)} inputs cover all {len(attribution.points)} points",
+            { 'inputs': len(case_files), 'minimized': len(minimized), 'points': len(attribution.points) })
+    finally:
+        container.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+
+import argparse
+import json
+import time
+
+from fuzzer_cov.platform.covquery import CoverageIndex
+from fuzzer_cov.platform.queryserver import CoverageQueryServer, CoverageQueryClient, run_query
+
+def parse_cmdline():
+    p = argparse.ArgumentParser()
+    p.prog = 'fuzzer_cov.commands.query'
+    sub = p.add_subparsers(dest='action')
+
+    p_serve = sub.add_parser('serve', help="Keep the index of a tracefile loaded and answer queries over HTTP")
+    p_serve.add_argument("tracefile", type=str, help="Final LCOV tracefile")
+    p_serve.add_argument("--socket", type=str, default=None, help="Listen on this unix socket")
+    p_serve.add_argument("--host", type=str, default='127.0.0.1', help="Listen address without --socket")
+    p_serve.add_argument("--port", type=int, default=0, help="Listen port without --socket")
+    p_serve.add_argument("--poll-interval", type=float, default=1.0,
+        help="Seconds between checks of the tracefile for changes")
+    p_serve.add_argument("-v", "--verbose", action='store_true', default=False, help="Log requests and reloads")
+
+    def add_target(sp):
+        sp.add_argument("--tracefile", type=str, default=None, help="Load this tracefile in-process")
+        sp.add_argument("--socket", type=str, default=None, help="Ask the server on this unix socket")
+        sp.add_argument("--port", type=int, default=None, help="Ask the server on this local port")
+
+    p_summary = sub.add_parser('summary', help="Totals of the whole report")
+    add_target(p_summary)
+    p_file = sub.add_parser('file', help="Totals and functions of a source file")
+    add_target(p_file)
+    p_file.add_argument("path", type=str)
+    p_file.add_argument("--uncovered", action='store_true', default=False, help="Also list uncovered lines")
+    p_function = sub.add_parser('function', help="Coverage of a function, by full or unqualified name")
+    add_target(p_function)
+    p_function.add_argument("name", type=str)
+    p_function.add_argument("--file", type=str, default=None, help="Only look in this source file")
+    p_line = sub.add_parser('line', help="Hit count and enclosing function of a line")
+    add_target(p_line)
+    p_line.add_argument("file", type=str)
+    p_line.add_argument("line", type=int)
+    p_directory = sub.add_parser('directory', help="Rolled up totals of a directory")
+    add_target(p_directory)
+    p_directory.add_argument("path", type=str)
+    p_uncovered = sub.add_parser('uncovered', help="Uncovered functions under a directory")
+    add_target(p_uncovered)
+    p_uncovered.add_argument("prefix", type=str, nargs='?', default='/')
+
+    return p, p.parse_args()
+
+def main():
+    p, args = parse_cmdline()
+    if args.action is None:
+        return p.print_help()
+
+    if args.action == 'serve':
+        begin = time.perf_counter()
+        index = CoverageIndex.load(args.tracefile)
+        server = CoverageQueryServer(index, socket_path=args.socket, port=args.port, host=args.host,
+            poll_interval=args.poll_interval, verbose=args.verbose)
+        print(f"indexed {len(index.files)} source files in {time.perf_counter() - begin:.2f}s, "
+            f"serving on {server.address}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    params = { key: getattr(args, key) for key in ('path', 'name', 'file', 'line', 'prefix', 'uncovered')
+        if getattr(args, key, None) not in (None, False) }
+    if args.tracefile is not None:
+        result = run_query(CoverageIndex.load(args.tracefile), args.action, params)
+    elif args.socket is not None or args.port is not None:
+        client = CoverageQueryClient(socket_path=args.socket, port=args.port)
+        try:
+            result = client.query(args.action, params)
+        finally:
+            client.close()
+    else:
+        p.error("one of --tracefile, --socket or --port is required")
+    print(json.dumps(result, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+
+import argparse
+
+from fuzzer_cov.platform.covstore import lcov_to_store, store_to_lcov, CoverageStore
+
+def parse_cmdline():
+    p = argparse.ArgumentParser()
+    p.prog = 'fuzzer_cov.commands.store'
+    sub = p.add_subparsers(dest='action')
+
+    p_import = sub.add_parser('import', help="Convert (and merge) LCOV tracefiles into a coverage store")
+    p_import.add_argument("tracefiles", type=str, nargs='+', help="LCOV tracefiles")
+    p_import.add_argument("-o", "--out", type=str, required=True, help="Coverage store path")
+
+    p_export = sub.add_parser('export', help="Convert a coverage store back into an LCOV tracefile")
+    p_export.add_argument("store", type=str, help="Coverage store path")
+    p_export.add_argument("-o", "--out", type=str, required=True, help="LCOV tracefile path")
+    p_export.add_argument("--source", type=str, action='append', default=[],
+        help="Only export this source file, may be repeated")
+
+    p_list = sub.add_parser('list', help="List the source files of a coverage store")
+    p_list.add_argument("store", type=str, help="Coverage store path")
+
+    return p, p.parse_args()
+
+def main():
+    p, args = parse_cmdline()
+    if args.action == 'import':
+        n = lcov_to_store(args.tracefiles, args.out)
+        print(f"stored {n} source files in {args.out}")
+    elif args.action == 'export':
+        store_to_lcov(args.store, args.out, args.source or None)
+    elif args.action == 'list':
+        with CoverageStore(args.store) as store:
+            for source_file in store.source_files:
+                print(source_file)
+    else:
+        p.print_help()
+
+if __name__ == '__main__':
+    main()
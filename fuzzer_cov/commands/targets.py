@@ -0,0 +1,150 @@
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import copy
+import json
+import os
+import shutil
+
+from fuzzer_cov.core import CoverageCapturer, CoverageReporter, FuzzerExecutor, Logger
+from fuzzer_cov.platform.corpus import ReplayCheckpoint, list_corpus_files, fingerprint_file
+from fuzzer_cov.platform.lcov import LCovRunner, LCovOutputPathPolicy
+from fuzzer_cov.platform.genhtml import GenHtmlOutputPathPolicy
+from fuzzer_cov.platform.targets import load_targets, target_breakdown
+
+from fuzzer_cov.commands.libfuzzer import Opts, add_fuzzer_cov_arguments, \
+    get_fuzzer_cov_opts_from_command_line_options, create_container
+
+def parse_cmdline():
+    p = argparse.ArgumentParser()
+    p.prog = 'fuzzer_cov.commands.targets'
+    add_fuzzer_cov_arguments(p, required=False)
+
+    p.add_argument("--targets", type=str, required=True,
+        help="Fuzz targets of one build tree: json [{name, fuzzer, corpus}] or `fuzzer corpus [name]` lines")
+
+    return p, p.parse_args()
+
+def get_target_opts(opts: Opts, target) -> Opts:
+    # every target dumps its counters and tracefiles under its own root
+    target_opts = copy.copy(opts)
+    target_dir = os.path.join(opts.output_dir, 'targets', target.name)
+    target_opts.fuzzer_path = target.fuzzer_path
+    target_opts.fuzzer_paths = [target.fuzzer_path]
+    target_opts.output_dir = target_dir
+    target_opts.lcov_output_dir = os.path.join(target_dir, 'lcov')
+    target_opts.gen_html_output_dir = os.path.join(target_dir, 'web')
+    target_opts.shard_output_dir = os.path.join(target_dir, 'shards')
+    target_opts.checkpoint_file = os.path.join(target_dir, 'replay.checkpoint.json')
+    target_opts.quarantine_dir = os.path.join(target_dir, 'quarantine')
+    target_opts.profraw_dir = os.path.join(target_dir, 'profraw')
+    target_opts.metrics_file = os.path.join(target_dir, 'metrics.jsonl')
+    target_opts.command_log_dir = os.path.join(target_dir, 'logs')
+    target_opts.profile_dir = None
+    return target_opts
+
+def main():
+    p, args = parse_cmdline()
+    targets = load_targets(args.targets)
+    if not targets:
+        p.error(f"no fuzz targets in {args.targets}")
+    if not args.src:
+        p.error("--src is required")
+    # the baseline of the shared tree does not depend on a fuzzer
+    args.fuzzer = args.fuzzer or targets[0].fuzzer_path
+    args.corpus_dir = args.corpus_dir or targets[0].corpus_dir
+
+    opts = Opts()
+    get_fuzzer_cov_opts_from_command_line_options(opts, args)
+    # the build index of the shared tree is only valid while no target is rebuilt
+    opts.fuzzer_paths = [target.fuzzer_path for target in targets]
+    container = create_container(opts)
+    try:
+
+        logger = container.resolve(Logger)
+        lcov_path_policy = container.resolve(LCovOutputPathPolicy)
+        gen_html_path_policy = container.resolve(GenHtmlOutputPathPolicy)
+        lcov_runner = container.resolve(LCovRunner)
+        capturer = container.resolve(CoverageCapturer)
+        gen_html_runner = container.resolve(CoverageReporter)
+
+        os.makedirs(opts.output_dir, exist_ok=True)
+        lcov_path_policy.initialize_file_structure(clean=not opts.resume)
+        gen_html_path_policy.initialize_file_structure(clean=True)
+        targets_dir = os.path.join(opts.output_dir, 'targets')
+        if not opts.resume and os.path.exists(targets_dir):
+            shutil.rmtree(targets_dir)
+
+        with logger.span('init'):
+            lcov_runner.start_coverage_files(lcov_path_policy, zero_counters=not opts.resume, silent=1)
+
+        policies = {}
+        def replay(target):
+            # a scope of its own for the target's paths, logs and replay, the
+            # worker pool stays shared
+            target_container = container.create_scope(get_target_opts(opts, target))
+            try:
+                policy = policies[target.name] = target_container.resolve(LCovOutputPathPolicy)
+                policy.initialize_file_structure(clean=not opts.resume)
+                case_files = list_corpus_files(target.corpus_dir)
+                # without --chunk-size every job replays a single chunk
+                chunk_size = opts.chunk_size or max(1, -(-len(case_files) // opts.jobs))
+                checkpoint = ReplayCheckpoint(target_container.opts.checkpoint_file)
+                resume = opts.resume and checkpoint.load() and \
+                    checkpoint.matches(fingerprint_file(target.fuzzer_path), chunk_size, case_files)
+                if not resume:
+                    checkpoint.reset(fingerprint_file(target.fuzzer_path), chunk_size, case_files)
+                target_container.resolve(FuzzerExecutor).exec_corpus_chunks(checkpoint, resume=resume, silent=1)
+            finally:
+                target_container.close()
+            logger.info(f"target {target.name}: replayed {len(case_files)} inputs, {len(checkpoint.quarantined)} quarantined",
+                { 'target': target.name, 'inputs': len(case_files), 'quarantined': len(checkpoint.quarantined) })
+            return len(case_files)
+
+        with logger.span('replay') as span:
+            # every target already runs opts.jobs fuzzer processes
+            workers = max(1, (opts.max_concurrency or os.cpu_count() or 1) // opts.jobs)
+            with ThreadPoolExecutor(max_workers=min(workers, len(targets))) as pool:
+                span.add(targets=len(targets), inputs=sum(pool.map(replay, targets)))
+
+        with logger.span('capture') as span:
+            jobs = { target.name: lcov_runner.shard_capture_jobs(policies[target.name]) for target in targets }
+            all_jobs = [job for target_jobs in jobs.values() for job in target_jobs.values()]
+            if all_jobs:
+                capturer.capture_many(all_jobs, silent=1)
+            span.add(shards=len(all_jobs))
+        lcov_runner.finish_coverage_files()
+
+        for target in targets:
+            policy = policies[target.name]
+            shard_info_files = [shard_info_file for _, shard_info_file in jobs[target.name].values()]
+            if shard_info_files:
+                lcov_runner.merge_tracefiles(shard_info_files, policy.lcov_info_file, silent=1)
+            else:
+                open(policy.lcov_info_file, 'w').close()
+            policy.lcov_base_file = lcov_path_policy.lcov_base_file
+            lcov_runner.finalize_coverage(policy, silent=1)
+
+        lcov_runner.merge_tracefiles([policies[target.name].lcov_info_file for target in targets],
+            lcov_path_policy.lcov_info_file, silent=1)
+        lcov_runner.finalize_coverage(lcov_path_policy, silent=1)
+
+        breakdown = target_breakdown({ target.name: policies[target.name].lcov_info_final_file for target in targets },
+            lcov_path_policy.lcov_info_final_file)
+        with open(os.path.join(opts.output_dir, 'targets.json'), 'w') as f:
+            json.dump(breakdown, f, indent=2)
+        combined = breakdown['combined']
+        print(f"{'target':<32} {'lines':>16} {'functions':>16} {'unique lines':>12}")
+        for name, stats in sorted(breakdown['targets'].items(), key=lambda item: -item[1]['LH']):
+            print(f"{name:<32} {stats['LH']:>7}/{stats['LF']:<8} {stats['FNH']:>7}/{stats['FNF']:<8} {stats['unique_lines']:>12}")
+        print(f"{'combined':<32} {combined['LH']:>7}/{combined['LF']:<8} {combined['FNH']:>7}/{combined['FNF']:<8}")
+
+        gen_html_path_policy.use_lcov_path_policy(lcov_path_policy)
+        with logger.span('report', profile=True):
+            gen_html_runner.gen_cov_report(gen_html_path_policy, silent=0)
+        logger.summary()
+    finally:
+        container.close()
+
+if __name__ == '__main__':
+    main()
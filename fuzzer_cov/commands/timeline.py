@@ -0,0 +1,73 @@
+
+import argparse
+import datetime
+import os
+
+from fuzzer_cov.core import CoverageCapturer, FuzzerExecutor, Logger
+from fuzzer_cov.platform.corpus import list_corpus_files
+from fuzzer_cov.platform.lcov import LCovOutputPathPolicy
+from fuzzer_cov.platform.timeline import CoverageTimeline
+
+from fuzzer_cov.commands.libfuzzer import Opts, add_fuzzer_cov_arguments, \
+    get_fuzzer_cov_opts_from_command_line_options, create_container
+
+def parse_cmdline():
+    p = argparse.ArgumentParser()
+    p.prog = 'fuzzer_cov.commands.timeline'
+    add_fuzzer_cov_arguments(p)
+
+    p.add_argument("--samples", type=int, default=20,
+        help="Number of time-ordered batches to sample coverage after")
+    p.add_argument("--batch-size", type=int, default=None,
+        help="Inputs per batch, overrides --samples")
+
+    return p, p.parse_args()
+
+def main():
+    p, args = parse_cmdline()
+    if args.samples < 1 or (args.batch_size is not None and args.batch_size < 1):
+        p.error("--samples and --batch-size must be positive")
+
+    # tracefiles and results live below --out/timeline, a libfuzzer run in
+    # --out is left alone
+    args.out = os.path.join(args.out, 'timeline')
+    opts = Opts()
+    get_fuzzer_cov_opts_from_command_line_options(opts, args)
+    # counter deltas are read per object file with gcov, and counters must
+    # accumulate in the build tree between batches
+    opts.capture_backend = 'gcov'
+    opts.jobs = 1
+    container = create_container(opts)
+    try:
+
+        logger = container.resolve(Logger)
+        lcov_path_policy = container.resolve(LCovOutputPathPolicy)
+        fuzzer_instance = container.resolve(FuzzerExecutor)
+        capturer = container.resolve(CoverageCapturer)
+
+        os.makedirs(opts.output_dir, exist_ok=True)
+        lcov_path_policy.initialize_file_structure(clean=True)
+        capturer.zero_counters(opts.source_dir)
+
+        case_files = sorted(list_corpus_files(args.corpus_dir), key=lambda path: (os.path.getmtime(path), path))
+        batch_size = args.batch_size or max(1, -(-len(case_files) // args.samples))
+
+        timeline = CoverageTimeline(capturer, opts.source_dir, opts.enable_branch_coverage)
+        timeline.initialize()
+        for i in range(0, len(case_files), batch_size):
+            batch = case_files[i:i + batch_size]
+            fuzzer_instance.exec_corpus_files(batch, silent=1)
+            row = timeline.sample(
+                inputs=i + len(batch),
+                time=datetime.datetime.fromtimestamp(os.path.getmtime(batch[-1])).isoformat())
+            logger.info(f"[{row['inputs']}/{len(case_files)}] {row['time']} lines {row['lines_covered']}/{row['lines_total']} (+{row['new_lines']})", row)
+
+        timeline.write(os.path.join(opts.output_dir, 'timeline.csv'), os.path.join(opts.output_dir, 'timeline.json'))
+        last_gain = timeline.last_gain()
+        if last_gain:
+            logger.info(f"last coverage gain at {last_gain['time']} (input {last_gain['inputs']})", last_gain)
+    finally:
+        container.close()
+
+if __name__ == '__main__':
+    main()
@@ -5,3 +5,5 @@ from .container import BuildContainer
 from .logger import Logger
 from .utils import Protocol
 from .executor import CommandExecutor, FuzzerExecutor
+from .capture import CoverageCapturer
+from .report import CoverageReporter
@@ -0,0 +1,22 @@
+
+from .utils import Protocol
+from .container import BuildContainer
+
+class CoverageCapturer(Protocol):
+    def __init__(self, container: BuildContainer):
+        raise NotImplementedError
+
+    def zero_counters(self, directory: str, silent: int=1):
+        raise NotImplementedError
+
+    def replay_env(self, counter_dir: str=None, fuzzer_path: str=None):
+        # environment of a replay process whose counters must land under
+        # counter_dir, None when the default location is fine
+        raise NotImplementedError
+
+    def capture(self, directory: str, output_file: str, initial: bool=False, silent: int=1):
+        raise NotImplementedError
+
+    def capture_many(self, jobs: list, silent: int=1):
+        # jobs: (directory, output_file) pairs captured concurrently
+        raise NotImplementedError
@@ -1,30 +1,111 @@
 
+import threading
 import typing
 
 from .utils import Protocol
 
+# a new instance on every resolve, one per scope, one per process
+TRANSIENT = 'transient'
+SCOPED = 'scoped'
+SINGLETON = 'singleton'
+
 cT = typing.TypeVar('T')
 class BuildContainer(Protocol):
     T = cT
     opts: object
 
-    def register_impl(self, t: type, p: type=None):
+    def register_impl(self, t: type, p: type=None, lifetime: str=TRANSIENT):
+        raise NotImplementedError
+
+    def register_instance(self, instance: object, p: type=None, owned: bool=False):
         raise NotImplementedError
 
     def resolve(self, t: typing.Type[cT]) -> cT:
         raise NotImplementedError
 
+    def create_scope(self, opts=None) -> 'BuildContainer':
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
 class BuildContainerImpl(BuildContainer):
     opts: object
 
-    def __init__(self, opts):
+    def __init__(self, opts, parent: 'BuildContainerImpl'=None):
         self.opts = opts
-        self.type_protocols = dict()
+        self.root = self if parent is None else parent.root
+        # registrations are shared by every scope of a root container
+        self.type_protocols = dict() if parent is None else parent.type_protocols
+        self.lifetimes = dict() if parent is None else parent.lifetimes
+        self.instances = dict()
+        self.owned = []
+        # construction resolves dependencies recursively, from any thread
+        self.lock = threading.RLock() if parent is None else parent.lock
+        # the singleton under construction on this thread, if any
+        self.building = threading.local() if parent is None else parent.building
 
-    def register_impl(self, t: type, p: type=None):
+    def register_impl(self, t: type, p: type=None, lifetime: str=TRANSIENT):
+        if lifetime not in (TRANSIENT, SCOPED, SINGLETON):
+            raise ValueError(f"unknown lifetime: {lifetime}")
         if p:
             self.type_protocols[p] = t
         self.type_protocols[t] = t
+        self.lifetimes[t] = lifetime
+
+    def register_instance(self, instance: object, p: type=None, owned: bool=False):
+        # a prebuilt singleton, closed with the root container when owned and
+        # by whoever built it otherwise
+        t = type(instance)
+        self.register_impl(t, p, SINGLETON)
+        self.root.instances[t] = instance
+        if owned:
+            self.root.owned.append(instance)
 
     def resolve(self, t: typing.Type[BuildContainer.T]) -> BuildContainer.T:
-        return self.type_protocols[t](self)
+        impl = self.type_protocols[t]
+        lifetime = self.lifetimes[impl]
+        singleton = getattr(self.building, 'singleton', None)
+        if lifetime == SCOPED and singleton is not None:
+            # it would be captured from the root and outlive every scope
+            raise ValueError(f"singleton {singleton.__name__} cannot depend on scoped {impl.__name__}")
+        if lifetime == TRANSIENT:
+            return impl(self)
+        # singletons are built against the root, they never see a scope's opts
+        owner = self.root if lifetime == SINGLETON else self
+        with self.lock:
+            instance = owner.instances.get(impl)
+            if instance is None:
+                instance = owner.instances[impl] = self._build(impl, owner, lifetime)
+                owner.owned.append(instance)
+            return instance
+
+    def _build(self, impl: type, owner: 'BuildContainerImpl', lifetime: str):
+        if lifetime != SINGLETON or getattr(self.building, 'singleton', None) is not None:
+            return impl(owner)
+        self.building.singleton = impl
+        try:
+            return impl(owner)
+        finally:
+            self.building.singleton = None
+
+    def create_scope(self, opts=None) -> 'BuildContainerImpl':
+        return BuildContainerImpl(self.opts if opts is None else opts, self)
+
+    def close(self):
+        # scoped (and for the root, singleton) instances in reverse order of
+        # construction
+        with self.lock:
+            owned, self.owned = self.owned, []
+            owned_ids = set(map(id, owned))
+            self.instances = { t: instance for t, instance in self.instances.items() if id(instance) not in owned_ids }
+        for instance in reversed(owned):
+            close = getattr(instance, 'close', None)
+            if close is not None:
+                close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -6,10 +6,15 @@ class CommandExecutor(Protocol):
     def __init__(self, container: BuildContainer):
         raise NotImplementedError
 
-    def must_exec(self, cmd, silent: int=1):
+    def must_exec(self, cmd, silent: int=1, env: dict=None, timeout: float=None):
         raise NotImplementedError
     
-    def exec(self, cmd, silent: int=1):
+    def exec(self, cmd, silent: int=1, env: dict=None, timeout: float=None, output_file: str=None):
+        # with output_file, stdout goes to that file and only stderr is
+        # returned as output lines
+        raise NotImplementedError
+
+    def exec_many(self, cmds: list, silent: int=1, envs: list=None, timeout: float=None, output_files: list=None):
         raise NotImplementedError
 
 class FuzzerExecutor(Protocol):
@@ -21,3 +26,12 @@ class FuzzerExecutor(Protocol):
     
     def exec_corpus_set(self, corpus_dir: str, silent: int=1):
         raise NotImplementedError
+
+    def exec_corpus_files(self, case_files: list, silent: int=1):
+        raise NotImplementedError
+
+    def exec_corpus_groups(self, groups: list, silent: int=1, clean: bool=True):
+        raise NotImplementedError
+
+    def exec_corpus_chunks(self, checkpoint, resume: bool=False, silent: int=1):
+        raise NotImplementedError
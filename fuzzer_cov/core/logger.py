@@ -1,4 +1,11 @@
 
+import cProfile
+import json
+import os
+import resource
+import threading
+import time
+
 from .utils import Protocol
 from .container import BuildContainer
 
@@ -21,9 +28,131 @@ class Logger(Protocol):
     def critical(self, msg, log_obj=None):
         raise NotImplementedError
 
+    def span(self, name: str, log_obj=None, profile: bool=False):
+        raise NotImplementedError
+
+    def summary(self):
+        raise NotImplementedError
+
+def _rusage():
+    now = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return now.ru_utime + now.ru_stime, children.ru_utime + children.ru_stime, now.ru_maxrss, children.ru_maxrss
+
+class Span(object):
+    name: str
+
+    def __init__(self, recorder, name: str, log_obj=None, profile: bool=False):
+        self.recorder = recorder
+        self.name = name
+        self.log_obj = log_obj
+        self.profile = profile
+        # item counts, e.g. inputs replayed or tracefile bytes
+        self.counts = {}
+        self._profiler = None
+
+    def add(self, **counts):
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+        return self
+
+    def __enter__(self):
+        self._begin = time.perf_counter(), time.thread_time(), _rusage()
+        if self.profile:
+            self._profiler = self.recorder.start_profile()
+        return self
+
+    def __exit__(self, *exc):
+        wall, cpu, usage = self._begin
+        end_usage = _rusage()
+        if self._profiler is not None:
+            self.recorder.stop_profile(self._profiler, self.name)
+        # cpu is the calling thread's time, process_cpu covers all threads
+        # and children_cpu only children reaped during the span
+        self.recorder.record({
+            'span': self.name,
+            'wall': time.perf_counter() - wall,
+            'cpu': time.thread_time() - cpu,
+            'process_cpu': end_usage[0] - usage[0],
+            'children_cpu': end_usage[1] - usage[1],
+            'max_rss_kb': end_usage[2],
+            'children_max_rss_kb': end_usage[3],
+            'counts': self.counts,
+            'info': self.log_obj,
+        })
+        return False
+
+class SpanRecorder(object):
+    metrics_file: str
+    profile_dir: str
+
+    def __init__(self, metrics_file: str=None, profile_dir: str=None):
+        self.metrics_file = metrics_file
+        self.profile_dir = profile_dir
+        self.records = []
+        self._lock = threading.Lock()
+        self._profiling = False
+        if metrics_file:
+            os.makedirs(os.path.dirname(os.path.abspath(metrics_file)), exist_ok=True)
+            open(metrics_file, 'w').close()
+
+    def record(self, record: dict):
+        with self._lock:
+            self.records.append(record)
+            if self.metrics_file:
+                with open(self.metrics_file, 'a') as f:
+                    f.write(json.dumps(record, default=str) + '\n')
+
+    def start_profile(self):
+        # cProfile only sees one thread and profilers do not nest, spans
+        # entered while another one profiles are only timed
+        if not self.profile_dir or threading.current_thread() is not threading.main_thread():
+            return None
+        with self._lock:
+            if self._profiling:
+                return None
+            self._profiling = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def stop_profile(self, profiler, name: str):
+        profiler.disable()
+        os.makedirs(self.profile_dir, exist_ok=True)
+        profiler.dump_stats(os.path.join(self.profile_dir, f"{name.replace(os.sep, '_')}.prof"))
+        with self._lock:
+            self._profiling = False
+
+    def summary_rows(self):
+        rows = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            row = rows.setdefault(record['span'], {
+                'span': record['span'], 'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'children_cpu': 0.0,
+                'max_rss_kb': 0, 'counts': {},
+            })
+            row['calls'] += 1
+            row['wall'] += record['wall']
+            row['cpu'] += record['cpu']
+            row['children_cpu'] += record['children_cpu']
+            row['max_rss_kb'] = max(row['max_rss_kb'], record['max_rss_kb'], record['children_max_rss_kb'])
+            for key, value in record['counts'].items():
+                row['counts'][key] = row['counts'].get(key, 0) + value
+        return list(rows.values())
+
+    def format_summary(self) -> str:
+        lines = [f"{'span':<24} {'calls':>6} {'wall s':>9} {'cpu s':>9} {'child s':>9} {'rss MiB':>8}  counts"]
+        for row in self.summary_rows():
+            counts = ' '.join(f"{key}={value}" for key, value in sorted(row['counts'].items()))
+            lines.append(f"{row['span']:<24} {row['calls']:>6} {row['wall']:>9.2f} {row['cpu']:>9.2f} "
+                f"{row['children_cpu']:>9.2f} {row['max_rss_kb'] / 1024:>8.1f}  {counts}")
+        return '\n'.join(lines)
+
 class LoggerImpl(Logger):
+    # registered per scope, the components of one run share its recorder
     def __init__(self, container):
-        pass
+        self.recorder = SpanRecorder(container.opts.metrics_file, container.opts.profile_dir)
 
     def verbose(self, msg, log_obj=None):
         print(msg, log_obj)
@@ -39,3 +168,9 @@ class LoggerImpl(Logger):
 
     def critical(self, msg, log_obj=None):
         print(msg, log_obj)
+
+    def span(self, name: str, log_obj=None, profile: bool=False):
+        return Span(self.recorder, name, log_obj, profile)
+
+    def summary(self):
+        print(self.recorder.format_summary())
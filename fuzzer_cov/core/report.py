@@ -0,0 +1,12 @@
+
+from .utils import Protocol
+from .container import BuildContainer
+
+class CoverageReporter(Protocol):
+    def __init__(self, container: BuildContainer):
+        raise NotImplementedError
+
+    def gen_cov_report(self, p, silent: int=1):
+        # p: output path policy, renders p.lcov_info_final_file into
+        # p.gen_html_output_dir
+        raise NotImplementedError
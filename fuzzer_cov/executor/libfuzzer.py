@@ -1,20 +1,129 @@
 
-from fuzzer_cov.core import BuildContainer
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shutil
+
+from fuzzer_cov.core import BuildContainer, CoverageCapturer
 from fuzzer_cov.core import FuzzerExecutor
 from fuzzer_cov.core import Logger
 from fuzzer_cov.core.executor import CommandExecutor
+from fuzzer_cov.platform.corpus import list_corpus_files, split_corpus, link_corpus_files, shard_paths, \
+    hash_file, ReplayCheckpoint
 
 class LibFuzzerInstanceExecutor(FuzzerExecutor):
     fuzzer_path: str
+    jobs: int
+    shard_output_dir: str
+    quarantine_dir: str
+    input_timeout: int
     logger: Logger
 
     def __init__(self, container: BuildContainer):
         self.fuzzer_path = container.opts.fuzzer_path
+        self.jobs = container.opts.jobs
+        self.shard_output_dir = container.opts.shard_output_dir
+        self.quarantine_dir = container.opts.quarantine_dir
+        self.input_timeout = container.opts.input_timeout
         self.logger = container.resolve(Logger)
         self.cmd_executor = container.resolve(CommandExecutor)
+        self.capturer = container.resolve(CoverageCapturer)
+
+    def fuzzer_cmd(self, path: str) -> list:
+        return [self.fuzzer_path, path, '-runs=1', f"-timeout={self.input_timeout}"]
 
     def exec_one_file(self, case_file: str, silent: int=1):
-        return self.cmd_executor.exec(f"{self.fuzzer_path} {case_file} -runs=1 -timeout=600", silent)
+        return self.cmd_executor.exec(self.fuzzer_cmd(case_file), silent, env=self.capturer.replay_env())
 
     def exec_corpus_set(self, corpus_dir: str, silent: int=1):
-        return self.cmd_executor.exec(f"{self.fuzzer_path} {corpus_dir} -runs=1 -timeout=600", silent)
+        if self.jobs > 1:
+            return self.exec_corpus_files(list_corpus_files(corpus_dir), silent)
+        return self.cmd_executor.exec(self.fuzzer_cmd(corpus_dir), silent, env=self.capturer.replay_env())
+
+    def exec_corpus_files(self, case_files: list, silent: int=1):
+        if os.path.exists(self.shard_output_dir):
+            shutil.rmtree(self.shard_output_dir)
+        shards = split_corpus(case_files, self.jobs)
+        self.logger.info(f"replay {len(case_files)} inputs in {len(shards)} shards",
+            { 'inputs': len(case_files), 'shards': len(shards) })
+        if len(shards) == 1:
+            corpus_dir, _ = shard_paths(self.shard_output_dir, 0)
+            link_corpus_files(shards[0], corpus_dir)
+            return self.cmd_executor.exec(self.fuzzer_cmd(corpus_dir), silent, env=self.capturer.replay_env())
+        return self.exec_corpus_groups(shards, silent, clean=False)
+
+    def exec_corpus_groups(self, groups: list, silent: int=1, clean: bool=True):
+        # every group dumps its counters under its own shard root, gcda files
+        # of concurrent processes never collide and each group can be
+        # captured on its own
+        if clean and os.path.exists(self.shard_output_dir):
+            shutil.rmtree(self.shard_output_dir)
+        cmds, envs = [], []
+        for i, case_files in enumerate(groups):
+            corpus_dir, gcda_dir = shard_paths(self.shard_output_dir, i)
+            link_corpus_files(case_files, corpus_dir)
+            cmds.append(self.fuzzer_cmd(corpus_dir))
+            envs.append(self.capturer.replay_env(gcda_dir, self.fuzzer_path))
+        exit_code, lines = 0, []
+        for code, out in self.cmd_executor.exec_many(cmds, silent, envs=envs):
+            exit_code = exit_code or code
+            lines.extend(out)
+        return exit_code, lines
+
+    def exec_corpus_chunks(self, checkpoint: ReplayCheckpoint, resume: bool=False, silent: int=1):
+        # counters of every chunk are dumped under a shard root even with a
+        # single job, so a resumed run finds the completed chunks' counters
+        # where collect_coverage looks for them
+        if not resume:
+            for directory in (self.shard_output_dir, self.quarantine_dir):
+                if os.path.exists(directory):
+                    shutil.rmtree(directory)
+        for shard in sorted(checkpoint.interrupted):
+            # a chunk was cut short after its process may have dumped
+            # counters, replaying it on top would count it twice
+            _, gcda_dir = shard_paths(self.shard_output_dir, shard)
+            if os.path.exists(gcda_dir):
+                shutil.rmtree(gcda_dir)
+            checkpoint.reset_shard(shard)
+            self.logger.info(f"shard {shard} was interrupted, replaying its chunks again", { 'shard': shard })
+        checkpoint.save()
+        pending = checkpoint.pending_chunks()
+        queues = [queue for queue in (pending[i::self.jobs] for i in range(self.jobs)) if queue]
+        self.logger.info(f"replay {len(pending)} chunks of {checkpoint.chunk_size} inputs in {len(queues)} shards",
+            { 'chunks': len(pending), 'completed': len(checkpoint.completed), 'shards': len(queues) })
+        shard_silent = 1 if silent == 2 and len(queues) > 1 else silent
+        def run_queue(shard: int):
+            for chunk_id, case_files in queues[shard]:
+                checkpoint.start_chunk(chunk_id, shard)
+                self._replay_chunk(shard, case_files, checkpoint, shard_silent)
+                checkpoint.complete_chunk(chunk_id, shard)
+        with ThreadPoolExecutor(max_workers=max(1, len(queues))) as pool:
+            list(pool.map(run_queue, range(len(queues))))
+        checkpoint.save()
+        return checkpoint.quarantined
+
+    def _replay_chunk(self, shard: int, case_files: list, checkpoint: ReplayCheckpoint, silent: int=1):
+        # a crashing or killed process never dumps its counters, so the
+        # halves of a failed chunk can be replayed without double counting
+        corpus_dir, gcda_dir = shard_paths(self.shard_output_dir, shard)
+        if os.path.exists(corpus_dir):
+            shutil.rmtree(corpus_dir)
+        link_corpus_files(case_files, corpus_dir)
+        env = self.capturer.replay_env(gcda_dir, self.fuzzer_path)
+        code, _ = self.cmd_executor.exec(self.fuzzer_cmd(corpus_dir), silent, env=env)
+        if not code:
+            return
+        if len(case_files) == 1:
+            self._quarantine(case_files[0], code, checkpoint)
+            return
+        self.logger.info(f"chunk of {len(case_files)} inputs failed with '{code}', bisecting",
+            { 'shard': shard, 'inputs': len(case_files), 'exit_code': code })
+        mid = len(case_files) // 2
+        self._replay_chunk(shard, case_files[:mid], checkpoint, silent)
+        self._replay_chunk(shard, case_files[mid:], checkpoint, silent)
+
+    def _quarantine(self, case_file: str, exit_code: int, checkpoint: ReplayCheckpoint):
+        self.logger.warn(f"quarantined {case_file}, replay exit status '{exit_code}'",
+            { 'input': case_file, 'exit_code': exit_code })
+        checkpoint.quarantine(case_file, exit_code)
+        os.makedirs(self.quarantine_dir, exist_ok=True)
+        shutil.copyfile(case_file, os.path.join(self.quarantine_dir, f"{hash_file(case_file)[:16]}-{os.path.basename(case_file)}"))
@@ -0,0 +1,157 @@
+
+import asyncio
+from collections import deque
+import itertools
+import os
+import sys
+
+from fuzzer_cov.core import BuildContainer, CommandExecutor, Logger
+from .executor import command_span_name, format_cmd
+
+class AsyncCommandExecutorImpl(CommandExecutor):
+    max_concurrency: int
+    chunk_size: int
+    output_buffer_lines: int
+    max_line_bytes: int
+    command_log_dir: str
+    command_timeout: float
+
+    _log_ids = itertools.count()
+
+    def __init__(self, container: BuildContainer):
+        self.logger = container.resolve(Logger)
+        self.max_concurrency = container.opts.max_concurrency or os.cpu_count() or 1
+        self.command_timeout = container.opts.command_timeout
+        self.command_log_dir = container.opts.command_log_dir
+        self.chunk_size = 1 << 16
+        self.output_buffer_lines = 10000
+        self.max_line_bytes = 1 << 16
+
+    def must_exec(self, cmd, silent: int=1, env: dict=None, timeout: float=None):
+        code, out = self.exec(cmd, silent, env=env, timeout=timeout)
+        if code:
+            raise Exception(f"command executor exit with non-zero code: {code}")
+        return out
+
+    def exec(self, cmd, silent: int=1, env: dict=None, timeout: float=None, output_file: str=None):
+        # each calling thread drives its own loop, callers may already run
+        # exec from a thread pool
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.exec_async(cmd, silent, env=env, timeout=timeout,
+                output_file=output_file))
+        finally:
+            loop.close()
+
+    def exec_many(self, cmds: list, silent: int=1, envs: list=None, timeout: float=None, output_files: list=None):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.exec_many_async(cmds, silent, envs=envs, timeout=timeout,
+                output_files=output_files))
+        finally:
+            loop.close()
+
+    async def exec_many_async(self, cmds: list, silent: int=1, envs: list=None, timeout: float=None,
+            output_files: list=None):
+        envs = envs or [None] * len(cmds)
+        output_files = output_files or [None] * len(cmds)
+        # interleaved progress lines are unreadable, keep at most chunk-buffered
+        silent = 1 if silent == 2 else silent
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        async def run(cmd, env, output_file):
+            async with semaphore:
+                return await self.exec_async(cmd, silent, env=env, timeout=timeout, output_file=output_file)
+        return await asyncio.gather(*(run(cmd, env, output_file)
+            for cmd, env, output_file in zip(cmds, envs, output_files)))
+
+    def _open_log(self, cmd):
+        if not self.command_log_dir:
+            return None
+        os.makedirs(self.command_log_dir, exist_ok=True)
+        log_file = os.path.join(self.command_log_dir, f"cmd-{os.getpid()}-{next(self._log_ids):05d}.log")
+        f = open(log_file, 'wb')
+        f.write(format_cmd(cmd).encode() + b'\n')
+        return f
+
+    async def exec_async(self, cmd, silent: int=1, env: dict=None, timeout: float=None, output_file: str=None):
+        with self.logger.span(command_span_name(cmd), { 'cmd': format_cmd(cmd) }) as span:
+            output = open(output_file, 'wb') if output_file else None
+            try:
+                return await self._exec_async(cmd, silent, env, timeout, span, output)
+            finally:
+                if output is not None:
+                    output.close()
+
+    async def _exec_async(self, cmd, silent: int, env: dict, timeout: float, span, output=None):
+        timeout = timeout or self.command_timeout
+        self.logger.info(f"CMD: {format_cmd(cmd)}", { 'cmd': cmd, 'env': env,
+            'output_file': None if output is None else output.name })
+
+        if env is not None:
+            env = dict(os.environ, **env)
+        # stdout written to a file leaves stderr as the output to pump
+        stdout = output or asyncio.subprocess.PIPE
+        stderr = asyncio.subprocess.PIPE if output else asyncio.subprocess.STDOUT
+        if isinstance(cmd, str):
+            process = await asyncio.create_subprocess_shell(cmd, stdin=asyncio.subprocess.DEVNULL,
+                stdout=stdout, stderr=stderr, env=env)
+        else:
+            process = await asyncio.create_subprocess_exec(*cmd, stdin=asyncio.subprocess.DEVNULL,
+                stdout=stdout, stderr=stderr, env=env)
+        stream = process.stderr if output else process.stdout
+
+        # only the tail of the output is kept in memory, the full output goes
+        # to the command log
+        lines = deque(maxlen=self.output_buffer_lines)
+        log = self._open_log(cmd)
+        async def pump():
+            pending = b''
+            while True:
+                chunk = await stream.read(self.chunk_size)
+                if not chunk:
+                    break
+                span.add(output_bytes=len(chunk))
+                if log is not None:
+                    log.write(chunk)
+                if silent == 0:
+                    sys.stdout.write(chunk.decode(errors='replace'))
+                parts = (pending + chunk).split(b'\n')
+                pending = parts.pop()
+                if len(pending) > self.max_line_bytes:
+                    # output without newlines is kept as a line of its own
+                    parts.append(pending)
+                    pending = b''
+                lines.extend(part.decode(errors='replace') for part in parts)
+                if silent == 2 and parts:
+                    # one status line per chunk instead of one per output line
+                    sys.stdout.write('\r\033[K' + parts[-1].decode(errors='replace')[:200])
+                    sys.stdout.flush()
+            if pending:
+                lines.append(pending.decode(errors='replace'))
+            return await process.wait()
+
+        exit_code = None
+        try:
+            exit_code = await asyncio.wait_for(pump(), timeout)
+        except asyncio.TimeoutError:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                # exited (and was reaped) after the timeout fired
+                pass
+            exit_code = await process.wait()
+            self.logger.warn(f"    Timeout after {timeout}s for CMD: {format_cmd(cmd)}", { 'timeout': timeout, 'cmd': cmd })
+        finally:
+            if log is not None:
+                log.close()
+                # only failed commands keep their log, one per replayed input
+                # would pile up otherwise
+                if exit_code == 0:
+                    os.unlink(log.name)
+        if silent == 2:
+            sys.stdout.write('\n')
+
+        if exit_code:
+            self.logger.info(f"    Non-zero exit status '{exit_code}' for CMD: {format_cmd(cmd)}",
+                { 'exit_code': exit_code, 'cmd': cmd, 'log': None if log is None else log.name })
+        return exit_code, list(lines)
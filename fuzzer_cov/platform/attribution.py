@@ -0,0 +1,110 @@
+
+import heapq
+import json
+import os
+
+from .tracefile import read_tracefile
+
+def popcount(bits: int) -> int:
+    return bin(bits).count('1')
+
+class CoverageAttribution(object):
+    branch_coverage: bool
+
+    def __init__(self, branch_coverage: bool=False):
+        self.branch_coverage = branch_coverage
+        # coverage point -> bit index, a point is (file, line) or
+        # (file, line, block, branch)
+        self.point_ids = {}
+        self.points = []
+        # one entry per replayed batch: the inputs and the bitset of the
+        # points they covered, python ints are arbitrary width bitsets
+        self.inputs = []
+        self.bitsets = []
+
+    def _point_id(self, point):
+        point_id = self.point_ids.get(point)
+        if point_id is None:
+            point_id = self.point_ids[point] = len(self.points)
+            self.points.append(point)
+        return point_id
+
+    def add_tracefile(self, case_files: list, tracefile: str):
+        point_ids = []
+        for record in read_tracefile(tracefile):
+            for lineno, count in record.lines.items():
+                if count:
+                    point_ids.append(self._point_id((record.source_file, lineno)))
+            if self.branch_coverage:
+                for (lineno, block, branch), taken in record.branches.items():
+                    if taken:
+                        point_ids.append(self._point_id((record.source_file, lineno, block, branch)))
+        # `bits |= 1 << id` would copy the growing int for every point, set
+        # them in a buffer and convert once
+        buffer = bytearray((len(self.points) + 7) >> 3)
+        for point_id in point_ids:
+            buffer[point_id >> 3] |= 1 << (point_id & 7)
+        bits = int.from_bytes(buffer, 'little')
+        self.inputs.append(list(case_files))
+        self.bitsets.append(bits)
+        return popcount(bits)
+
+    def total(self) -> int:
+        bits = 0
+        for bitset in self.bitsets:
+            bits |= bitset
+        return bits
+
+    def minimize(self):
+        # lazy greedy set cover: a batch's gain can only shrink as coverage
+        # grows, so a stale heap entry that is still the best after being
+        # refreshed is the true maximum
+        covered, chosen = 0, []
+        heap = [(-popcount(bits), i) for i, bits in enumerate(self.bitsets) if bits]
+        heapq.heapify(heap)
+        while heap:
+            neg_gain, i = heapq.heappop(heap)
+            gain = popcount(self.bitsets[i] & ~covered)
+            if not gain:
+                continue
+            if heap and gain < -heap[0][0]:
+                heapq.heappush(heap, (-gain, i))
+                continue
+            covered |= self.bitsets[i]
+            chosen.append(i)
+        return [case_file for i in chosen for case_file in self.inputs[i]]
+
+    def inputs_hitting(self, source_file: str, lineno: int):
+        hits = []
+        for point, point_id in self.point_ids.items():
+            if len(point) != 2 or point[1] != lineno:
+                continue
+            if point[0] != source_file and not point[0].endswith(os.sep + source_file):
+                continue
+            mask = 1 << point_id
+            for case_files, bits in zip(self.inputs, self.bitsets):
+                if bits & mask:
+                    hits.extend(case_files)
+        return sorted(set(hits))
+
+    def save(self, path: str):
+        tmp_file = path + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({
+                'branch_coverage': self.branch_coverage,
+                'points': self.points,
+                'inputs': self.inputs,
+                'bitsets': [format(bits, 'x') for bits in self.bitsets],
+            }, f)
+        os.replace(tmp_file, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        attribution = cls(branch_coverage=data['branch_coverage'])
+        for point in data['points']:
+            attribution._point_id(tuple(point))
+        attribution.inputs = data['inputs']
+        attribution.bitsets = [int(bits, 16) for bits in data['bitsets']]
+        return attribution
@@ -0,0 +1,91 @@
+
+import hashlib
+import json
+import os
+
+from .gcov import find_gcov_files
+
+class BuildIndex(object):
+    index_file: str
+    source_dir: str
+    follow_links: bool
+    fuzzer_fingerprint: str
+
+    def __init__(self, index_file: str, source_dir: str, follow_links: bool=False):
+        self.index_file = index_file
+        self.source_dir = os.path.abspath(source_dir)
+        self.follow_links = follow_links
+        self.fuzzer_fingerprint = ''
+        # .gcno path -> [size, mtime_ns]
+        self.gcno_files = {}
+
+    def load(self):
+        if not os.path.exists(self.index_file):
+            return False
+        with open(self.index_file, 'r') as f:
+            data = json.load(f)
+        if data.get('source_dir') != self.source_dir or data.get('follow_links') != self.follow_links:
+            return False
+        self.fuzzer_fingerprint = data.get('fuzzer', '')
+        self.gcno_files = data.get('gcno_files', {})
+        return True
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_file)), exist_ok=True)
+        tmp_file = self.index_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({
+                'source_dir': self.source_dir,
+                'follow_links': self.follow_links,
+                'fuzzer': self.fuzzer_fingerprint,
+                'gcno_files': self.gcno_files,
+            }, f)
+        os.replace(tmp_file, self.index_file)
+
+    def is_valid(self, fuzzer_fingerprint: str):
+        # a rebuild relinks the fuzzers, so unchanged fuzzers (every target
+        # of the tree) and unchanged .gcno stats stand in for walking the
+        # tree for new objects
+        if not self.gcno_files or self.fuzzer_fingerprint != fuzzer_fingerprint:
+            return False
+        for gcno_file, (size, mtime_ns) in self.gcno_files.items():
+            try:
+                st = os.stat(gcno_file)
+            except OSError:
+                return False
+            if st.st_size != size or st.st_mtime_ns != mtime_ns:
+                return False
+        return True
+
+    def scan(self, fuzzer_fingerprint: str):
+        self.fuzzer_fingerprint = fuzzer_fingerprint
+        self.gcno_files = {}
+        for gcno_file in find_gcov_files(self.source_dir, '.gcno', self.follow_links):
+            st = os.stat(gcno_file)
+            self.gcno_files[gcno_file] = [st.st_size, st.st_mtime_ns]
+        self.save()
+        return self
+
+    def refresh(self, fuzzer_fingerprint: str):
+        # returns whether the tree had to be walked again
+        if self.load() and self.is_valid(fuzzer_fingerprint):
+            return False
+        self.scan(fuzzer_fingerprint)
+        return True
+
+    def fingerprint(self) -> str:
+        digest = hashlib.sha256()
+        for gcno_file in sorted(self.gcno_files):
+            size, mtime_ns = self.gcno_files[gcno_file]
+            digest.update(f"{gcno_file}:{size}:{mtime_ns}\n".encode())
+        return digest.hexdigest()
+
+    def zero_counters(self):
+        removed = 0
+        for gcno_file in self.gcno_files:
+            try:
+                os.unlink(gcno_file[:-len('.gcno')] + '.gcda')
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
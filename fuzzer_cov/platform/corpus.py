@@ -0,0 +1,257 @@
+
+import hashlib
+import json
+import os
+import threading
+
+def list_corpus_files(corpus_dir: str):
+    # libFuzzer walks corpus directories recursively, so do the same
+    found = []
+    for root, _, files in os.walk(corpus_dir):
+        for name in files:
+            found.append(os.path.join(root, name))
+    found.sort()
+    return found
+
+def split_corpus(files, n: int):
+    # greedy longest-processing-time split, input size is a fair proxy for
+    # replay time and keeps shards finishing at about the same moment
+    n = max(1, min(n, len(files)))
+    shards = [[] for _ in range(n)]
+    loads = [0] * n
+    for size, path in sorted(((os.path.getsize(path), path) for path in files), reverse=True):
+        i = loads.index(min(loads))
+        shards[i].append(path)
+        loads[i] += size + 1
+    for shard in shards:
+        shard.sort()
+    return shards
+
+def link_corpus_files(files, target_dir: str):
+    os.makedirs(target_dir, exist_ok=True)
+    for i, path in enumerate(files):
+        # prefix with the index, inputs from different sub-directories may
+        # share a basename
+        os.symlink(os.path.abspath(path), os.path.join(target_dir, f"{i:08d}-{os.path.basename(path)}"))
+    return target_dir
+
+def _is_corpus_link(path: str):
+    name = os.path.basename(path)
+    return os.path.islink(path) and len(name) > 9 and name[:8].isdigit() and name[8] == '-'
+
+def list_corpus_links(target_dir: str):
+    # the links link_corpus_files made, a directory holding anything else
+    # is not ours to clear
+    if not os.path.lexists(target_dir):
+        return []
+    if os.path.islink(target_dir) or not os.path.isdir(target_dir):
+        raise Exception(f"not a directory of corpus links: {target_dir}")
+    paths = [os.path.join(target_dir, name) for name in sorted(os.listdir(target_dir))]
+    if not all(map(_is_corpus_link, paths)):
+        raise Exception(f"directory holds more than corpus links: {target_dir}")
+    return paths
+
+def unlink_corpus_files(target_dir: str):
+    paths = list_corpus_links(target_dir)
+    for path in paths:
+        os.unlink(path)
+    return len(paths)
+
+def shard_paths(shard_output_dir: str, i: int):
+    shard_dir = os.path.join(shard_output_dir, str(i))
+    return os.path.join(shard_dir, 'corpus'), os.path.join(shard_dir, 'gcda')
+
+def list_shard_gcda_dirs(shard_output_dir: str):
+    # {shard: gcda dir} for the shards that dumped counters
+    if not os.path.isdir(shard_output_dir):
+        return {}
+    shards = sorted(int(name) for name in os.listdir(shard_output_dir) if name.isdigit())
+    gcda_dirs = { i: shard_paths(shard_output_dir, i)[1] for i in shards }
+    return { i: gcda_dir for i, gcda_dir in gcda_dirs.items() if os.path.isdir(gcda_dir) }
+
+def hash_file(path: str, block_size: int=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def fingerprint_file(path: str):
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+
+def fingerprint_files(paths):
+    return ';'.join(sorted({ fingerprint_file(path) for path in paths }))
+
+class CorpusManifest(object):
+    manifest_file: str
+    fuzzer_fingerprint: str
+
+    def __init__(self, manifest_file: str):
+        self.manifest_file = manifest_file
+        self.fuzzer_fingerprint = ''
+        # content hash -> path the input was first seen at
+        self.entries = {}
+        # path -> [size, mtime_ns, hash], avoids re-hashing unchanged files
+        self.stat_cache = {}
+
+    def load(self):
+        if not os.path.exists(self.manifest_file):
+            return False
+        with open(self.manifest_file, 'r') as f:
+            data = json.load(f)
+        self.fuzzer_fingerprint = data.get('fuzzer', '')
+        self.entries = data.get('entries', {})
+        self.stat_cache = data.get('stat_cache', {})
+        return True
+
+    def save(self):
+        tmp_file = self.manifest_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({
+                'fuzzer': self.fuzzer_fingerprint,
+                'entries': self.entries,
+                'stat_cache': self.stat_cache,
+            }, f)
+        os.replace(tmp_file, self.manifest_file)
+
+    def clear(self):
+        self.entries = {}
+        self.stat_cache = {}
+
+    def content_hash(self, path: str):
+        st = os.stat(path)
+        cached = self.stat_cache.get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        digest = hash_file(path)
+        self.stat_cache[path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def new_files(self, files):
+        found, seen = [], set()
+        for path in files:
+            digest = self.content_hash(path)
+            if digest in self.entries or digest in seen:
+                continue
+            seen.add(digest)
+            found.append(path)
+        return found
+
+    def add_files(self, files):
+        for path in files:
+            self.entries.setdefault(self.content_hash(path), path)
+
+def split_chunks(files, chunk_size: int):
+    return [files[i:i + chunk_size] for i in range(0, len(files), chunk_size)]
+
+class ReplayCheckpoint(object):
+    checkpoint_file: str
+    journal_file: str
+    fuzzer_fingerprint: str
+    chunk_size: int
+
+    def __init__(self, checkpoint_file: str):
+        # the corpus is written once per run, progress is appended to a
+        # journal of JSON lines next to it
+        self.checkpoint_file = checkpoint_file
+        self.journal_file = checkpoint_file + '.journal'
+        self.fuzzer_fingerprint = ''
+        self.chunk_size = 0
+        self.case_files = []
+        # id of a chunk whose counters are already dumped -> its shard
+        self.completed = {}
+        # input path -> exit code of its replay
+        self.quarantined = {}
+        # shards where a chunk was started but never completed, their
+        # counters may hold part of it
+        self.interrupted = set()
+        self._lock = threading.Lock()
+
+    def load(self):
+        if not os.path.exists(self.checkpoint_file):
+            return False
+        with open(self.checkpoint_file, 'r') as f:
+            data = json.load(f)
+        self.fuzzer_fingerprint = data.get('fuzzer', '')
+        self.chunk_size = data.get('chunk_size', 0)
+        self.case_files = data.get('case_files', [])
+        self.completed, self.quarantined, started = {}, {}, {}
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # the last line of a killed run may be cut short
+                        break
+                    if 'start' in record:
+                        started[record['start']] = record['shard']
+                    elif 'done' in record:
+                        started.pop(record['done'], None)
+                        self.completed[record['done']] = record['shard']
+                    elif 'quarantine' in record:
+                        self.quarantined[record['quarantine']] = record['exit_code']
+        self.interrupted = set(started.values())
+        return True
+
+    def save(self):
+        # rewrites the corpus and a compacted journal, once per replay
+        with self._lock:
+            data = {
+                'fuzzer': self.fuzzer_fingerprint,
+                'chunk_size': self.chunk_size,
+                'case_files': self.case_files,
+            }
+            tmp_file = self.checkpoint_file + '.tmp'
+            with open(tmp_file, 'w') as f:
+                json.dump(data, f)
+            tmp_journal = self.journal_file + '.tmp'
+            with open(tmp_journal, 'w') as f:
+                for i, shard in sorted(self.completed.items()):
+                    f.write(json.dumps({ 'done': i, 'shard': shard }) + '\n')
+                for case_file, exit_code in self.quarantined.items():
+                    f.write(json.dumps({ 'quarantine': case_file, 'exit_code': exit_code }) + '\n')
+            os.replace(tmp_journal, self.journal_file)
+            os.replace(tmp_file, self.checkpoint_file)
+
+    def _append(self, record: dict):
+        # callers hold the lock
+        with open(self.journal_file, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    def matches(self, fuzzer_fingerprint: str, chunk_size: int, case_files: list):
+        return self.fuzzer_fingerprint == fuzzer_fingerprint and self.chunk_size == chunk_size and \
+            self.case_files == list(case_files)
+
+    def reset(self, fuzzer_fingerprint: str, chunk_size: int, case_files: list):
+        self.fuzzer_fingerprint = fuzzer_fingerprint
+        self.chunk_size = chunk_size
+        self.case_files = list(case_files)
+        self.completed = {}
+        self.quarantined = {}
+        self.interrupted = set()
+        return self
+
+    def reset_shard(self, shard: int):
+        # the shard's counters were dropped, replay everything they held
+        self.completed = { i: owner for i, owner in self.completed.items() if owner != shard }
+        self.interrupted.discard(shard)
+
+    def pending_chunks(self):
+        return [(i, chunk) for i, chunk in enumerate(split_chunks(self.case_files, self.chunk_size))
+            if i not in self.completed]
+
+    def start_chunk(self, i: int, shard: int):
+        with self._lock:
+            self._append({ 'start': i, 'shard': shard })
+
+    def complete_chunk(self, i: int, shard: int):
+        with self._lock:
+            self.completed[i] = shard
+            self._append({ 'done': i, 'shard': shard })
+
+    def quarantine(self, case_file: str, exit_code: int):
+        with self._lock:
+            self.quarantined[case_file] = exit_code
+            self._append({ 'quarantine': case_file, 'exit_code': exit_code })
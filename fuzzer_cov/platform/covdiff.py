@@ -0,0 +1,162 @@
+
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import html
+import json
+import os
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .covstore import STORE_MAGIC, CoverageStore, lcov_to_store
+
+def is_store_file(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(len(STORE_MAGIC)) == STORE_MAGIC
+
+def _import_tracefile(job):
+    # runs in a worker process
+    tracefile, store_file = job
+    lcov_to_store(tracefile, store_file)
+    return store_file
+
+def open_stores(paths: list, cache_dir: str):
+    # tracefiles are converted into column stores once, in parallel, and
+    # the stores are kept keyed by the tracefile stat for later diffs
+    store_files, jobs = [], []
+    for path in paths:
+        if is_store_file(path):
+            store_files.append(path)
+            continue
+        st = os.stat(path)
+        key = hashlib.sha1(f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()
+        store_file = os.path.join(cache_dir, f"{key}.fzcov")
+        store_files.append(store_file)
+        if not os.path.exists(store_file):
+            jobs.append((path, store_file))
+    if jobs:
+        os.makedirs(cache_dir, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+            list(pool.map(_import_tracefile, jobs))
+    return [CoverageStore(store_file) for store_file in store_files]
+
+def _line_changes(a, b):
+    # a, b: FileCoverage or None; returns gained, lost, found_a, hit_a,
+    # found_b, hit_b with lines keyed by number
+    if numpy is not None:
+        empty = numpy.zeros(0, dtype='<i8')
+        la, ca = (a.as_numpy('lines'), a.as_numpy('counts')) if a is not None else (empty, empty)
+        lb, cb = (b.as_numpy('lines'), b.as_numpy('counts')) if b is not None else (empty, empty)
+        n = int(max(la.max(initial=0), lb.max(initial=0))) + 1
+        va = numpy.full(n, -1, dtype='<i8')
+        vb = numpy.full(n, -1, dtype='<i8')
+        va[la] = ca
+        vb[lb] = cb
+        gained = numpy.flatnonzero((vb > 0) & (va <= 0))
+        lost = numpy.flatnonzero((va > 0) & (vb <= 0))
+        return (gained.tolist(), lost.tolist(), int((va >= 0).sum()), int((va > 0).sum()),
+            int((vb >= 0).sum()), int((vb > 0).sum()))
+    va = dict(zip(a.columns['lines'], a.columns['counts'])) if a is not None else {}
+    vb = dict(zip(b.columns['lines'], b.columns['counts'])) if b is not None else {}
+    gained = sorted(lineno for lineno, count in vb.items() if count > 0 and va.get(lineno, 0) <= 0)
+    lost = sorted(lineno for lineno, count in va.items() if count > 0 and vb.get(lineno, 0) <= 0)
+    return (gained, lost, len(va), sum(1 for count in va.values() if count > 0),
+        len(vb), sum(1 for count in vb.values() if count > 0))
+
+def _covered_functions(cov):
+    if cov is None:
+        return set()
+    return { name for name, count in zip(cov.function_names, cov.columns['fn_counts']) if count > 0 }
+
+def _covered_branches(cov):
+    if cov is None:
+        return set()
+    c = cov.columns
+    return { (lineno, block, branch) for lineno, block, branch, taken in
+        zip(c['br_lines'], c['br_blocks'], c['br_branches'], c['br_taken']) if taken > 0 }
+
+def diff_file(a, b) -> dict:
+    gained, lost, found_a, hit_a, found_b, hit_b = _line_changes(a, b)
+    fn_a, fn_b = _covered_functions(a), _covered_functions(b)
+    br_a, br_b = _covered_branches(a), _covered_branches(b)
+    return {
+        'lines_found': [found_a, found_b],
+        'lines_hit': [hit_a, hit_b],
+        'lines_gained': gained,
+        'lines_lost': lost,
+        'functions_gained': sorted(fn_b - fn_a),
+        'functions_lost': sorted(fn_a - fn_b),
+        'branches_gained': sorted(br_b - br_a),
+        'branches_lost': sorted(br_a - br_b),
+    }
+
+def diff_stores(store_a: CoverageStore, store_b: CoverageStore, source_filter=None) -> dict:
+    files_a, files_b = set(store_a.source_files), set(store_b.source_files)
+    source_files = sorted(files_a | files_b)
+    if source_filter is not None:
+        source_files = [source_file for source_file in source_files if source_filter(source_file)]
+    summary = dict.fromkeys(('lines_gained', 'lines_lost', 'functions_gained', 'functions_lost',
+        'branches_gained', 'branches_lost'), 0)
+    summary.update(lines_hit=[0, 0], lines_found=[0, 0], files_added=0, files_removed=0)
+    files = {}
+    for source_file in source_files:
+        delta = diff_file(store_a.load(source_file) if source_file in files_a else None,
+            store_b.load(source_file) if source_file in files_b else None)
+        for i in range(2):
+            summary['lines_hit'][i] += delta['lines_hit'][i]
+            summary['lines_found'][i] += delta['lines_found'][i]
+        summary['files_added'] += 1 if source_file not in files_a else 0
+        summary['files_removed'] += 1 if source_file not in files_b else 0
+        changed = False
+        for key in ('lines_gained', 'lines_lost', 'functions_gained', 'functions_lost', 'branches_gained', 'branches_lost'):
+            summary[key] += len(delta[key])
+            changed = changed or bool(delta[key])
+        if changed:
+            files[source_file] = delta
+    return { 'summary': summary, 'files': files }
+
+def write_delta_json(delta: dict, output_file: str):
+    tmp_file = output_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(delta, f)
+    os.replace(tmp_file, output_file)
+
+_STYLE = """
+body { font-family: sans-serif; font-size: 13px; }
+table { border-collapse: collapse; }
+td, th { padding: 2px 8px; border: 1px solid #ccc; }
+th { background: #ddd; }
+.src { font-family: monospace; white-space: pre; }
+.gained { background: #cfc; }
+.lost { background: #fcc; }
+"""
+
+def write_delta_html(delta: dict, output_file: str, titles=('a', 'b')):
+    summary = delta['summary']
+    rows = [f"<tr><th>{html.escape(key)}</th><td>{html.escape(str(value))}</td></tr>"
+        for key, value in summary.items()]
+    body = [f"<h2>coverage delta: {html.escape(titles[0])} &rarr; {html.escape(titles[1])}</h2>",
+        "<table>" + ''.join(rows) + "</table>"]
+    for source_file, file_delta in sorted(delta['files'].items()):
+        try:
+            with open(source_file, 'r', errors='replace') as f:
+                source_lines = f.read().split('\n')
+        except OSError:
+            source_lines = []
+        changes = sorted([(lineno, 'gained') for lineno in file_delta['lines_gained']] +
+            [(lineno, 'lost') for lineno in file_delta['lines_lost']])
+        body.append(f"<h3>{html.escape(source_file)}: +{len(file_delta['lines_gained'])} "
+            f"-{len(file_delta['lines_lost'])} lines</h3><table>")
+        for lineno, kind in changes:
+            text = source_lines[lineno - 1] if 0 < lineno <= len(source_lines) else ''
+            body.append(f"<tr class=\"{kind}\"><td>{lineno}</td><td>{kind}</td>"
+                f"<td class=\"src\">{html.escape(text)}</td></tr>")
+        for kind in ('gained', 'lost'):
+            for name in file_delta[f"functions_{kind}"]:
+                body.append(f"<tr class=\"{kind}\"><td>fn</td><td>{kind}</td><td class=\"src\">{html.escape(name)}</td></tr>")
+        body.append("</table>")
+    with open(output_file, 'w') as f:
+        f.write(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>coverage delta</title>"
+            f"<style>{_STYLE}</style></head><body>\n" + '\n'.join(body) + "\n</body></html>\n")
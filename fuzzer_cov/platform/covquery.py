@@ -0,0 +1,285 @@
+
+from array import array
+from bisect import bisect_left, bisect_right
+import hashlib
+import io
+import os
+import threading
+
+from .demangle import CxxFiltDemangler, default_demangler
+from .tracefile import FileCounters, TracefileMerger
+
+_TOTAL_KEYS = ('LF', 'LH', 'FNF', 'FNH', 'BRF', 'BRH')
+
+def _new_totals():
+    return dict.fromkeys(_TOTAL_KEYS, 0)
+
+class FunctionEntry(object):
+    name: str
+    demangled_name: str
+    source_file: str
+    start_line: int
+    end_line: int
+    count: int
+    lines_found: int
+    lines_hit: int
+
+    def __init__(self, name: str, source_file: str, start_line: int, end_line: int, count: int):
+        self.name = name
+        self.demangled_name = name
+        self.source_file = source_file
+        self.start_line = start_line
+        self.end_line = end_line
+        self.count = count
+        self.lines_found = 0
+        self.lines_hit = 0
+
+    def as_dict(self):
+        return {
+            'name': self.name, 'demangled_name': self.demangled_name, 'source_file': self.source_file, 'start_line': self.start_line,
+            'end_line': self.end_line, 'count': self.count, 'covered': self.count > 0,
+            'lines_found': self.lines_found, 'lines_hit': self.lines_hit,
+        }
+
+class FileIndex(object):
+    source_file: str
+
+    def __init__(self, counters: FileCounters):
+        self.source_file = counters.source_file
+        lines = list(counters.iter_lines())
+        self.line_numbers = array('q', (lineno for lineno, _ in lines))
+        self.line_counts = array('q', (count for _, count in lines))
+        # per line: (branches found, branches hit)
+        self.branches = {}
+        for lineno, _, _, taken in counters.iter_branches():
+            found, hit = self.branches.get(lineno, (0, 0))
+            self.branches[lineno] = (found + 1, hit + (1 if taken else 0))
+
+        # FN only records where a function starts, it is taken to end where
+        # the next one starts
+        functions = [(lineno, name, count) for name, lineno, count in counters.iter_functions()]
+        last_line = self.line_numbers[-1] if self.line_numbers else 0
+        self.functions = {}
+        self.function_starts = array('q')
+        self.function_order = []
+        for i, (lineno, name, count) in enumerate(functions):
+            end_line = functions[i + 1][0] - 1 if i + 1 < len(functions) else max(lineno, last_line)
+            fn = FunctionEntry(name, self.source_file, lineno, max(lineno, end_line), count)
+            lo = bisect_left(self.line_numbers, fn.start_line)
+            hi = bisect_right(self.line_numbers, fn.end_line)
+            fn.lines_found = hi - lo
+            fn.lines_hit = sum(1 for count in self.line_counts[lo:hi] if count)
+            self.functions[name] = fn
+            self.function_starts.append(lineno)
+            self.function_order.append(fn)
+
+        self.totals = {
+            'LF': len(self.line_counts), 'LH': sum(1 for count in self.line_counts if count),
+            'FNF': len(self.functions), 'FNH': sum(1 for fn in self.functions.values() if fn.count),
+            'BRF': sum(found for found, _ in self.branches.values()),
+            'BRH': sum(hit for _, hit in self.branches.values()),
+        }
+
+    def line(self, lineno: int):
+        i = bisect_left(self.line_numbers, lineno)
+        if i < len(self.line_numbers) and self.line_numbers[i] == lineno:
+            return self.line_counts[i]
+        return None
+
+    def function_at(self, lineno: int):
+        i = bisect_right(self.function_starts, lineno) - 1
+        if i < 0:
+            return None
+        fn = self.function_order[i]
+        return fn if fn.start_line <= lineno <= fn.end_line else None
+
+    def uncovered_lines(self):
+        return [lineno for lineno, count in zip(self.line_numbers, self.line_counts) if not count]
+
+    def as_dict(self):
+        return { 'source_file': self.source_file, 'totals': dict(self.totals) }
+
+class DirectoryNode(object):
+    path: str
+
+    def __init__(self, path: str):
+        self.path = path
+        self.children = {}
+        self.files = {}
+        self.totals = _new_totals()
+
+    def as_dict(self):
+        return {
+            'path': self.path, 'totals': dict(self.totals),
+            'directories': sorted(child.path for child in self.children.values()),
+            'files': sorted(self.files),
+        }
+
+def _split_records(data: bytes):
+    # raw record chunks keyed by source file, a chunk that did not change
+    # between two loads is not parsed again
+    chunks, start = {}, 0
+    while True:
+        end = data.find(b'end_of_record', start)
+        if end < 0:
+            break
+        end = data.find(b'\n', end)
+        end = len(data) if end < 0 else end + 1
+        chunk = data[start:end]
+        sf = chunk.find(b'SF:')
+        if sf >= 0:
+            source_file = chunk[sf + 3:chunk.find(b'\n', sf)].decode()
+            chunks.setdefault(source_file, []).append(chunk)
+        start = end
+    return chunks
+
+class CoverageIndex(object):
+    tracefile: str
+
+    def __init__(self, tracefile: str, demangler: CxxFiltDemangler=None):
+        self.tracefile = tracefile
+        self.demangler = demangler or default_demangler
+        self.files = {}
+        self.functions_by_name = {}
+        self.root = DirectoryNode('/')
+        self._digests = {}
+        self._stat = None
+        self.lock = threading.RLock()
+
+    @classmethod
+    def load(cls, tracefile: str, demangler: CxxFiltDemangler=None):
+        index = cls(tracefile, demangler)
+        index.refresh()
+        return index
+
+    def _tracefile_stat(self):
+        try:
+            st = os.stat(self.tracefile)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def refresh(self, force: bool=False):
+        # returns the number of files re-indexed, 0 when the tracefile is unchanged
+        stat = self._tracefile_stat()
+        if stat is None or (stat == self._stat and not force):
+            return 0
+        with open(self.tracefile, 'rb') as f:
+            data = f.read()
+        chunks = _split_records(data)
+        digests = { source_file: hashlib.sha1(b''.join(parts)).digest() for source_file, parts in chunks.items() }
+        changed = [source_file for source_file, digest in digests.items() if self._digests.get(source_file) != digest]
+        removed = [source_file for source_file in self._digests if source_file not in digests]
+        merger = TracefileMerger()
+        if changed:
+            merger.add_stream(io.StringIO(b''.join(part for source_file in changed
+                for part in chunks[source_file]).decode(errors='replace')))
+        file_indexes = [FileIndex(merger.files[source_file]) for source_file in changed if source_file in merger.files]
+        # tracefiles hold mangled C++ names, one c++filt batch for every
+        # function of the changed files
+        names = self.demangler.demangle_all(fn.name for file_index in file_indexes
+            for fn in file_index.function_order if fn.name.startswith('_Z'))
+        for file_index in file_indexes:
+            for fn in file_index.function_order:
+                fn.demangled_name = names.get(fn.name) or fn.name
+        with self.lock:
+            for source_file in removed + changed:
+                self._remove_file(source_file)
+            for file_index in file_indexes:
+                self._add_file(file_index)
+            self._digests = digests
+            self._stat = stat
+        return len(changed) + len(removed)
+
+    def _ancestors(self, source_file: str, create: bool=False):
+        node = self.root
+        nodes = [node]
+        parts = [part for part in os.path.dirname(source_file).split('/') if part]
+        for i, part in enumerate(parts):
+            child = node.children.get(part)
+            if child is None:
+                if not create:
+                    break
+                child = node.children[part] = DirectoryNode('/' + '/'.join(parts[:i + 1]))
+            node = child
+            nodes.append(node)
+        return nodes
+
+    def _function_names(self, fn: FunctionEntry):
+        # the mangled name, the demangled signature and the signature
+        # without its parameters
+        return { fn.name, fn.demangled_name, fn.demangled_name.split('(', 1)[0] }
+
+    def _add_file(self, file_index: FileIndex):
+        self.files[file_index.source_file] = file_index
+        for fn in file_index.functions.values():
+            for name in self._function_names(fn):
+                self.functions_by_name.setdefault(name, []).append(fn)
+        nodes = self._ancestors(file_index.source_file, create=True)
+        nodes[-1].files[file_index.source_file] = file_index
+        for node in nodes:
+            for key in _TOTAL_KEYS:
+                node.totals[key] += file_index.totals[key]
+
+    def _remove_file(self, source_file: str):
+        file_index = self.files.pop(source_file, None)
+        if file_index is None:
+            return
+        for fn in file_index.functions.values():
+            for name in self._function_names(fn):
+                entries = [entry for entry in self.functions_by_name.get(name, []) if entry is not fn]
+                if entries:
+                    self.functions_by_name[name] = entries
+                else:
+                    self.functions_by_name.pop(name, None)
+        nodes = self._ancestors(source_file)
+        nodes[-1].files.pop(source_file, None)
+        for node in nodes:
+            for key in _TOTAL_KEYS:
+                node.totals[key] -= file_index.totals[key]
+        # prune directories left without files
+        for parent, node in reversed(list(zip(nodes, nodes[1:]))):
+            if node.files or node.children:
+                break
+            del parent.children[os.path.basename(node.path)]
+
+    def summary(self):
+        return dict(self.root.totals, files=len(self.files))
+
+    def file(self, source_file: str):
+        return self.files.get(source_file)
+
+    def directory(self, path: str):
+        node = self.root
+        for part in (part for part in path.split('/') if part):
+            node = node.children.get(part)
+            if node is None:
+                return None
+        return node
+
+    def function(self, name: str, source_file: str=None):
+        entries = self.functions_by_name.get(name, [])
+        if source_file is not None:
+            entries = [fn for fn in entries if fn.source_file == source_file]
+        return entries
+
+    def line(self, source_file: str, lineno: int):
+        file_index = self.files.get(source_file)
+        return None if file_index is None else file_index.line(lineno)
+
+    def function_at(self, source_file: str, lineno: int):
+        file_index = self.files.get(source_file)
+        return None if file_index is None else file_index.function_at(lineno)
+
+    def iter_files(self, prefix: str='/'):
+        node = self.directory(prefix)
+        if node is None:
+            return
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            yield from node.files.values()
+            stack.extend(node.children.values())
+
+    def uncovered_functions(self, prefix: str='/'):
+        return [fn for file_index in self.iter_files(prefix) for fn in file_index.function_order if not fn.count]
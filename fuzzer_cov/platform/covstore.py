@@ -0,0 +1,161 @@
+
+from array import array
+import itertools
+import json
+import mmap
+import os
+import struct
+import sys
+import weakref
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .tracefile import TracefileMerger, format_tracefile_record
+
+# layout: magic, u64 offset and u64 length of the json index, then 8-byte
+# aligned little-endian int64 columns; the index interns source files and
+# function names and records where each file's columns live
+STORE_MAGIC = b'FZCOV\x00\x01\x00'
+_HEADER = struct.Struct('<8sQQ')
+_COLUMNS = ('lines', 'counts', 'fn_lines', 'fn_counts', 'br_lines', 'br_blocks', 'br_branches', 'br_taken')
+
+def _column_bytes(values) -> bytes:
+    column = array('q', values)
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column.tobytes()
+
+class FileCoverage(object):
+    source_file: str
+    test_name: str
+
+    def __init__(self, source_file: str, test_name: str, function_names: list, columns: dict):
+        self.source_file = source_file
+        self.test_name = test_name
+        self.function_names = function_names
+        # int64 sequences, memoryviews over the mapped file when loaded from
+        # a store (released when the store is closed): lines/counts,
+        # fn_lines/fn_counts, br_* (-1 taken is '-')
+        self.columns = columns
+
+    def as_numpy(self, name: str):
+        if numpy is None:
+            raise ImportError("numpy is required for as_numpy()")
+        return numpy.frombuffer(self.columns[name], dtype='<i8')
+
+    def format(self):
+        c = self.columns
+        functions = list(zip(self.function_names, c['fn_lines'], c['fn_counts']))
+        branches = ((lineno, block, branch, None if taken < 0 else taken) for lineno, block, branch, taken in
+            zip(c['br_lines'], c['br_blocks'], c['br_branches'], c['br_taken']))
+        return format_tracefile_record(self.source_file, zip(c['lines'], c['counts']), functions,
+            branches, self.test_name)
+
+    @classmethod
+    def from_counters(cls, counters):
+        lines = list(counters.iter_lines())
+        functions = counters.iter_functions()
+        branches = list(counters.iter_branches())
+        return cls(counters.source_file, counters.test_name, [name for name, _, _ in functions], {
+            'lines': [lineno for lineno, _ in lines],
+            'counts': [count for _, count in lines],
+            'fn_lines': [lineno for _, lineno, _ in functions],
+            'fn_counts': [count for _, _, count in functions],
+            'br_lines': [branch[0] for branch in branches],
+            'br_blocks': [branch[1] for branch in branches],
+            'br_branches': [branch[2] for branch in branches],
+            'br_taken': [-1 if branch[3] is None else branch[3] for branch in branches],
+        })
+
+def write_store(path: str, files):
+    names, name_ids, index = [], {}, []
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(_HEADER.pack(STORE_MAGIC, 0, 0))
+        offset = _HEADER.size
+        for cov in files:
+            entry = { 'source_file': cov.source_file, 'test_name': cov.test_name, 'fn_names': [] }
+            for name in cov.function_names:
+                if name not in name_ids:
+                    name_ids[name] = len(names)
+                    names.append(name)
+                entry['fn_names'].append(name_ids[name])
+            for column in _COLUMNS:
+                data = _column_bytes(cov.columns[column])
+                f.write(data)
+                entry[column] = [offset, len(data) // 8]
+                offset += len(data)
+            index.append(entry)
+        data = json.dumps({ 'names': names, 'files': index }).encode()
+        f.write(data)
+        f.seek(0)
+        f.write(_HEADER.pack(STORE_MAGIC, offset, len(data)))
+    os.replace(tmp_file, path)
+
+class CoverageStore(object):
+    path: str
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        # memoryviews are unhashable, keyed by the order they were handed out
+        self._views = weakref.WeakValueDictionary()
+        self._view_ids = itertools.count()
+        magic, index_offset, index_len = _HEADER.unpack_from(self._map, 0)
+        if magic != STORE_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a coverage store")
+        index = json.loads(self._map[index_offset:index_offset + index_len].decode())
+        self.names = index['names']
+        self.entries = { entry['source_file']: entry for entry in index['files'] }
+        self.source_files = [entry['source_file'] for entry in index['files']]
+
+    def _column(self, offset: int, n: int):
+        view = memoryview(self._map)[offset:offset + 8 * n]
+        if sys.byteorder != 'little':
+            column = array('q', view.tobytes())
+            column.byteswap()
+            return column
+        view = view.cast('q')
+        self._views[next(self._view_ids)] = view
+        return view
+
+    def load(self, source_file: str) -> FileCoverage:
+        entry = self.entries[source_file]
+        columns = { column: self._column(*entry[column]) for column in _COLUMNS }
+        return FileCoverage(source_file, entry['test_name'], [self.names[i] for i in entry['fn_names']], columns)
+
+    def __iter__(self):
+        for source_file in self.source_files:
+            yield self.load(source_file)
+
+    def close(self):
+        # columns handed out by load() are released with the mapping, buffers
+        # exported from them (as_numpy) must be dropped first
+        for view in list(self._views.values()):
+            view.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def lcov_to_store(tracefiles, store_file: str):
+    merger = TracefileMerger()
+    for tracefile in ([tracefiles] if isinstance(tracefiles, str) else tracefiles):
+        merger.add_tracefile(tracefile)
+    write_store(store_file, (FileCoverage.from_counters(merger.files[source_file])
+        for source_file in sorted(merger.files)))
+    return len(merger.files)
+
+def store_to_lcov(store_file: str, tracefile: str, source_files=None):
+    with CoverageStore(store_file) as store, open(tracefile, 'w', buffering=1 << 20) as f:
+        for source_file in source_files or store.source_files:
+            f.writelines(store.load(source_file).format())
@@ -0,0 +1,98 @@
+
+from collections import OrderedDict
+import subprocess
+import threading
+
+class CxxFiltDemangler(object):
+    cxxfilt_path: str
+    cache_size: int
+    hits: int
+    misses: int
+    round_trips: int
+
+    def __init__(self, cxxfilt_path: str='c++filt', cache_size: int=65536):
+        self.cxxfilt_path = cxxfilt_path
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.process = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.round_trips = 0
+
+    def _cache_get(self, symbol):
+        name = self.cache.get(symbol)
+        if name is not None:
+            self.cache.move_to_end(symbol)
+            self.hits += 1
+        return name
+
+    def _cache_put(self, symbol, name):
+        self.cache[symbol] = name
+        self.cache.move_to_end(symbol)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def _coprocess(self):
+        if self.process is None or self.process.poll() is not None:
+            self.process = subprocess.Popen([self.cxxfilt_path, '-n'],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True, bufsize=1)
+        return self.process
+
+    def demangle(self, symbol: str) -> str:
+        symbol = symbol.strip()
+        with self.lock:
+            name = self._cache_get(symbol)
+            if name is not None:
+                return name
+            self.misses += 1
+            # c++filt flushes its output after every input line, so one
+            # long-lived process can serve all lookups
+            process = self._coprocess()
+            process.stdin.write(symbol + '\n')
+            process.stdin.flush()
+            name = process.stdout.readline().rstrip('\n')
+            self.round_trips += 1
+            self._cache_put(symbol, name)
+            return name
+
+    def demangle_all(self, symbols) -> dict:
+        symbols = [symbol.strip() for symbol in symbols]
+        with self.lock:
+            result, missing = {}, []
+            for symbol in symbols:
+                if symbol in result:
+                    continue
+                name = self._cache_get(symbol)
+                if name is None:
+                    result[symbol] = None
+                    missing.append(symbol)
+                else:
+                    result[symbol] = name
+            if missing:
+                self.misses += len(missing)
+                # batch mode: a single c++filt call for every uncached symbol
+                out = subprocess.run([self.cxxfilt_path, '-n'], input='\n'.join(missing) + '\n',
+                    stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+                self.round_trips += 1
+                for symbol, name in zip(missing, out.split('\n')):
+                    result[symbol] = name
+                    self._cache_put(symbol, name)
+            return result
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'round_trips': self.round_trips,
+            'cached': len(self.cache),
+        }
+
+    def close(self):
+        with self.lock:
+            if self.process is not None:
+                self.process.stdin.close()
+                self.process.wait()
+                self.process = None
+
+default_demangler = CxxFiltDemangler()
@@ -1,29 +1,62 @@
 
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shlex
 import subprocess
+import threading
 
 from fuzzer_cov.core import BuildContainer, Logger
 
+def format_cmd(cmd) -> str:
+    # commands are either shell strings or argv lists
+    if isinstance(cmd, str):
+        return cmd
+    return ' '.join(shlex.quote(str(arg)) for arg in cmd)
+
+def command_span_name(cmd) -> str:
+    program = cmd.split(None, 1)[0] if isinstance(cmd, str) else str(cmd[0])
+    return f"cmd:{os.path.basename(program)}"
+
 class CommandExecutorImpl(object):
+    max_concurrency: int
+    command_timeout: float
+
     def __init__(self, container: BuildContainer):
         self.logger = container.resolve(Logger)
+        self.max_concurrency = container.opts.max_concurrency or os.cpu_count() or 1
+        self.command_timeout = container.opts.command_timeout
     
-    def must_exec(self, cmd, silent: int=1):
-        code, out = self.exec(cmd, silent)
+    def must_exec(self, cmd, silent: int=1, env: dict=None, timeout: float=None):
+        code, out = self.exec(cmd, silent, env=env, timeout=timeout)
         if code:
             raise Exception(f"command executor exit with non-zero code: {code}")
         return out
     
-    def exec(self, cmd, silent: int=1):
+    def exec(self, cmd, silent: int=1, env: dict=None, timeout: float=None, output_file: str=None):
+        with self.logger.span(command_span_name(cmd), { 'cmd': format_cmd(cmd) }) as span:
+            exit_code, lines = self._exec(cmd, silent, env, timeout, output_file)
+            span.add(output_lines=len(lines))
+        return exit_code, lines
 
-        self.logger.info(f"CMD: {cmd}", { 'cmd': cmd })
+    def _exec(self, cmd, silent: int, env: dict, timeout: float, output_file: str=None):
+        timeout = timeout or self.command_timeout
+        self.logger.info(f"CMD: {format_cmd(cmd)}", { 'cmd': cmd, 'env': env, 'output_file': output_file })
 
-        process = subprocess.Popen(cmd, stdin=None,
-                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True, universal_newlines=True)
+        if env is not None:
+            env = dict(os.environ, **env)
+        output = open(output_file, 'wb') if output_file else None
+        process = subprocess.Popen(cmd, stdin=None, env=env, stdout=output or subprocess.PIPE,
+                stderr=subprocess.PIPE if output else subprocess.STDOUT, shell=isinstance(cmd, str), universal_newlines=True)
+        stream = process.stderr if output else process.stdout
+        timer = None
+        if timeout:
+            timer = threading.Timer(timeout, process.kill)
+            timer.start()
         lines = []
         mx = 0
         if silent == 2:
             print("")
-        for stdout_line in iter(process.stdout.readline, ""):
+        for stdout_line in iter(stream.readline, ""):
             stdout_line = stdout_line.rstrip('\n')
             if silent == 0:
                 print(stdout_line)
@@ -34,11 +67,24 @@ class CommandExecutorImpl(object):
                 else:
                     print((" "*mx)+"\r"+stdout_line, end='')
             lines.append(stdout_line)
-        process.stdout.close()
+        stream.close()
         exit_code = process.wait()
+        if output is not None:
+            output.close()
+        if timer is not None:
+            timer.cancel()
         if silent == 2:
             print("")
 
         if exit_code:
-            self.logger.info(f"    Non-zero exit status '{exit_code}' for CMD: {cmd}", { 'exit_code': exit_code, 'cmd': cmd })
+            self.logger.info(f"    Non-zero exit status '{exit_code}' for CMD: {format_cmd(cmd)}", { 'exit_code': exit_code, 'cmd': cmd })
         return exit_code, lines
+
+    def exec_many(self, cmds: list, silent: int=1, envs: list=None, timeout: float=None, output_files: list=None):
+        envs = envs or [None] * len(cmds)
+        output_files = output_files or [None] * len(cmds)
+        # interleaved progress lines are unreadable, keep at most line-buffered
+        silent = 1 if silent == 2 else silent
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_concurrency, len(cmds)))) as pool:
+            return list(pool.map(lambda i: self.exec(cmds[i], silent, env=envs[i], timeout=timeout,
+                output_file=output_files[i]), range(len(cmds))))
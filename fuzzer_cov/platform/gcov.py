@@ -0,0 +1,230 @@
+
+import hashlib
+import json
+import os
+import struct
+import subprocess
+
+from fuzzer_cov.core import BuildContainer, CoverageCapturer, Logger
+from .pool import WorkerPool
+from .tracefile import write_tracefile_record
+
+def find_gcov_files(directory: str, suffix: str, follow_links: bool=False):
+    found = []
+    for root, _, files in os.walk(directory, followlinks=follow_links):
+        for name in files:
+            if name.endswith(suffix):
+                found.append(os.path.join(root, name))
+    found.sort()
+    return found
+
+def link_gcno_files(prefix_dir: str):
+    # counters written under GCOV_PREFIX (with GCOV_PREFIX_STRIP=0) mirror the
+    # absolute object path, put the matching .gcno next to each .gcda so the
+    # prefix tree can be captured like a build tree
+    linked = 0
+    for gcda_file in find_gcov_files(prefix_dir, '.gcda'):
+        gcno_file = gcda_file[:-len('.gcda')] + '.gcno'
+        build_gcno_file = os.path.join(os.sep, os.path.relpath(gcno_file, prefix_dir))
+        if not os.path.lexists(gcno_file) and os.path.exists(build_gcno_file):
+            os.symlink(build_gcno_file, gcno_file)
+            linked += 1
+    return linked
+
+def gcov_prefix_env(counter_dir: str=None):
+    if counter_dir is None:
+        return None
+    return { 'GCOV_PREFIX': os.path.abspath(counter_dir), 'GCOV_PREFIX_STRIP': '0' }
+
+GCDA_MAGIC = 0x67636461
+# object and (before gcc 9) program summaries, rewritten on every run
+_GCDA_SUMMARY_TAGS = (0xa1000000, 0xa3000000)
+
+def gcda_counters_digest(gcda_file: str):
+    # digest of the counter records of a .gcda without its run summaries, a
+    # process that exits rewrites the file even if none of its counters
+    # moved. None when the format is not understood
+    with open(gcda_file, 'rb') as f:
+        data = f.read()
+    if len(data) < 12:
+        return None
+    for order in '<>':
+        magic, version = struct.unpack_from(order + 'II', data, 0)
+        if magic == GCDA_MAGIC:
+            break
+    else:
+        return None
+    v = version.to_bytes(4, 'big')
+    major = (v[0] - ord('A')) * 10 + v[1] - ord('0') if v[0] >= ord('A') else v[0] - ord('0')
+    # gcc 12 added a checksum to the header and counts record lengths in
+    # bytes instead of words, a negative length stands for that many zero
+    # counters without payload
+    offset, unit = (16, 1) if major >= 12 else (12, 4)
+    digest = hashlib.sha1()
+    record = struct.Struct(order + 'Ii')
+    while offset + record.size <= len(data):
+        tag, length = record.unpack_from(data, offset)
+        end = offset + record.size + max(0, length) * unit
+        if end > len(data):
+            return None
+        if tag not in _GCDA_SUMMARY_TAGS:
+            digest.update(data[offset:end])
+        offset = end
+    return digest.digest()
+
+def _new_source_record():
+    return {'lines': {}, 'functions': {}, 'branches': {}}
+
+def _merge_source_record(dst, src):
+    for lineno, count in src['lines'].items():
+        dst['lines'][lineno] = dst['lines'].get(lineno, 0) + count
+    for name, (lineno, count) in src['functions'].items():
+        if name in dst['functions']:
+            count += dst['functions'][name][1]
+        dst['functions'][name] = (lineno, count)
+    for key, counts in src['branches'].items():
+        merged = dst['branches'].get(key)
+        if merged is None:
+            dst['branches'][key] = list(counts)
+        else:
+            for i, count in enumerate(counts):
+                if i < len(merged):
+                    merged[i] += count
+                else:
+                    merged.append(count)
+
+def _run_gcov(gcov_path: str, files, branch_coverage: bool):
+    # runs in a worker process: one gcov call for a batch of objects, parsed
+    # into {source: record} so only the compact result is sent back
+    cmd = [gcov_path, '--json-format', '--stdout']
+    if branch_coverage:
+        cmd.append('-b')
+    result = subprocess.run(cmd + list(files), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    if result.returncode != 0:
+        # a partial stdout would silently drop objects from the tracefile
+        raise Exception(f"gcov exit with non-zero code: {result.returncode}: {result.stderr.strip()[-4096:]}")
+    sources = {}
+    for doc in result.stdout.splitlines():
+        if not doc.strip():
+            continue
+        doc = json.loads(doc)
+        cwd = doc.get('current_working_directory', '')
+        for entry in doc['files']:
+            if entry['file'].startswith('<'):
+                continue
+            path = os.path.normpath(os.path.join(cwd, entry['file']))
+            record = _new_source_record()
+            for fn in entry['functions']:
+                record['functions'][fn['name']] = (fn['start_line'], fn['execution_count'])
+            seen = {}
+            for line in entry['lines']:
+                lineno = line['line_number']
+                record['lines'][lineno] = record['lines'].get(lineno, 0) + line['count']
+                if line['branches']:
+                    # a line listed again (another function instantiated on
+                    # it) gets its own block number, like geninfo does
+                    block = seen.get(lineno, 0)
+                    seen[lineno] = block + 1
+                    record['branches'][(lineno, block)] = [
+                        branch['count'] for branch in line['branches']]
+            if path in sources:
+                _merge_source_record(sources[path], record)
+            else:
+                sources[path] = record
+    return sources
+
+def write_lcov_records(f, sources, branch_coverage: bool=False, test_name: str=''):
+    for path in sorted(sources):
+        record = sources[path]
+        lines = record['lines']
+        functions = sorted(((name, lineno, count) for name, (lineno, count) in record['functions'].items()),
+            key=lambda fn: (fn[1], fn[0]))
+        branches = []
+        if branch_coverage:
+            for (lineno, block), counts in sorted(record['branches'].items()):
+                executed = lines.get(lineno, 0) > 0
+                branches.extend((lineno, block, i, count if executed else None) for i, count in enumerate(counts))
+        write_tracefile_record(f, path, sorted(lines.items()), functions, branches, test_name)
+
+class GcovCapturer(CoverageCapturer):
+    gcov_path: str
+    branch_coverage: bool
+    follow_links: bool
+    batch_size: int
+
+    def __init__(self, container: BuildContainer):
+        self.gcov_path = container.opts.gcov_path
+        self.branch_coverage = container.opts.enable_branch_coverage
+        self.follow_links = container.opts.lcov_follow_links
+        self.batch_size = 16
+        self.logger = container.resolve(Logger)
+        self.pool = container.resolve(WorkerPool)
+
+    def zero_counters(self, directory: str, silent: int=1):
+        for gcda_file in find_gcov_files(directory, '.gcda', self.follow_links):
+            os.unlink(gcda_file)
+
+    def replay_env(self, counter_dir: str=None, fuzzer_path: str=None):
+        return gcov_prefix_env(counter_dir)
+
+    def collect_many(self, object_file_sets: list):
+        # one pool pass over every set, batches never mix sets so each set
+        # gets its own merged sources
+        sources = [{} for _ in object_file_sets]
+        owners, batches = [], []
+        for i, object_files in enumerate(object_file_sets):
+            for j in range(0, len(object_files), self.batch_size):
+                owners.append(i)
+                batches.append(object_files[j:j + self.batch_size])
+        if not batches:
+            return sources
+        results = self.pool.map(_run_gcov, [self.gcov_path] * len(batches), batches,
+            [self.branch_coverage] * len(batches))
+        for owner, result in zip(owners, results):
+            for path, record in result.items():
+                if path in sources[owner]:
+                    _merge_source_record(sources[owner][path], record)
+                else:
+                    sources[owner][path] = record
+        return sources
+
+    def collect(self, object_files):
+        return self.collect_many([object_files])[0]
+
+    def _find_object_files(self, directory: str, initial: bool=False):
+        if initial:
+            return find_gcov_files(directory, '.gcno', self.follow_links)
+        return [gcda_file for gcda_file in find_gcov_files(directory, '.gcda', self.follow_links)
+            if os.path.exists(gcda_file[:-len('.gcda')] + '.gcno')]
+
+    def capture_many(self, jobs: list, silent: int=1):
+        object_file_sets = [self._find_object_files(directory) for directory, _ in jobs]
+        self.logger.info(f"gcov capture: {sum(map(len, object_file_sets))} object files in {len(jobs)} directories",
+            { 'directories': [directory for directory, _ in jobs], 'objects': sum(map(len, object_file_sets)) })
+        with self.logger.span('gcov', { 'directories': len(jobs) }) as span:
+            span.add(gcda_files=sum(map(len, object_file_sets)))
+            for (_, output_file), sources in zip(jobs, self.collect_many(object_file_sets)):
+                with open(output_file, 'w', buffering=1 << 20) as f:
+                    write_lcov_records(f, sources, branch_coverage=self.branch_coverage)
+                span.add(tracefile_bytes=os.path.getsize(output_file))
+
+    def capture(self, directory: str, output_file: str, initial: bool=False, silent: int=1):
+        object_files = self._find_object_files(directory, initial)
+        self.logger.info(f"gcov capture: {len(object_files)} object files in {directory}",
+            { 'directory': directory, 'objects': len(object_files), 'initial': initial })
+        with self.logger.span('gcov', { 'directory': directory, 'initial': initial }) as span:
+            span.add(**{ 'gcno_files' if initial else 'gcda_files': len(object_files) })
+            self._capture_objects(object_files, output_file, initial)
+            span.add(tracefile_bytes=os.path.getsize(output_file))
+
+    def _capture_objects(self, object_files: list, output_file: str, initial: bool=False):
+        sources = self.collect(object_files)
+        if initial:
+            for record in sources.values():
+                for lineno in record['lines']:
+                    record['lines'][lineno] = 0
+                record['functions'] = {name: (lineno, 0) for name, (lineno, _) in record['functions'].items()}
+                record['branches'] = {key: [0] * len(counts) for key, counts in record['branches'].items()}
+        with open(output_file, 'w', buffering=1 << 20) as f:
+            write_lcov_records(f, sources, branch_coverage=self.branch_coverage)
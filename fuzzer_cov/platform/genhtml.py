@@ -1,7 +1,7 @@
 
 from pathlib import Path
 
-from fuzzer_cov.core import BuildContainer, CommandExecutor
+from fuzzer_cov.core import BuildContainer, CommandExecutor, CoverageReporter
 from .lcov import LCovOutputPathPolicy
 
 class GenHtmlOutputPathPolicy(object):
@@ -18,17 +18,17 @@ class GenHtmlOutputPathPolicy(object):
         self.lcov_info_final_file = lcov_path_policy.lcov_info_final_file
         return self
 
-class GenHtmlRunner(object):
+class GenHtmlRunner(CoverageReporter):
     gen_html_path: str
-    gen_html_opts: str
+    gen_html_opts: list
 
     def __init__(self, container: BuildContainer):
         self.gen_html_path = container.opts.gen_html_path
-        self.gen_html_opts = ''
+        self.gen_html_opts = []
         if container.opts.enable_branch_coverage:
-            self.gen_html_opts += ' --branch-coverage'
+            self.gen_html_opts += ['--branch-coverage']
         self.cmd_executor = container.resolve(CommandExecutor)
     
     def gen_cov_report(self, p: GenHtmlOutputPathPolicy, silent:int=1):
-        self.cmd_executor.exec(
-            f"{self.gen_html_path}{self.gen_html_opts} --output-directory {p.gen_html_output_dir} {p.lcov_info_final_file}", silent=silent)
+        self.cmd_executor.exec([self.gen_html_path] + self.gen_html_opts +
+            ['--output-directory', p.gen_html_output_dir, p.lcov_info_final_file], silent=silent)
@@ -0,0 +1,224 @@
+
+import hashlib
+import html
+import json
+import os
+import time
+
+from fuzzer_cov.core import BuildContainer, CoverageReporter, Logger
+from .genhtml import GenHtmlOutputPathPolicy
+from .pool import WorkerPool
+from .tracefile import read_tracefile
+
+_STYLE = """
+body { font-family: sans-serif; font-size: 13px; }
+table { border-collapse: collapse; }
+td, th { padding: 2px 8px; border: 1px solid #ccc; }
+th { background: #ddd; }
+.src { font-family: monospace; white-space: pre; border: none; padding: 0 6px; }
+.count { text-align: right; font-family: monospace; border: none; }
+.lineno { text-align: right; font-family: monospace; color: #888; border: none; }
+.hit { background: #cfc; }
+.miss { background: #fcc; }
+.hi { background: #a7fc9d; }
+.med { background: #ffea20; }
+.lo { background: #ff6230; }
+"""
+
+def _rate_class(hit: int, found: int) -> str:
+    if not found:
+        return ''
+    rate = hit / found
+    return 'hi' if rate >= 0.9 else 'med' if rate >= 0.75 else 'lo'
+
+def _rate(hit: int, found: int) -> str:
+    return f"{100.0 * hit / found:.1f}%" if found else '-'
+
+def _page(title: str, root: str, body: str) -> str:
+    return (f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title>"
+        f"<link rel=\"stylesheet\" href=\"{root}report.css\"></head><body>\n"
+        f"<h2><a href=\"{root}index.html\">top level</a> - {html.escape(title)}</h2>\n{body}</body></html>\n")
+
+def _stats_cells(stats: dict, branch_coverage: bool) -> str:
+    keys = [('LH', 'LF'), ('FNH', 'FNF')] + ([('BRH', 'BRF')] if branch_coverage else [])
+    return ''.join(f"<td class=\"{_rate_class(stats[hit], stats[found])}\">{_rate(stats[hit], stats[found])}</td>"
+        f"<td>{stats[hit]} / {stats[found]}</td>" for hit, found in keys)
+
+def _stats_header(branch_coverage: bool) -> str:
+    names = ['Lines', 'Functions'] + (['Branches'] if branch_coverage else [])
+    return ''.join(f"<th colspan=\"2\">{name}</th>" for name in names)
+
+def _record_stats(record) -> dict:
+    taken = list(record.branches.values())
+    return {
+        'LF': len(record.lines), 'LH': sum(1 for count in record.lines.values() if count),
+        'FNF': len(record.functions), 'FNH': sum(1 for _, count in record.functions.values() if count),
+        'BRF': len(taken), 'BRH': sum(1 for count in taken if count),
+    }
+
+def _record_fingerprint(record, source_stat) -> str:
+    digest = hashlib.sha1()
+    digest.update(repr(sorted(record.lines.items())).encode())
+    digest.update(repr(sorted(record.functions.items())).encode())
+    digest.update(repr(sorted(record.branches.items())).encode())
+    digest.update(repr(source_stat).encode())
+    return digest.hexdigest()
+
+def _render_source_page(job):
+    # runs in a worker process
+    source_file, page_file, root, lines, branches, functions, stats, branch_coverage = job
+    try:
+        with open(source_file, 'r', errors='replace') as f:
+            source_lines = f.read().split('\n')
+    except OSError:
+        source_lines = []
+    rows = []
+    for lineno in range(1, max(len(source_lines), max(lines, default=0)) + 1):
+        text = html.escape(source_lines[lineno - 1]) if lineno <= len(source_lines) else ''
+        count = lines.get(lineno)
+        css = '' if count is None else ' class="hit"' if count else ' class="miss"'
+        branch_cell = ''
+        if branch_coverage:
+            branch_cell = f"<td class=\"count\">{html.escape(branches.get(lineno, ''))}</td>"
+        rows.append(f"<tr{css}><td class=\"lineno\"><a name=\"{lineno}\">{lineno}</a></td>{branch_cell}"
+            f"<td class=\"count\">{'' if count is None else count}</td><td class=\"src\">{text}</td></tr>")
+    fn_rows = ''.join(f"<tr><td><a href=\"#{lineno}\">{html.escape(name)}</a></td><td>{count}</td></tr>"
+        for name, lineno, count in functions)
+    body = (f"<table><tr>{_stats_header(branch_coverage)}</tr><tr>{_stats_cells(stats, branch_coverage)}</tr></table>\n"
+        f"<h3>Functions</h3><table><tr><th>Function</th><th>Hits</th></tr>{fn_rows}</table>\n"
+        f"<h3>Source</h3><table>\n" + '\n'.join(rows) + "\n</table>\n")
+    os.makedirs(os.path.dirname(page_file), exist_ok=True)
+    tmp_file = page_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        f.write(_page(source_file, root, body))
+    os.replace(tmp_file, page_file)
+    return page_file
+
+class HtmlReportRunner(CoverageReporter):
+    branch_coverage: bool
+
+    def __init__(self, container: BuildContainer):
+        self.branch_coverage = container.opts.enable_branch_coverage
+        self.logger = container.resolve(Logger)
+        self.pool = container.resolve(WorkerPool)
+
+    def gen_cov_report(self, p: GenHtmlOutputPathPolicy, silent: int=1):
+        begin = time.perf_counter()
+        output_dir = p.gen_html_output_dir
+        cache_file = os.path.join(output_dir, '.fingerprints.json')
+        cache = {}
+        if os.path.exists(cache_file):
+            with open(cache_file, 'r') as f:
+                cache = json.load(f)
+
+        records = {record.source_file: record for record in read_tracefile(p.lcov_info_final_file)}
+        # pages are laid out by absolute path, SF lines may mix absolute and
+        # relative (to the working directory) paths
+        abs_paths = {source_file: os.path.abspath(source_file) for source_file in records}
+        prefix = os.path.commonpath([os.path.dirname(path) for path in abs_paths.values()]) if records else ''
+        entries, jobs, pages = {}, [], {}
+        for source_file, record in sorted(records.items()):
+            rel_dir = os.path.relpath(os.path.dirname(abs_paths[source_file]), prefix) if prefix else ''
+            page = os.path.normpath(os.path.join(rel_dir, os.path.basename(source_file) + '.gcov.html'))
+            if page in pages:
+                # two SF spellings of one file, neither page may overwrite the other
+                self.logger.warn(f"html report: {source_file} and {pages[page]} map to the same page {page}",
+                    { 'source_file': source_file, 'other': pages[page], 'page': page })
+                base, n = page[:-len('.gcov.html')], 1
+                while f"{base}.{n}.gcov.html" in pages:
+                    n += 1
+                page = f"{base}.{n}.gcov.html"
+            pages[page] = source_file
+            try:
+                st = os.stat(source_file)
+                source_stat = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                source_stat = None
+            fingerprint = _record_fingerprint(record, (source_stat, self.branch_coverage))
+            stats = _record_stats(record)
+            entries[source_file] = { 'page': page, 'fingerprint': fingerprint, 'stats': stats }
+            cached = cache.get(source_file)
+            if cached and cached['fingerprint'] == fingerprint and cached['page'] == page and \
+                    os.path.exists(os.path.join(output_dir, page)):
+                continue
+            branches = {}
+            for (lineno, _, _), taken in record.branches.items():
+                hit, found = branches.get(lineno, (0, 0))
+                branches[lineno] = (hit + (1 if taken else 0), found + 1)
+            root = os.path.relpath(output_dir, os.path.dirname(os.path.join(output_dir, page))) + os.sep
+            functions = sorted(((name, lineno, count) for name, (lineno, count) in record.functions.items()),
+                key=lambda fn: (fn[1], fn[0]))
+            jobs.append((source_file, os.path.join(output_dir, page), root.replace(os.sep, '/'), record.lines,
+                { lineno: f"{hit}/{found}" for lineno, (hit, found) in branches.items() },
+                functions, stats, self.branch_coverage))
+
+        if jobs:
+            for _ in self.pool.map(_render_source_page, jobs, chunksize=max(1, len(jobs) // (4 * self.pool.jobs))):
+                pass
+        self._write_indexes(output_dir, entries)
+        self._remove_stale_pages(output_dir, cache, entries)
+        tmp_file = cache_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(entries, f)
+        os.replace(tmp_file, cache_file)
+        self.logger.info(f"html report: rendered {len(jobs)} of {len(entries)} pages in {time.perf_counter() - begin:.2f}s",
+            { 'rendered': len(jobs), 'pages': len(entries), 'output_dir': output_dir })
+
+    def _remove_stale_pages(self, output_dir: str, cache: dict, entries: dict):
+        # every page of the previous report this one did not write again,
+        # including the indexes of directories that are gone
+        old_pages = { cached['page'] for cached in cache.values() }
+        new_pages = { entry['page'] for entry in entries.values() }
+        new_dirs = { os.path.dirname(page) for page in new_pages }
+        stale = old_pages - new_pages
+        stale.update(os.path.join(rel_dir, 'index.html') for rel_dir in
+            { os.path.dirname(page) for page in old_pages } - new_dirs if rel_dir)
+        for page in sorted(stale):
+            path = os.path.join(output_dir, page)
+            if os.path.exists(path):
+                os.unlink(path)
+            # prune the directories left empty, up to the report root
+            rel_dir = os.path.dirname(page)
+            while rel_dir and os.path.isdir(os.path.join(output_dir, rel_dir)) and \
+                    not os.listdir(os.path.join(output_dir, rel_dir)):
+                os.rmdir(os.path.join(output_dir, rel_dir))
+                rel_dir = os.path.dirname(rel_dir)
+
+    def _write_indexes(self, output_dir: str, entries: dict):
+        # directory pages only need the cached per-file stats
+        keys = ('LF', 'LH', 'FNF', 'FNH', 'BRF', 'BRH')
+        dirs = {}
+        for source_file, entry in entries.items():
+            dirs.setdefault(os.path.dirname(entry['page']), []).append((source_file, entry))
+        totals = dict.fromkeys(keys, 0)
+        dir_rows, root_rows = [], []
+        for rel_dir in sorted(dirs):
+            dir_totals = dict.fromkeys(keys, 0)
+            rows = []
+            for source_file, entry in sorted(dirs[rel_dir]):
+                for key in keys:
+                    dir_totals[key] += entry['stats'][key]
+                rows.append(f"<tr><td><a href=\"{html.escape(os.path.basename(entry['page']))}\">"
+                    f"{html.escape(os.path.basename(source_file))}</a></td>{_stats_cells(entry['stats'], self.branch_coverage)}</tr>")
+            for key in keys:
+                totals[key] += dir_totals[key]
+            if not rel_dir:
+                # files at the top of the tree are listed on the main index
+                root_rows = rows
+                continue
+            root = '../' * len(rel_dir.split(os.sep))
+            body = (f"<table><tr><th>File</th>{_stats_header(self.branch_coverage)}</tr>\n"
+                + '\n'.join(rows) + f"\n<tr><th>Total</th>{_stats_cells(dir_totals, self.branch_coverage)}</tr></table>\n")
+            os.makedirs(os.path.join(output_dir, rel_dir), exist_ok=True)
+            with open(os.path.join(output_dir, rel_dir, 'index.html'), 'w') as f:
+                f.write(_page(rel_dir, root, body))
+            dir_rows.append(f"<tr><td><a href=\"{html.escape(rel_dir.replace(os.sep, '/'))}/index.html\">"
+                f"{html.escape(rel_dir)}</a></td>{_stats_cells(dir_totals, self.branch_coverage)}</tr>")
+        body = (f"<table><tr><th>Directory / File</th>{_stats_header(self.branch_coverage)}</tr>\n"
+            + '\n'.join(dir_rows + root_rows) + f"\n<tr><th>Total</th>{_stats_cells(totals, self.branch_coverage)}</tr></table>\n")
+        with open(os.path.join(output_dir, 'index.html'), 'w') as f:
+            f.write(_page('coverage report', '', body))
+        with open(os.path.join(output_dir, 'report.css'), 'w') as f:
+            f.write(_STYLE)
+        with open(os.path.join(output_dir, 'summary.json'), 'w') as f:
+            json.dump(totals, f)
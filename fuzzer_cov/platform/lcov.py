@@ -1,10 +1,21 @@
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import subprocess
+import glob
+import hashlib
 import os
+import re
+import shutil
 import tempfile
+import threading
+import time
 
-from fuzzer_cov.core import BuildContainer, CommandExecutor
+from fuzzer_cov.core import BuildContainer, CommandExecutor, CoverageCapturer, Logger
+from .buildindex import BuildIndex
+from .corpus import fingerprint_files, list_shard_gcda_dirs
+from .demangle import CxxFiltDemangler, default_demangler
+from .gcov import gcov_prefix_env, link_gcno_files
+from .tracefile import TracefileMerger, merge_tracefiles
 
 class LCovOutputPathPolicy(object):
     def __init__(self, container: BuildContainer):
@@ -12,7 +23,19 @@ class LCovOutputPathPolicy(object):
         self.lcov_base_file = os.path.join(self.lcov_output_dir, 'trace.lcov_base')
         self.lcov_info_file = os.path.join(self.lcov_output_dir, 'trace.lcov_info')
         self.lcov_info_final_file = os.path.join(self.lcov_output_dir, 'trace.lcov_info_final')
+        self.lcov_prev_file = os.path.join(self.lcov_output_dir, 'trace.lcov_prev')
+        self.shard_output_dir = container.opts.shard_output_dir
     
+    def shard_info_file(self, i: int):
+        return f"{self.lcov_info_file}.{i}"
+
+    def use_previous_result(self):
+        # the last final tracefile already contains the baseline, it becomes
+        # the base of this run's merge
+        os.replace(self.lcov_info_final_file, self.lcov_prev_file)
+        self.lcov_base_file = self.lcov_prev_file
+        return self
+
     def initialize_file_structure(self, clean):
         cov_lcov_output_path = Path(self.lcov_output_dir)
         cov_lcov_output_path.mkdir(parents=True, exist_ok=True)
@@ -23,84 +46,336 @@ class LCovOutputPathPolicy(object):
             os.unlink(self.lcov_info_file)
         if os.path.exists(self.lcov_info_final_file) and clean:
             os.unlink(self.lcov_info_final_file)
+        if os.path.exists(self.lcov_prev_file) and clean:
+            os.unlink(self.lcov_prev_file)
+        if clean:
+            for shard_info_file in glob.glob(glob.escape(self.lcov_info_file) + '.*'):
+                os.unlink(shard_info_file)
+            if os.path.exists(self.shard_output_dir):
+                shutil.rmtree(self.shard_output_dir)
 
 def demangle(symbol):
-    return subprocess.check_output(['c++filt', '-n', symbol.strip()]).decode().strip()
+    return default_demangler.demangle(symbol)
+
+def _lcov_pattern_regex(pattern: str) -> str:
+    # lcov -r / --extract patterns are shell wildcards matched against the
+    # whole path, `*` also crosses `/`. Backslashes only protect wildcards
+    # from the shell, as in the default "/usr/include/\\*"
+    regex = ''
+    for c in re.sub(r'\\(.)', r'\1', pattern):
+        if c == '*':
+            regex += '.*'
+        elif c == '?':
+            regex += '.'
+        else:
+            regex += re.escape(c)
+    return regex
+
+def compile_source_filter(exclude_patterns=None, include_patterns=None):
+    exclude_patterns = [pattern for pattern in exclude_patterns or [] if pattern]
+    include_patterns = [pattern for pattern in include_patterns or [] if pattern]
+    if not exclude_patterns and not include_patterns:
+        return None
+    exclude = re.compile('|'.join(f'(?:{_lcov_pattern_regex(pattern)})' for pattern in exclude_patterns) + r'\Z') \
+        if exclude_patterns else None
+    include = re.compile('|'.join(f'(?:{_lcov_pattern_regex(pattern)})' for pattern in include_patterns) + r'\Z') \
+        if include_patterns else None
+    def source_filter(path: str) -> bool:
+        if include is not None and not include.match(path):
+            return False
+        return exclude is None or not exclude.match(path)
+    return source_filter
 
-def filter_lcov(lines, verbose=False):
-    defs, srcfile = {}, ''
+def filter_lcov(lines, verbose=False, demangler: CxxFiltDemangler=None, source_filter=None):
+    demangler = demangler or default_demangler
+    defs, srcfile, test_line, skipping = {}, '', None, False
     for line in lines:
-        if line.startswith('SF:'):
+        if skipping:
+            # excluded record, only look for its end
+            if line.startswith('end_of_record'):
+                skipping = False
+            continue
+        if line.startswith('DA:'):
+            lineno = line[3:].split(',', 1)[0]
+            if lineno in defs:
+                if verbose:
+                    print(f'Ignoring: {srcfile}:{lineno}:{demangler.demangle(defs[lineno])}')
+                continue
+        elif line.startswith('TN:'):
+            # held back until we know whether its record is kept
+            test_line = line
+            continue
+        elif line.startswith('SF:'):
             defs = {}
             srcfile = line[3:].strip()
+            if source_filter is not None and not source_filter(srcfile):
+                test_line, skipping = None, True
+                continue
+            if test_line is not None:
+                yield test_line
+                test_line = None
         elif line.startswith('end_of_record'):
             defs = {}
         elif line.startswith('FN:'):
-            lineno, symbol = line[3:].split(',')
-            defs[lineno] = demangle(symbol)
-        elif line.startswith('DA:'):
-            lineno = line[3:].split(',')[0]
-            if lineno in defs:
-                if verbose:
-                    print(f'Ignoring: {srcfile}:{lineno}:{defs[lineno]}')
-                continue
+            lineno, symbol = line[3:].rstrip('\n').split(',', 1)
+            # names are only needed for the verbose log, demangle them lazily
+            defs[lineno] = symbol.split(',')[-1]
         yield line
+    if test_line is not None:
+        yield test_line
+
+def write_lcov_lines(lines, output_file: str, buffer_size: int=1 << 20):
+    # write into a temp file next to the output, then rename it over the
+    # output so it is never left truncated
+    fd, tmp_file = tempfile.mkstemp(prefix='.' + os.path.basename(output_file) + '.',
+        dir=os.path.dirname(os.path.abspath(output_file)))
+    try:
+        with os.fdopen(fd, 'w', buffering=buffer_size) as fout:
+            fout.writelines(lines)
+            fout.flush()
+            os.fsync(fout.fileno())
+        if os.path.exists(output_file):
+            shutil.copymode(output_file, tmp_file)
+        os.replace(tmp_file, output_file)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.unlink(tmp_file)
+        raise
+    return os.path.getsize(output_file)
+
+def filter_lcov_file(input_file: str, output_file: str=None, verbose=False,
+        demangler: CxxFiltDemangler=None, source_filter=None, buffer_size: int=1 << 20):
+    output_file = output_file or input_file
+    bytes_read = os.path.getsize(input_file)
+    begin = time.perf_counter()
+    with open(input_file, 'r', buffering=buffer_size) as fin:
+        bytes_written = write_lcov_lines(filter_lcov(fin, verbose=verbose, demangler=demangler,
+            source_filter=source_filter), output_file, buffer_size)
+    elapsed = time.perf_counter() - begin
+    return {
+        'bytes_read': bytes_read,
+        'bytes_written': bytes_written,
+        'seconds': elapsed,
+        'bytes_per_second': bytes_read / elapsed if elapsed > 0 else 0.0,
+    }
+
+def lcov_command(opts) -> list:
+    lcov_cmd = [opts.lcov_path]
+    if opts.enable_branch_coverage:
+        lcov_cmd += ['--rc', 'lcov_branch_coverage=1']
+    if opts.lcov_follow_links:
+        lcov_cmd += ['--follow']
+    return lcov_cmd
+
+class LCovCapturer(CoverageCapturer):
+    lcov_cmd: list
+
+    def __init__(self, container: BuildContainer):
+        self.lcov_cmd = lcov_command(container.opts)
+        self.cmd_executor = container.resolve(CommandExecutor)
+
+    def zero_counters(self, directory: str, silent: int=1):
+        self.cmd_executor.must_exec(self.lcov_cmd + ['--no-checksum', '--zerocounters', '--directory', directory], silent=silent)
+
+    def replay_env(self, counter_dir: str=None, fuzzer_path: str=None):
+        return gcov_prefix_env(counter_dir)
+
+    def _capture_cmd(self, directory: str, output_file: str, initial: bool=False):
+        initial_opts = ['--initial'] if initial else []
+        return self.lcov_cmd + ['--no-checksum', '--capture'] + initial_opts + \
+            ['--directory', directory, '--output-file', output_file]
+
+    def capture(self, directory: str, output_file: str, initial: bool=False, silent: int=1):
+        self.cmd_executor.must_exec(self._capture_cmd(directory, output_file, initial), silent=silent)
+
+    def capture_many(self, jobs: list, silent: int=1):
+        results = self.cmd_executor.exec_many([self._capture_cmd(directory, output_file)
+            for directory, output_file in jobs], silent=silent)
+        for code, _ in results:
+            if code:
+                raise Exception(f"command executor exit with non-zero code: {code}")
 
 class LCovRunner(object):
     source_dir: str
     lcov_path: str
-    lcov_opts: str
-    lcov_exclude_opts: str
-    lcov_cmd: str
+    lcov_cmd: list
     lcov_web_path: str
+    merge_backend: str
+    fuzzer_paths: list
+    cache_dir: str
 
     def __init__(self, container: BuildContainer):
         self.lcov_path = container.opts.lcov_path
         self.source_dir = container.opts.source_dir
-        self.lcov_opts = ''
-        self.lcov_exclude_opts = ''
-        if container.opts.enable_branch_coverage:
-            self.lcov_opts += ' --rc lcov_branch_coverage=1'
-        if container.opts.lcov_follow_links:
-            self.lcov_opts += ' --follow'
-        if container.opts.lcov_exclude_pattern:
-            self.lcov_exclude_opts = container.opts.lcov_exclude_pattern
+        self.source_filter = compile_source_filter(container.opts.lcov_exclude_patterns,
+            container.opts.lcov_include_patterns)
         self.cmd_executor = container.resolve(CommandExecutor)
-        self.lcov_cmd = f"{self.lcov_path} {self.lcov_opts}"
+        self.capturer = container.resolve(CoverageCapturer)
+        self.logger = container.resolve(Logger)
+        self.demangler = container.resolve(CxxFiltDemangler)
+        self.lcov_cmd = lcov_command(container.opts)
+        self.merge_backend = container.opts.merge_backend
         self.lcov_web_path = os.path.join(container.opts.output_dir, 'web')
         self.lcov_cov_info_path = os.path.join(container.opts.output_dir, 'cov_info')
-        os.makedirs(self.lcov_web_path, exist_ok=True)
+        self._baseline = None
+        self.fuzzer_paths = container.opts.fuzzer_paths or [container.opts.fuzzer_path]
+        self.cache_dir = container.opts.cache_dir
+        # the baseline only depends on the .gcno files and on how it is captured
+        self.baseline_opts = f"{container.opts.capture_backend}:{container.opts.enable_branch_coverage}"
+        self.build_index = None
+        # the build index tracks .gcno files, clang source-based coverage has none
+        if container.opts.build_cache and container.opts.capture_backend != 'llvm':
+            self.build_index = BuildIndex(os.path.join(self.cache_dir, 'build.index.json'), self.source_dir,
+                container.opts.lcov_follow_links)
+        self._build_index_ready = False
+        self._build_index_lock = threading.Lock()
+
+    def refresh_build_index(self):
+        with self._build_index_lock:
+            if self._build_index_ready:
+                return self.build_index
+            with self.logger.span('build_index') as span:
+                rescanned = self.build_index.refresh(fingerprint_files(self.fuzzer_paths))
+                span.add(gcno_files=len(self.build_index.gcno_files), rescans=1 if rescanned else 0)
+            self._build_index_ready = True
+            return self.build_index
     
+    def zero_coverage_counters(self, silent: int=1):
+        if self.build_index is None:
+            self.capturer.zero_counters(self.source_dir, silent=silent)
+            return
+        with self.logger.span('zero_counters') as span:
+            span.add(gcda_files=self.refresh_build_index().zero_counters())
+
+    def baseline_cache_file(self):
+        key = hashlib.sha256(f"{self.build_index.fingerprint()}:{self.baseline_opts}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"baseline-{key[:32]}.info")
+
     def init_coverage_files(self, policy: LCovOutputPathPolicy, silent: int=1):
-        self.cmd_executor.must_exec(f"{self.lcov_cmd} --no-checksum --zerocounters --directory {self.source_dir}", silent=silent)
-        self.cmd_executor.must_exec(f"{self.lcov_cmd} --no-checksum --capture --initial --directory {self.source_dir} --output-file {policy.lcov_base_file}", silent=silent)
+        self.zero_coverage_counters(silent=silent)
+        self.capturer.capture(self.source_dir, policy.lcov_base_file, initial=True, silent=silent)
+
+    def start_coverage_files(self, policy: LCovOutputPathPolicy, zero_counters: bool=True, background: bool=True,
+            silent: int=1):
+        # the --initial baseline runs alongside the corpus replay and is
+        # joined by collect_coverage. gcov also opens the .gcda next to each
+        # .gcno, so a replay dumping its counters into the build tree itself
+        # must not start before the baseline is done
+        if zero_counters:
+            self.zero_coverage_counters(silent=silent)
+        if not background:
+            self.capture_baseline(policy, silent)
+            return
+        pool = ThreadPoolExecutor(max_workers=1)
+        self._baseline = pool.submit(self.capture_baseline, policy, silent)
+        pool.shutdown(wait=False)
+
+    def capture_baseline(self, policy: LCovOutputPathPolicy, silent: int=1):
+        with self.logger.span('baseline') as span:
+            if self.build_index is None:
+                self.capturer.capture(self.source_dir, policy.lcov_base_file, initial=True, silent=silent)
+                return
+            self.refresh_build_index()
+            cache_file = self.baseline_cache_file()
+            if os.path.exists(cache_file):
+                shutil.copyfile(cache_file, policy.lcov_base_file)
+                span.add(cache_hits=1)
+                return
+            self.capturer.capture(self.source_dir, policy.lcov_base_file, initial=True, silent=silent)
+            # a baseline of an older build is never valid again
+            for stale_file in glob.glob(os.path.join(glob.escape(self.cache_dir), 'baseline-*.info')):
+                os.unlink(stale_file)
+            shutil.copyfile(policy.lcov_base_file, cache_file + '.tmp')
+            os.replace(cache_file + '.tmp', cache_file)
+            span.add(cache_misses=1)
+
+    def merge_tracefiles(self, input_files: list, output_file: str, silent: int=1):
+        input_files = [input_file for input_file in input_files if input_file]
+        with self.logger.span('merge') as span:
+            span.add(tracefiles=len(input_files), tracefile_bytes=sum(map(os.path.getsize, input_files)))
+            if self.merge_backend == 'native':
+                begin = time.perf_counter()
+                merger = merge_tracefiles(input_files, output_file)
+                self.logger.info(f"merged {len(input_files)} tracefiles ({len(merger.files)} source files) in {time.perf_counter() - begin:.2f}s",
+                    { 'inputs': input_files, 'output': output_file })
+                return
+            add_opts = [opt for input_file in input_files for opt in ('-a', input_file)]
+            self.cmd_executor.must_exec(self.lcov_cmd + ['--no-checksum'] + add_opts + ['--output-file', output_file], silent=silent)
+
+    def shard_capture_jobs(self, policy: LCovOutputPathPolicy):
+        # {shard: (gcda dir, tracefile)}, a tracefile is named after its
+        # shard even if an earlier shard dumped no counters
+        jobs = {}
+        for i, gcda_dir in list_shard_gcda_dirs(policy.shard_output_dir).items():
+            link_gcno_files(gcda_dir)
+            jobs[i] = (gcda_dir, policy.shard_info_file(i))
+        return jobs
+
+    def capture_shards(self, policy: LCovOutputPathPolicy, silent: int=1):
+        jobs = self.shard_capture_jobs(policy)
+        if jobs:
+            self.capturer.capture_many(list(jobs.values()), silent=silent)
+        return { i: shard_info_file for i, (_, shard_info_file) in jobs.items() }
 
     def collect_coverage(self, policy: LCovOutputPathPolicy, silent: int=1):
-        self.cmd_executor.must_exec(f"{self.lcov_cmd} --no-checksum --capture --directory {self.source_dir} --output-file {policy.lcov_info_file}", silent=silent)
+        # returns the {shard: tracefile} the result was merged from
+        with self.logger.span('capture') as span:
+            shard_info_files = self.capture_shards(policy, silent=silent)
+            if not shard_info_files:
+                self.capturer.capture(self.source_dir, policy.lcov_info_file, silent=silent)
+            span.add(shards=len(shard_info_files))
+        if shard_info_files:
+            self.merge_tracefiles(list(shard_info_files.values()), policy.lcov_info_file, silent=silent)
+        self.finish_coverage_files()
+        self.finalize_coverage(policy, silent=silent)
+        return shard_info_files
 
-        if self.lcov_exclude_opts:
-            merge_file = tempfile.NamedTemporaryFile(delete=False)
-            merge_file_name = merge_file.name
-        else:
-            merge_file = None
-            merge_file_name = policy.lcov_info_final_file
-
-        if policy.lcov_base_file:
-            policy.lcov_base_file = ' -a ' + policy.lcov_base_file
-        self.cmd_executor.must_exec(f"{self.lcov_cmd} --no-checksum{policy.lcov_base_file} -a {policy.lcov_info_file} --output-file {merge_file_name}", silent=silent)            
-        if self.lcov_exclude_opts:
-            self.cmd_executor.must_exec(f"{self.lcov_cmd} --no-checksum -r {merge_file_name} {self.lcov_exclude_opts} --output-file {policy.lcov_info_final_file}", silent=silent)    
-            os.unlink(merge_file.name)
-        
+    def finish_coverage_files(self):
+        if self._baseline is not None:
+            with self.logger.span('baseline_wait'):
+                self._baseline.result()
+            self._baseline = None
+
+    def finalize_coverage(self, policy: LCovOutputPathPolicy, silent: int=1):
         # llvm issue
         # https://github.com/linux-test-project/lcov/issues/30
         # policy.lcov_info_final_file
         # todo: function must not be ignored in format: int a() { return b; }
-        with open(policy.lcov_info_final_file, 'r') as f:
-            lines = list(f)
-        with open(policy.lcov_info_final_file, 'w') as f:
-            for line in filter_lcov(lines, verbose=True):
-                f.write(line)
+        merge_inputs = [input_file for input_file in (policy.lcov_base_file, policy.lcov_info_file) if input_file]
+        demangle_calls = self.demangler.stats()['hits'] + self.demangler.stats()['misses']
+        with self.logger.span('filter') as span:
+            stats = self._merge_and_filter(policy, merge_inputs, silent)
+            demangle_calls = self.demangler.stats()['hits'] + self.demangler.stats()['misses'] - demangle_calls
+            span.add(tracefile_bytes_read=stats['bytes_read'], tracefile_bytes_written=stats['bytes_written'],
+                demangle_calls=demangle_calls)
+        self.logger.info(f"filtered {policy.lcov_info_final_file} at {stats['bytes_per_second'] / (1 << 20):.1f} MiB/s", stats)
+        self.logger.info("demangler stats", self.demangler.stats())
+
+    def _merge_and_filter(self, policy: LCovOutputPathPolicy, merge_inputs: list, silent: int=1):
+        if self.merge_backend == 'native':
+            # merge, path filtering and FN-line filtering fused into a single
+            # write of the final tracefile
+            begin = time.perf_counter()
+            merger = TracefileMerger(self.source_filter)
+            for input_file in merge_inputs:
+                merger.add_tracefile(input_file)
+            bytes_written = write_lcov_lines(filter_lcov(merger.iter_lines(), verbose=True,
+                demangler=self.demangler), policy.lcov_info_final_file)
+            elapsed = time.perf_counter() - begin
+            bytes_read = sum(os.path.getsize(input_file) for input_file in merge_inputs)
+            stats = {
+                'bytes_read': bytes_read,
+                'bytes_written': bytes_written,
+                'seconds': elapsed,
+                'bytes_per_second': bytes_read / elapsed if elapsed > 0 else 0.0,
+            }
+        else:
+            merge_file = policy.lcov_info_final_file + '.merge'
+            self.merge_tracefiles(merge_inputs, merge_file, silent=silent)
+            stats = filter_lcov_file(merge_file, policy.lcov_info_final_file, verbose=True,
+                demangler=self.demangler, source_filter=self.source_filter)
+            os.unlink(merge_file)
+        return stats
 
     # finial
     ### write out the final zero coverage and positive coverage reports
@@ -0,0 +1,110 @@
+
+import os
+
+from fuzzer_cov.core import BuildContainer, CommandExecutor, CoverageCapturer, Logger
+from .gcov import find_gcov_files
+
+# a counter directory remembers which binary wrote its profiles, so targets
+# of a multi-target run can share one capturer
+BINARY_MARKER = 'llvm-cov.binary'
+
+class LLVMCovCapturer(CoverageCapturer):
+    llvm_profdata_path: str
+    llvm_cov_path: str
+    source_dir: str
+    profraw_dir: str
+    fuzzer_path: str
+    jobs: int
+
+    def __init__(self, container: BuildContainer):
+        self.llvm_profdata_path = container.opts.llvm_profdata_path
+        self.llvm_cov_path = container.opts.llvm_cov_path
+        self.source_dir = container.opts.source_dir
+        self.profraw_dir = container.opts.profraw_dir
+        self.fuzzer_path = container.opts.fuzzer_path
+        self.jobs = container.opts.max_concurrency or os.cpu_count() or 1
+        self.cmd_executor = container.resolve(CommandExecutor)
+        self.logger = container.resolve(Logger)
+
+    def _profile_dir(self, directory: str):
+        # the build tree holds no counters with source-based coverage, its
+        # profiles are written to profraw_dir instead
+        if os.path.abspath(directory) == os.path.abspath(self.source_dir):
+            return self.profraw_dir
+        return directory
+
+    def zero_counters(self, directory: str, silent: int=1):
+        profile_dir = self._profile_dir(directory)
+        for profraw_file in find_gcov_files(profile_dir, '.profraw'):
+            os.unlink(profraw_file)
+
+    def replay_env(self, counter_dir: str=None, fuzzer_path: str=None):
+        profile_dir = os.path.abspath(counter_dir or self.profraw_dir)
+        os.makedirs(profile_dir, exist_ok=True)
+        if counter_dir is not None and fuzzer_path:
+            with open(os.path.join(profile_dir, BINARY_MARKER), 'w') as f:
+                f.write(os.path.abspath(fuzzer_path))
+        # one raw profile per process and binary, nothing is overwritten when
+        # the replays of a shard run one after another
+        return { 'LLVM_PROFILE_FILE': os.path.join(profile_dir, '%p-%m.profraw') }
+
+    def _binary(self, profile_dir: str):
+        marker = os.path.join(profile_dir, BINARY_MARKER)
+        if os.path.exists(marker):
+            with open(marker, 'r') as f:
+                return f.read().strip()
+        return self.fuzzer_path
+
+    def _profdata_cmd(self, profraw_list: str, profdata_file: str, jobs: int):
+        return [self.llvm_profdata_path, 'merge', '-sparse', f'-num-threads={jobs}',
+            f'-input-files={profraw_list}', '-o', profdata_file]
+
+    def _export_cmd(self, binary: str, profdata_file: str):
+        # the tracefile is llvm-cov's stdout, see output_files in capture_many
+        return [self.llvm_cov_path, 'export', '-format=lcov', f'-instr-profile={profdata_file}', binary]
+
+    def _prepare(self, directory: str, output_file: str):
+        profile_dir = self._profile_dir(directory)
+        profraw_files = find_gcov_files(profile_dir, '.profraw')
+        if not profraw_files:
+            return profile_dir, None
+        profraw_list = output_file + '.profraw.list'
+        with open(profraw_list, 'w') as f:
+            f.writelines(profraw_file + '\n' for profraw_file in profraw_files)
+        return profile_dir, profraw_list
+
+    def _check(self, results):
+        for code, _ in results:
+            if code:
+                raise Exception(f"command executor exit with non-zero code: {code}")
+
+    def capture_many(self, jobs: list, silent: int=1):
+        prepared = [self._prepare(directory, output_file) for directory, output_file in jobs]
+        with self.logger.span('llvm_cov', { 'directories': len(jobs) }) as span:
+            span.add(profraw_lists=sum(1 for _, profraw_list in prepared if profraw_list))
+            merges, exports, export_files = [], [], []
+            threads = max(1, self.jobs // max(1, len(jobs)))
+            for (_, output_file), (profile_dir, profraw_list) in zip(jobs, prepared):
+                if profraw_list is None:
+                    open(output_file, 'w').close()
+                    continue
+                profdata_file = output_file + '.profdata'
+                merges.append(self._profdata_cmd(profraw_list, profdata_file, threads))
+                exports.append(self._export_cmd(self._binary(profile_dir), profdata_file))
+                export_files.append(output_file)
+            self._check(self.cmd_executor.exec_many(merges, silent=silent))
+            self._check(self.cmd_executor.exec_many(exports, silent=silent, output_files=export_files))
+            for (_, output_file), (_, profraw_list) in zip(jobs, prepared):
+                if profraw_list is not None:
+                    os.unlink(profraw_list)
+                    os.unlink(output_file + '.profdata')
+                span.add(tracefile_bytes=os.path.getsize(output_file))
+
+    def capture(self, directory: str, output_file: str, initial: bool=False, silent: int=1):
+        if initial:
+            # llvm-cov export already reports every unexecuted region with a
+            # zero count, the baseline has nothing to add
+            open(output_file, 'w').close()
+            return
+        self.logger.info(f"llvm-cov capture: {directory}", { 'directory': directory })
+        self.capture_many([(directory, output_file)], silent=silent)
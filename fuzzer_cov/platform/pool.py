@@ -0,0 +1,37 @@
+
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import threading
+
+from fuzzer_cov.core import BuildContainer
+
+class WorkerPool(object):
+    jobs: int
+
+    def __init__(self, container: BuildContainer):
+        self.jobs = os.cpu_count() or 1
+        self._process_pool = None
+        self._lock = threading.Lock()
+
+    def process_pool(self) -> ProcessPoolExecutor:
+        # started on first use and reused by every stage, gcov batches and
+        # report pages no longer pay for spawning their own workers. Workers
+        # are added on demand while replay threads run, they must not be
+        # forked from this process
+        with self._lock:
+            if self._process_pool is None:
+                context = None
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                self._process_pool = ProcessPoolExecutor(max_workers=self.jobs, mp_context=context)
+            return self._process_pool
+
+    def map(self, fn, *iterables, chunksize: int=1):
+        return self.process_pool().map(fn, *iterables, chunksize=chunksize)
+
+    def close(self):
+        with self._lock:
+            pool, self._process_pool = self._process_pool, None
+        if pool is not None:
+            pool.shutdown()
@@ -0,0 +1,179 @@
+
+from http.client import HTTPConnection
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from .covquery import CoverageIndex
+
+def _query_summary(index: CoverageIndex, params: dict):
+    return index.summary()
+
+def _query_file(index: CoverageIndex, params: dict):
+    file_index = index.file(params['path'])
+    if file_index is None:
+        return None
+    result = file_index.as_dict()
+    result['functions'] = [fn.as_dict() for fn in file_index.function_order]
+    if params.get('uncovered'):
+        result['uncovered_lines'] = file_index.uncovered_lines()
+    return result
+
+def _query_function(index: CoverageIndex, params: dict):
+    return [fn.as_dict() for fn in index.function(params['name'], params.get('file'))]
+
+def _query_line(index: CoverageIndex, params: dict):
+    lineno = int(params['line'])
+    fn = index.function_at(params['file'], lineno)
+    return { 'file': params['file'], 'line': lineno, 'count': index.line(params['file'], lineno),
+        'function': None if fn is None else fn.name }
+
+def _query_directory(index: CoverageIndex, params: dict):
+    node = index.directory(params.get('path', '/'))
+    return None if node is None else node.as_dict()
+
+def _query_uncovered(index: CoverageIndex, params: dict):
+    return [fn.as_dict() for fn in index.uncovered_functions(params.get('prefix', '/'))]
+
+QUERIES = {
+    'summary': _query_summary,
+    'file': _query_file,
+    'function': _query_function,
+    'line': _query_line,
+    'directory': _query_directory,
+    'uncovered': _query_uncovered,
+}
+
+def run_query(index: CoverageIndex, name: str, params: dict):
+    query = QUERIES.get(name)
+    if query is None:
+        raise KeyError(f"unknown query: {name}")
+    with index.lock:
+        return query(index, params)
+
+class _QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = { key: values[-1] for key, values in parse_qs(url.query).items() }
+        name = url.path.strip('/') or 'summary'
+        if name not in QUERIES:
+            return self._reply(404, { 'error': f"unknown query: {name}" })
+        begin = time.perf_counter()
+        try:
+            result = run_query(self.server.index, name, params)
+        except KeyError as e:
+            return self._reply(400, { 'error': f"missing parameter: {e}" })
+        except ValueError as e:
+            return self._reply(400, { 'error': str(e) })
+        if result is None:
+            return self._reply(404, { 'error': 'not found' })
+        self._reply(200, { 'result': result, 'seconds': time.perf_counter() - begin })
+
+    def _reply(self, code: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # unix socket peers have no (host, port) address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+class _UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name, self.server_port = 'localhost', 0
+
+class CoverageQueryServer(object):
+    index: CoverageIndex
+    poll_interval: float
+
+    def __init__(self, index: CoverageIndex, socket_path: str=None, port: int=None,
+            host: str='127.0.0.1', poll_interval: float=1.0, verbose: bool=False):
+        self.index = index
+        self.poll_interval = poll_interval
+        self.verbose = verbose
+        if socket_path is not None:
+            self.httpd = _UnixHTTPServer(socket_path, _QueryHandler)
+        else:
+            self.httpd = ThreadingHTTPServer((host, port or 0), _QueryHandler)
+        self.httpd.index = index
+        self.httpd.verbose = verbose
+        self._stopped = threading.Event()
+
+    @property
+    def address(self):
+        return self.httpd.server_address
+
+    def _watch(self):
+        # the tracefile is only stat-ed here, an unchanged file costs nothing
+        while not self._stopped.wait(self.poll_interval):
+            begin = time.perf_counter()
+            reindexed = self.index.refresh()
+            if reindexed and self.verbose:
+                print(f"reloaded {self.index.tracefile}: {reindexed} files re-indexed in {time.perf_counter() - begin:.3f}s")
+
+    def serve_forever(self):
+        watcher = threading.Thread(target=self._watch, daemon=True)
+        watcher.start()
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self._stopped.set()
+            self.httpd.server_close()
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.unlink(self.address)
+
+    def shutdown(self):
+        self._stopped.set()
+        self.httpd.shutdown()
+
+class _UnixHTTPConnection(HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+class CoverageQueryClient(object):
+    def __init__(self, socket_path: str=None, host: str='127.0.0.1', port: int=None, timeout: float=10.0):
+        if socket_path is not None:
+            self.conn = _UnixHTTPConnection(socket_path, timeout)
+        else:
+            self.conn = HTTPConnection(host, port, timeout=timeout)
+
+    def query(self, name: str, params: dict=None):
+        # keeps one connection open, thousands of questions do not pay a
+        # connect each
+        self.conn.request('GET', f"/{name}?{urlencode(params or {})}")
+        response = self.conn.getresponse()
+        body = json.loads(response.read())
+        if response.status == 404 and name in QUERIES:
+            return None
+        if response.status != 200:
+            raise Exception(f"query {name} failed: {body.get('error')}")
+        return body['result']
+
+    def close(self):
+        self.conn.close()
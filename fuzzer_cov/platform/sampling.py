@@ -0,0 +1,202 @@
+
+import json
+import math
+import os
+import random
+
+from .tracefile import read_tracefile
+
+def sample_size(sample: float, n: int) -> int:
+    # a fraction of the corpus below 1, a number of inputs otherwise
+    size = math.ceil(sample * n) if sample < 1 else int(sample)
+    return max(1, min(n, size)) if n else 0
+
+def size_bucket(path: str) -> int:
+    return os.path.getsize(path).bit_length()
+
+def stratify(case_files: list, corpus_dir: str):
+    # strata: directory below the corpus root x power-of-two size class
+    strata = {}
+    for path in case_files:
+        key = (os.path.relpath(os.path.dirname(path), corpus_dir), size_bucket(path))
+        strata.setdefault(key, []).append(path)
+    return strata
+
+def stratified_sample(case_files: list, corpus_dir: str, size: int, seed: int=0):
+    # proportional allocation by largest remainder, every stratum keeps at
+    # least one input as long as the sample is large enough to allow it
+    rnd = random.Random(seed)
+    strata = stratify(case_files, corpus_dir)
+    keys = sorted(strata)
+    n = len(case_files)
+    quotas = { key: size * len(strata[key]) / n for key in keys }
+    alloc = { key: int(quotas[key]) for key in keys }
+    if size >= len(keys):
+        for key in keys:
+            alloc[key] = max(1, alloc[key])
+    remaining = size - sum(alloc.values())
+    for key in sorted(keys, key=lambda key: alloc[key] - quotas[key]):
+        if remaining <= 0:
+            break
+        if alloc[key] < len(strata[key]):
+            alloc[key] += 1
+            remaining -= 1
+    while remaining < 0:
+        # minimums overshot a tiny sample, take back from the largest strata
+        key = max(keys, key=lambda key: alloc[key])
+        alloc[key] -= 1
+        remaining += 1
+    return { key: rnd.sample(strata[key], min(alloc[key], len(strata[key]))) for key in keys if alloc[key] > 0 }
+
+def split_groups(sample: dict, n: int, seed: int=0):
+    # replicate groups for the variance estimate, each stratum is dealt out
+    # round-robin so every group is a stratified sample of its own
+    rnd = random.Random(seed + 1)
+    groups = [[] for _ in range(max(1, n))]
+    offset = 0
+    for key in sorted(sample):
+        picks = list(sample[key])
+        rnd.shuffle(picks)
+        for i, path in enumerate(picks):
+            groups[(offset + i) % len(groups)].append(path)
+        offset += len(picks)
+    return [sorted(group) for group in groups if group]
+
+def covered_sets(tracefile: str, branch_coverage: bool=False, hit_only: bool=True):
+    lines, branches = set(), set()
+    if tracefile is None:
+        return lines, branches
+    for record in read_tracefile(tracefile):
+        lines.update((record.source_file, lineno) for lineno, count in record.lines.items() if count or not hit_only)
+        if branch_coverage:
+            branches.update((record.source_file,) + key for key, taken in record.branches.items()
+                if taken or not hit_only)
+    return lines, branches
+
+def _extrapolate(freq: dict, k: int, t: float, found: int):
+    # Chao2 estimate of the undetected points, at most the instrumented
+    # points nobody has hit, then the expected number of points t more
+    # sampling units would reveal (Chao et al. 2014)
+    observed = sum(freq.values())
+    q1, q2 = freq.get(1, 0), freq.get(2, 0)
+    if not q1:
+        return observed
+    a = (k - 1) / k
+    q0 = min(a * q1 * q1 / (2 * q2) if q2 else a * q1 * (q1 - 1) / 2, found - observed)
+    if not q0 or not t:
+        return observed
+    return observed + q0 * (1 - (1 - q1 / (k * q0 + q1)) ** t)
+
+def extrapolate_coverage(group_sets: list, found: int, sampled_fraction: float, seed: int=0,
+        rounds: int=200, z: float=1.96):
+    # every group is a sampling unit, the rest of the corpus adds
+    # k * (1 / f - 1) more of them. The variance is bootstrapped over
+    # resampled groups
+    k = len(group_sets)
+    masks = {}
+    for i, points in enumerate(group_sets):
+        for point in points:
+            masks[point] = masks.get(point, 0) | (1 << i)
+    observed = len(masks)
+    # points sharing an incidence pattern behave alike, resample the patterns
+    patterns = {}
+    for mask in masks.values():
+        patterns[mask] = patterns.get(mask, 0) + 1
+    t = k * (1 / sampled_fraction - 1) if sampled_fraction > 0 else 0
+    clamp = lambda value: min(found, max(observed, value))
+
+    def freq_of(picks):
+        freq = {}
+        for mask, n in patterns.items():
+            hits = sum(1 for i in picks if mask >> i & 1)
+            if hits:
+                freq[hits] = freq.get(hits, 0) + n
+        return freq
+
+    estimate = _extrapolate(freq_of(range(k)), k, t, found)
+    lower = upper = estimate
+    gain = estimate - observed
+    if k > 1 and gain > 0:
+        rnd = random.Random(seed)
+        boot = [_extrapolate(freq_of([rnd.randrange(k) for _ in range(k)]), k, t, found) for _ in range(rounds)]
+        mean = sum(boot) / rounds
+        var = sum((value - mean) ** 2 for value in boot) / (rounds - 1)
+        # log-normal interval of the unseen part, as usual for Chao-type
+        # estimators: the lower bound never drops below what was observed
+        c = math.exp(z * math.sqrt(math.log(1 + var / gain ** 2)))
+        lower, upper = observed + gain / c, observed + gain * c
+    return {
+        'found': found,
+        'observed': observed,
+        'estimate': round(clamp(estimate), 1),
+        'lower': round(clamp(lower), 1),
+        'upper': round(clamp(upper), 1),
+    }
+
+def estimate_coverage(group_files: list, final_file: str, sampled: int, total: int,
+        branch_coverage: bool=False, seed: int=0):
+    # the group tracefiles are raw captures, only the points the filtered
+    # final tracefile reports (no excluded sources, no function-start
+    # lines) count towards the estimate
+    found_lines, found_branches = covered_sets(final_file, branch_coverage, hit_only=False)
+    sets = [covered_sets(group_file, branch_coverage) for group_file in group_files]
+    fraction = sampled / total if total else 1.0
+    estimate = {
+        'exact': sampled >= total,
+        'inputs': total,
+        'sampled': sampled,
+        'groups': len(group_files),
+        'lines': extrapolate_coverage([lines & found_lines for lines, _ in sets], len(found_lines), fraction, seed),
+    }
+    if branch_coverage:
+        estimate['branches'] = extrapolate_coverage([branches & found_branches for _, branches in sets],
+            len(found_branches), fraction, seed)
+    return estimate
+
+def exact_coverage(final_file: str, branch_coverage: bool=False):
+    found, hit = { 'LF': 0, 'BRF': 0 }, { 'LF': 0, 'BRF': 0 }
+    for record in read_tracefile(final_file):
+        found['LF'] += len(record.lines)
+        hit['LF'] += sum(1 for count in record.lines.values() if count)
+        found['BRF'] += len(record.branches)
+        hit['BRF'] += sum(1 for taken in record.branches.values() if taken)
+    exact = lambda key: { 'found': found[key], 'observed': hit[key], 'estimate': hit[key],
+        'lower': hit[key], 'upper': hit[key] }
+    coverage = { 'exact': True, 'lines': exact('LF') }
+    if branch_coverage:
+        coverage['branches'] = exact('BRF')
+    return coverage
+
+def format_estimate(name: str, stats: dict) -> str:
+    rate = lambda value: 100.0 * value / stats['found'] if stats['found'] else 0.0
+    if stats['lower'] == stats['upper']:
+        return f"{name}: {stats['estimate']:.0f}/{stats['found']} ({rate(stats['estimate']):.1f}%)"
+    return (f"{name}: ~{stats['estimate']:.0f}/{stats['found']} ({rate(stats['estimate']):.1f}%, "
+        f"95% bounds {rate(stats['lower']):.1f}%..{rate(stats['upper']):.1f}%, observed {rate(stats['observed']):.1f}%)")
+
+def write_estimate(estimate: dict, estimate_file: str):
+    tmp_file = estimate_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(estimate, f, indent=2)
+    os.replace(tmp_file, estimate_file)
+
+def load_estimate(estimate_file: str):
+    if not os.path.exists(estimate_file):
+        return None
+    with open(estimate_file, 'r') as f:
+        return json.load(f)
+
+def strip_sample_arguments(argv: list):
+    # the command line of the background run that finishes a sampled one
+    valued = ('--sample', '--sample-groups', '--sample-seed')
+    stripped, skip = [], False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg in valued:
+            skip = True
+        elif arg == '--sample-continue' or arg.split('=', 1)[0] in valued:
+            continue
+        else:
+            stripped.append(arg)
+    return stripped
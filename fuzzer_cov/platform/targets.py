@@ -0,0 +1,71 @@
+
+import json
+import os
+import re
+
+from .tracefile import read_tracefile
+
+class FuzzTarget(object):
+    name: str
+    fuzzer_path: str
+    corpus_dir: str
+
+    def __init__(self, name: str, fuzzer_path: str, corpus_dir: str):
+        self.name = name
+        self.fuzzer_path = fuzzer_path
+        self.corpus_dir = corpus_dir
+
+def load_targets(targets_file: str):
+    # a json list of {"name", "fuzzer", "corpus"} objects (or {"targets":
+    # [...]}), or a text file of `fuzzer corpus [name]` lines
+    base_dir = os.path.dirname(os.path.abspath(targets_file))
+    with open(targets_file, 'r') as f:
+        content = f.read()
+    if content.lstrip().startswith(('[', '{')):
+        entries = json.loads(content)
+        if isinstance(entries, dict):
+            entries = entries['targets']
+        entries = [(entry['fuzzer'], entry['corpus'], entry.get('name')) for entry in entries]
+    else:
+        entries = []
+        for line in content.splitlines():
+            fields = line.split('#', 1)[0].split()
+            if fields:
+                entries.append((fields[0], fields[1], fields[2] if len(fields) > 2 else None))
+    targets, names = [], set()
+    for fuzzer_path, corpus_dir, name in entries:
+        name = re.sub(r'[^\w.-]', '_', name or os.path.basename(fuzzer_path))
+        if name in names:
+            raise ValueError(f"duplicated fuzz target name: {name}")
+        names.add(name)
+        targets.append(FuzzTarget(name, os.path.join(base_dir, fuzzer_path), os.path.join(base_dir, corpus_dir)))
+    return targets
+
+def covered_points(tracefile: str):
+    lines, functions, branches, found = set(), set(), set(), { 'LF': 0, 'FNF': 0, 'BRF': 0 }
+    for record in read_tracefile(tracefile):
+        found['LF'] += len(record.lines)
+        found['FNF'] += len(record.functions)
+        found['BRF'] += len(record.branches)
+        lines.update((record.source_file, lineno) for lineno, count in record.lines.items() if count)
+        functions.update((record.source_file, name) for name, (_, count) in record.functions.items() if count)
+        branches.update((record.source_file,) + key for key, taken in record.branches.items() if taken)
+    return found, lines, functions, branches
+
+def target_breakdown(target_files: dict, combined_file: str):
+    # per-target totals plus the lines only one target reaches
+    points = { name: covered_points(tracefile) for name, tracefile in target_files.items() }
+    line_owners = {}
+    for name, (_, lines, _, _) in points.items():
+        for point in lines:
+            line_owners[point] = name if point not in line_owners else None
+    unique = {}
+    for owner in line_owners.values():
+        if owner is not None:
+            unique[owner] = unique.get(owner, 0) + 1
+    found, lines, functions, branches = covered_points(combined_file)
+    breakdown = { 'combined': dict(found, LH=len(lines), FNH=len(functions), BRH=len(branches)), 'targets': {} }
+    for name, (found, lines, functions, branches) in points.items():
+        breakdown['targets'][name] = dict(found, LH=len(lines), FNH=len(functions), BRH=len(branches),
+            unique_lines=unique.get(name, 0), tracefile=target_files[name])
+    return breakdown
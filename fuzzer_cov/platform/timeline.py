@@ -0,0 +1,92 @@
+
+import csv
+import json
+import os
+
+from .gcov import GcovCapturer, find_gcov_files, gcda_counters_digest
+
+class CoverageTimeline(object):
+    branch_coverage: bool
+
+    def __init__(self, capturer: GcovCapturer, directory: str, branch_coverage: bool=False):
+        self.capturer = capturer
+        self.directory = directory
+        self.branch_coverage = branch_coverage
+        self.gcda_files = [gcno_file[:-len('.gcno')] + '.gcda'
+            for gcno_file in find_gcov_files(directory, '.gcno', capturer.follow_links)]
+        self.gcda_stats = {}
+        self.gcda_digests = {}
+        self.found = { 'lines': set(), 'functions': set(), 'branches': set() }
+        self.hit = { 'lines': set(), 'functions': set(), 'branches': set() }
+        self.samples = []
+
+    def _add_sources(self, sources, found: bool):
+        target = self.found if found else self.hit
+        for path, record in sources.items():
+            for lineno, count in record['lines'].items():
+                if found or count:
+                    target['lines'].add((path, lineno))
+            for name, (_, count) in record['functions'].items():
+                if found or count:
+                    target['functions'].add((path, name))
+            if self.branch_coverage:
+                executed = record['lines']
+                for (lineno, block), counts in record['branches'].items():
+                    for i, count in enumerate(counts):
+                        if found or (count and executed.get(lineno)):
+                            target['branches'].add((path, lineno, block, i))
+
+    def initialize(self):
+        # totals come from the notes files alone, counters must be zeroed
+        gcno_files = [gcda_file[:-len('.gcda')] + '.gcno' for gcda_file in self.gcda_files]
+        self._add_sources(self.capturer.collect(gcno_files), found=True)
+
+    def _changed_gcda_files(self):
+        # every object a replay executes has its .gcda rewritten, only those
+        # whose counters moved are captured again
+        changed = []
+        for gcda_file in self.gcda_files:
+            try:
+                st = os.stat(gcda_file)
+            except FileNotFoundError:
+                continue
+            key = (st.st_size, st.st_mtime_ns)
+            if self.gcda_stats.get(gcda_file) == key:
+                continue
+            self.gcda_stats[gcda_file] = key
+            digest = gcda_counters_digest(gcda_file)
+            if digest is None or self.gcda_digests.get(gcda_file) != digest:
+                self.gcda_digests[gcda_file] = digest
+                changed.append(gcda_file)
+        return changed
+
+    def sample(self, **fields):
+        # counters only grow while inputs are replayed, so the coverage of the
+        # objects whose counters changed can simply be unioned into the totals
+        changed = self._changed_gcda_files()
+        before = { kind: len(hit) for kind, hit in self.hit.items() }
+        if changed:
+            self._add_sources(self.capturer.collect(changed), found=False)
+        row = dict(fields)
+        for kind in ('lines', 'functions', 'branches'):
+            row[f"{kind}_covered"] = len(self.hit[kind])
+            row[f"{kind}_total"] = len(self.found[kind] | self.hit[kind])
+            row[f"new_{kind}"] = len(self.hit[kind]) - before[kind]
+        row['changed_objects'] = len(changed)
+        self.samples.append(row)
+        return row
+
+    def last_gain(self):
+        for row in reversed(self.samples):
+            if row['new_lines'] or row['new_functions'] or row['new_branches']:
+                return row
+        return None
+
+    def write(self, csv_file: str, json_file: str):
+        if self.samples:
+            with open(csv_file, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=list(self.samples[0]))
+                writer.writeheader()
+                writer.writerows(self.samples)
+        with open(json_file, 'w') as f:
+            json.dump({ 'samples': self.samples, 'last_gain': self.last_gain() }, f)
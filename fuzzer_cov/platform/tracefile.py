@@ -0,0 +1,221 @@
+
+from array import array
+import os
+
+class TracefileRecord(object):
+    test_name: str
+    source_file: str
+
+    def __init__(self, source_file: str, test_name: str=''):
+        self.test_name = test_name
+        self.source_file = source_file
+        # lineno -> hit count
+        self.lines = {}
+        # name -> (lineno, hit count)
+        self.functions = {}
+        # (lineno, block, branch) -> taken count, None for '-'
+        self.branches = {}
+
+def parse_tracefile(f):
+    test_name, record = '', None
+    for line in f:
+        if line.startswith('DA:'):
+            fields = line[3:].split(',')
+            lineno = int(fields[0])
+            record.lines[lineno] = record.lines.get(lineno, 0) + int(fields[1])
+        elif line.startswith('BRDA:'):
+            lineno, block, branch, taken = line[5:].rstrip('\n').split(',')
+            key = (int(lineno), int(block), int(branch))
+            if taken == '-':
+                record.branches.setdefault(key, None)
+            else:
+                record.branches[key] = int(taken) + (record.branches.get(key) or 0)
+        elif line.startswith('FNDA:'):
+            count, name = line[5:].rstrip('\n').split(',', 1)
+            lineno, hits = record.functions.get(name, (0, 0))
+            record.functions[name] = (lineno, hits + int(count))
+        elif line.startswith('FN:'):
+            lineno, name = line[3:].rstrip('\n').split(',', 1)
+            end, _, rest = name.partition(',')
+            if rest and end.isdigit():
+                # lcov 2.x writes FN:<start>,<end>,<name>
+                name = rest
+            _, hits = record.functions.get(name, (0, 0))
+            record.functions[name] = (int(lineno), hits)
+        elif line.startswith('SF:'):
+            record = TracefileRecord(line[3:].rstrip('\n'), test_name)
+        elif line.startswith('TN:'):
+            test_name = line[3:].rstrip('\n')
+        elif line.startswith('end_of_record'):
+            if record is not None:
+                yield record
+            record = None
+
+def read_tracefile(path: str):
+    with open(path, 'r', buffering=1 << 20) as f:
+        yield from parse_tracefile(f)
+
+def format_tracefile_record(source_file: str, lines, functions, branches, test_name: str=''):
+    # lines: sorted (lineno, count), functions: (name, lineno, count) ordered
+    # by line, branches: sorted (lineno, block, branch, taken or None)
+    yield f"TN:{test_name}\n"
+    yield f"SF:{source_file}\n"
+    fnh = 0
+    for name, lineno, _ in functions:
+        yield f"FN:{lineno},{name}\n"
+    for name, _, count in functions:
+        yield f"FNDA:{count},{name}\n"
+        fnh += 1 if count else 0
+    yield f"FNF:{len(functions)}\nFNH:{fnh}\n"
+    brf = brh = 0
+    for lineno, block, branch, taken in branches:
+        yield f"BRDA:{lineno},{block},{branch},{'-' if taken is None else taken}\n"
+        brf += 1
+        brh += 1 if taken else 0
+    if brf:
+        yield f"BRF:{brf}\nBRH:{brh}\n"
+    lf = lh = 0
+    for lineno, count in lines:
+        yield f"DA:{lineno},{count}\n"
+        lf += 1
+        lh += 1 if count else 0
+    yield f"LF:{lf}\nLH:{lh}\n"
+    yield "end_of_record\n"
+
+def write_tracefile_record(f, source_file: str, lines, functions, branches, test_name: str=''):
+    f.writelines(format_tracefile_record(source_file, lines, functions, branches, test_name))
+
+class FileCounters(object):
+    source_file: str
+    test_name: str
+
+    def __init__(self, source_file: str, test_name: str=''):
+        self.source_file = source_file
+        self.test_name = test_name
+        # indexed by line number, -1 marks lines without DA record
+        self.lines = array('q')
+        # name -> [lineno, count]
+        self.functions = {}
+        # (lineno, block, branch) -> slot in branch_counts, -1 marks '-'
+        self.branch_slots = {}
+        self.branch_counts = array('q')
+
+    def add_line(self, lineno: int, count: int):
+        lines = self.lines
+        if lineno >= len(lines):
+            lines.extend(array('q', [-1]) * (max(lineno + 1, 2 * len(lines)) - len(lines)))
+        prev = lines[lineno]
+        lines[lineno] = count if prev < 0 else prev + count
+
+    def add_branch(self, key, taken: int):
+        slot = self.branch_slots.get(key)
+        if slot is None:
+            self.branch_slots[key] = len(self.branch_counts)
+            self.branch_counts.append(taken)
+        elif taken >= 0:
+            prev = self.branch_counts[slot]
+            self.branch_counts[slot] = taken if prev < 0 else prev + taken
+
+    def add_function(self, name: str, lineno: int):
+        fn = self.functions.get(name)
+        if fn is None:
+            self.functions[name] = [lineno, 0]
+        elif not fn[0]:
+            fn[0] = lineno
+
+    def add_function_hits(self, name: str, count: int):
+        fn = self.functions.get(name)
+        if fn is None:
+            self.functions[name] = [0, count]
+        else:
+            fn[1] += count
+
+    def iter_lines(self):
+        for lineno, count in enumerate(self.lines):
+            if count >= 0:
+                yield lineno, count
+
+    def iter_branches(self):
+        counts = self.branch_counts
+        for key in sorted(self.branch_slots):
+            taken = counts[self.branch_slots[key]]
+            yield key[0], key[1], key[2], None if taken < 0 else taken
+
+    def iter_functions(self):
+        ordered = sorted(self.functions.items(), key=lambda item: (item[1][0], item[0]))
+        return [(name, lineno, count) for name, (lineno, count) in ordered]
+
+    def format(self):
+        return format_tracefile_record(self.source_file, self.iter_lines(), self.iter_functions(),
+            self.iter_branches(), self.test_name)
+
+    def write(self, f):
+        f.writelines(self.format())
+
+class TracefileMerger(object):
+    def __init__(self, source_filter=None):
+        # source_filter(path) -> bool, records of rejected files are skipped
+        # without parsing their body
+        self.source_filter = source_filter
+        self.files = {}
+
+    def add_stream(self, f):
+        test_name, counters, skipping = '', None, False
+        files, source_filter = self.files, self.source_filter
+        for line in f:
+            if skipping:
+                if line.startswith('end_of_record'):
+                    skipping = False
+                continue
+            if line.startswith('DA:'):
+                lineno, count = line[3:].split(',', 2)[:2]
+                counters.add_line(int(lineno), int(count))
+            elif line.startswith('BRDA:'):
+                lineno, block, branch, taken = line[5:].rstrip('\n').split(',')
+                counters.add_branch((int(lineno), int(block), int(branch)), -1 if taken == '-' else int(taken))
+            elif line.startswith('FNDA:'):
+                count, name = line[5:].rstrip('\n').split(',', 1)
+                counters.add_function_hits(name, int(count))
+            elif line.startswith('FN:'):
+                lineno, name = line[3:].rstrip('\n').split(',', 1)
+                end, _, rest = name.partition(',')
+                if rest and end.isdigit():
+                    name = rest
+                counters.add_function(name, int(lineno))
+            elif line.startswith('SF:'):
+                source_file = line[3:].rstrip('\n')
+                if source_filter is not None and not source_filter(source_file):
+                    skipping = True
+                    continue
+                counters = files.get(source_file)
+                if counters is None:
+                    counters = files[source_file] = FileCounters(source_file, test_name)
+            elif line.startswith('TN:'):
+                test_name = line[3:].rstrip('\n')
+            elif line.startswith('end_of_record'):
+                counters = None
+        return self
+
+    def add_tracefile(self, path: str):
+        with open(path, 'r', buffering=1 << 20) as f:
+            return self.add_stream(f)
+
+    def iter_lines(self):
+        for source_file in sorted(self.files):
+            yield from self.files[source_file].format()
+
+    def write(self, f):
+        f.writelines(self.iter_lines())
+
+    def write_tracefile(self, path: str):
+        tmp_file = path + '.tmp'
+        with open(tmp_file, 'w', buffering=1 << 20) as f:
+            self.write(f)
+        os.replace(tmp_file, path)
+
+def merge_tracefiles(input_files, output_file: str, source_filter=None):
+    merger = TracefileMerger(source_filter)
+    for input_file in input_files:
+        merger.add_tracefile(input_file)
+    merger.write_tracefile(output_file)
+    return merger
@@ -17,7 +17,10 @@ setup(
     author='Myriad Dreamin',
     author_email='camiyoru@gmail.com',
     license='MIT',
-    packages=find_packages(),
+    packages=find_packages(exclude=['tests', 'tests.*']),
+    # asyncio subprocesses started from worker threads' event loops need the
+    # thread-safe child watcher of 3.8
+    python_requires='>=3.8',
     install_requires=[],
     classifiers=[
         #   3 - Alpha
@@ -28,6 +31,9 @@ setup(
         'Topic :: Software Development',
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
     ]
 )
\ No newline at end of file
@@ -0,0 +1,45 @@
+
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+
+from fuzzer_cov.core import CommandExecutor, Logger
+from fuzzer_cov.core.container import BuildContainerImpl, SCOPED
+from fuzzer_cov.core.logger import LoggerImpl
+from fuzzer_cov.platform.asyncexec import AsyncCommandExecutorImpl
+
+class AsyncCommandExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='fuzzer-cov-test-')
+        opts = types.SimpleNamespace(max_concurrency=2, command_timeout=None, command_log_dir=self.work_dir,
+            metrics_file=None, profile_dir=None)
+        self.container = BuildContainerImpl(opts)
+        self.container.register_impl(LoggerImpl, Logger, lifetime=SCOPED)
+        self.container.register_impl(AsyncCommandExecutorImpl, CommandExecutor, lifetime=SCOPED)
+        self.executor = self.container.resolve(CommandExecutor)
+
+    def tearDown(self):
+        self.container.close()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_output_lines(self):
+        code, lines = self.executor.exec([sys.executable, '-c', "print('a'); print('b', end='')"])
+        self.assertEqual((code, lines), (0, ['a', 'b']))
+
+    def test_long_line_is_split(self):
+        # a command writing without newlines never buffers more than a line's worth
+        size = 5 * self.executor.max_line_bytes
+        code, lines = self.executor.exec([sys.executable, '-c', f"import sys; sys.stdout.write('x' * {size})"])
+        self.assertEqual(code, 0)
+        self.assertEqual(sum(map(len, lines)), size)
+        self.assertTrue(all(len(line) <= self.executor.max_line_bytes + self.executor.chunk_size for line in lines))
+        self.assertGreater(len(lines), 1)
+
+    def test_timeout(self):
+        code, _ = self.executor.exec([sys.executable, '-c', "import time; time.sleep(30)"], timeout=0.5)
+        self.assertNotEqual(code, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from fuzzer_cov.platform.attribution import CoverageAttribution
+from fuzzer_cov.platform.tracefile import write_tracefile_record
+
+class CoverageAttributionTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='fuzzer-cov-test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def tracefile(self, name: str, lines: dict, branches: list=()):
+        path = os.path.join(self.work_dir, name)
+        with open(path, 'w') as f:
+            for source_file in sorted(lines):
+                write_tracefile_record(f, source_file, sorted(lines[source_file].items()), [],
+                    [branch[1:] for branch in branches if branch[0] == source_file])
+        return path
+
+    def attribution(self, branch_coverage: bool=False):
+        attribution = CoverageAttribution(branch_coverage=branch_coverage)
+        attribution.add_tracefile(['a'], self.tracefile('a', { '/src/x.c': { 1: 1, 2: 1, 3: 0 } }))
+        attribution.add_tracefile(['b'], self.tracefile('b', { '/src/x.c': { 1: 1, 2: 0, 3: 1 } }))
+        attribution.add_tracefile(['c'], self.tracefile('c', { '/src/x.c': { 1: 0, 2: 1, 3: 1 },
+            '/src/y.c': { 7: 2 } }, [('/src/y.c', 7, 0, 0, 1), ('/src/y.c', 7, 0, 1, None)]))
+        attribution.add_tracefile(['d'], self.tracefile('d', { '/src/x.c': { 1: 0, 2: 0, 3: 0 } }))
+        return attribution
+
+    def test_bitsets(self):
+        attribution = self.attribution()
+        points = attribution.points
+        covered = [sorted(points[i] for i in range(len(points)) if bits >> i & 1) for bits in attribution.bitsets]
+        self.assertEqual(covered, [
+            [('/src/x.c', 1), ('/src/x.c', 2)],
+            [('/src/x.c', 1), ('/src/x.c', 3)],
+            [('/src/x.c', 2), ('/src/x.c', 3), ('/src/y.c', 7)],
+            [],
+        ])
+
+    def test_branch_points(self):
+        attribution = self.attribution(branch_coverage=True)
+        self.assertIn(('/src/y.c', 7, 0, 0), attribution.points)
+        self.assertNotIn(('/src/y.c', 7, 0, 1), attribution.points)
+
+    def test_minimize_covers_everything(self):
+        attribution = self.attribution()
+        minimized = attribution.minimize()
+        self.assertEqual(minimized[0], 'c')
+        self.assertEqual(len(minimized), 2)
+        self.assertNotIn('d', minimized)
+        bits = 0
+        for case_files, bitset in zip(attribution.inputs, attribution.bitsets):
+            if case_files[0] in minimized:
+                bits |= bitset
+        self.assertEqual(bits, attribution.total())
+
+    def test_inputs_hitting(self):
+        attribution = self.attribution()
+        self.assertEqual(attribution.inputs_hitting('/src/x.c', 3), ['b', 'c'])
+        self.assertEqual(attribution.inputs_hitting('x.c', 1), ['a', 'b'])
+        self.assertEqual(attribution.inputs_hitting('/src/x.c', 9), [])
+
+    def test_save_load(self):
+        attribution = self.attribution(branch_coverage=True)
+        path = os.path.join(self.work_dir, 'attribution.json')
+        attribution.save(path)
+        loaded = CoverageAttribution.load(path)
+        self.assertEqual(loaded.points, attribution.points)
+        self.assertEqual(loaded.bitsets, attribution.bitsets)
+        self.assertEqual(loaded.minimize(), attribution.minimize())
+
+if __name__ == '__main__':
+    unittest.main()
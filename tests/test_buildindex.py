@@ -0,0 +1,40 @@
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from fuzzer_cov.platform.buildindex import BuildIndex
+from fuzzer_cov.platform.corpus import fingerprint_files
+
+class BuildIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='fuzzer-cov-test-')
+        self.source_dir = os.path.join(self.work_dir, 'src')
+        os.makedirs(self.source_dir)
+        self.fuzzers = [self.write(os.path.join(self.work_dir, name), name) for name in ('fuzz_a', 'fuzz_b')]
+        self.write(os.path.join(self.source_dir, 'a.gcno'), 'a')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def write(self, path: str, content: str):
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def index(self):
+        return BuildIndex(os.path.join(self.work_dir, 'cache', 'build.index.json'), self.source_dir)
+
+    def test_rebuilt_target_invalidates(self):
+        self.assertTrue(self.index().refresh(fingerprint_files(self.fuzzers)))
+        self.assertFalse(self.index().refresh(fingerprint_files(reversed(self.fuzzers))))
+        # only the second target is rebuilt, with a new object
+        self.write(os.path.join(self.source_dir, 'b.gcno'), 'b')
+        self.write(self.fuzzers[1], 'fuzz_b rebuilt')
+        index = self.index()
+        self.assertTrue(index.refresh(fingerprint_files(self.fuzzers)))
+        self.assertEqual(sorted(map(os.path.basename, index.gcno_files)), ['a.gcno', 'b.gcno'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+
+import types
+import unittest
+
+from fuzzer_cov.core.container import BuildContainerImpl, TRANSIENT, SCOPED, SINGLETON
+
+class Log(object):
+    def __init__(self, container):
+        self.name = container.opts.name
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+class Pool(object):
+    def __init__(self, container):
+        self.name = container.opts.name
+
+class Runner(object):
+    def __init__(self, container):
+        self.log = container.resolve(Log)
+        self.pool = container.resolve(Pool)
+
+class CapturingPool(object):
+    def __init__(self, container):
+        self.log = container.resolve(Log)
+
+class BuildContainerTest(unittest.TestCase):
+    def container(self):
+        container = BuildContainerImpl(types.SimpleNamespace(name='root'))
+        container.register_impl(Log, lifetime=SCOPED)
+        container.register_impl(Pool, lifetime=SINGLETON)
+        container.register_impl(Runner, lifetime=TRANSIENT)
+        return container
+
+    def test_lifetimes(self):
+        container = self.container()
+        scope = container.create_scope(types.SimpleNamespace(name='scope'))
+        runner, scope_runner = container.resolve(Runner), scope.resolve(Runner)
+        self.assertIsNot(runner, container.resolve(Runner))
+        self.assertIs(runner.log, container.resolve(Log))
+        self.assertEqual((runner.log.name, scope_runner.log.name), ('root', 'scope'))
+        self.assertIs(runner.pool, scope_runner.pool)
+        self.assertEqual(scope_runner.pool.name, 'root')
+        scope.close()
+        self.assertTrue(scope_runner.log.closed)
+        self.assertFalse(runner.log.closed)
+        self.assertIs(scope.resolve(Pool), runner.pool)
+        container.close()
+        self.assertTrue(runner.log.closed)
+
+    def test_singleton_cannot_capture_scoped(self):
+        container = self.container()
+        container.register_impl(CapturingPool, lifetime=SINGLETON)
+        scope = container.create_scope(types.SimpleNamespace(name='scope'))
+        with self.assertRaises(ValueError):
+            scope.resolve(CapturingPool)
+        # the failed construction leaves nothing behind
+        self.assertEqual(scope.resolve(Runner).log.name, 'scope')
+        with self.assertRaises(ValueError):
+            container.resolve(CapturingPool)
+
+    def test_owned_instances(self):
+        container = self.container()
+        owned, borrowed = Log(container), Pool(container)
+        container.register_instance(owned, owned=True)
+        container.register_instance(borrowed)
+        self.assertIs(container.resolve(Log), owned)
+        self.assertIs(container.resolve(Pool), borrowed)
+        container.close()
+        self.assertTrue(owned.closed)
+
+if __name__ == '__main__':
+    unittest.main()
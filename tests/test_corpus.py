@@ -0,0 +1,61 @@
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from fuzzer_cov.platform.corpus import link_corpus_files, list_corpus_links, unlink_corpus_files, \
+    list_shard_gcda_dirs, shard_paths
+
+class CorpusLinksTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='fuzzer-cov-test-')
+        self.corpus_dir = os.path.join(self.work_dir, 'corpus')
+        os.makedirs(os.path.join(self.corpus_dir, 'sub'))
+        self.case_files = []
+        for name in ('a', 'b', os.path.join('sub', 'a')):
+            path = os.path.join(self.corpus_dir, name)
+            with open(path, 'w') as f:
+                f.write(name)
+            self.case_files.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_relink(self):
+        target_dir = os.path.join(self.work_dir, 'minimized')
+        self.assertEqual(list_corpus_links(target_dir), [])
+        link_corpus_files(self.case_files, target_dir)
+        self.assertEqual(len(list_corpus_links(target_dir)), 3)
+        self.assertEqual(unlink_corpus_files(target_dir), 3)
+        link_corpus_files(self.case_files[:1], target_dir)
+        self.assertEqual([os.path.realpath(path) for path in list_corpus_links(target_dir)],
+            [os.path.realpath(self.case_files[0])])
+
+    def test_refuses_other_directories(self):
+        # a corpus (or anything besides our links) is never cleared
+        with self.assertRaises(Exception):
+            unlink_corpus_files(self.corpus_dir)
+        with self.assertRaises(Exception):
+            unlink_corpus_files(self.case_files[0])
+        target_dir = link_corpus_files(self.case_files, os.path.join(self.work_dir, 'minimized'))
+        with open(os.path.join(target_dir, 'notes.txt'), 'w') as f:
+            f.write('keep')
+        with self.assertRaises(Exception):
+            unlink_corpus_files(target_dir)
+        self.assertEqual(len(os.listdir(target_dir)), 4)
+        self.assertEqual(sorted(os.listdir(self.corpus_dir)), ['a', 'b', 'sub'])
+
+    def test_shard_gcda_dirs_keep_their_index(self):
+        shard_output_dir = os.path.join(self.work_dir, 'shards')
+        for i in (0, 1, 2, 10):
+            corpus_dir, gcda_dir = shard_paths(shard_output_dir, i)
+            os.makedirs(corpus_dir)
+            if i != 1:
+                os.makedirs(gcda_dir)
+        self.assertEqual(list_shard_gcda_dirs(shard_output_dir),
+            { i: shard_paths(shard_output_dir, i)[1] for i in (0, 2, 10) })
+        self.assertEqual(list_shard_gcda_dirs(os.path.join(self.work_dir, 'none')), {})
+
+if __name__ == '__main__':
+    unittest.main()
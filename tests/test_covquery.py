@@ -0,0 +1,98 @@
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from fuzzer_cov.platform.covquery import CoverageIndex
+from fuzzer_cov.platform.tracefile import write_tracefile_record
+
+X_LINES = [(3, 2), (4, 2), (5, 0), (9, 0), (10, 0), (12, 1)]
+X_FUNCTIONS = [('_ZN2ns1fEi', 3, 2), ('g', 9, 0), ('h', 12, 1)]
+X_BRANCHES = [(4, 0, 0, 2), (4, 0, 1, 0), (9, 0, 0, None), (9, 0, 1, None)]
+
+class CoverageIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='fuzzer-cov-test-')
+        self.tracefile = os.path.join(self.work_dir, 'trace.info')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def write(self, records: list):
+        with open(self.tracefile, 'w') as f:
+            for source_file, lines, functions, branches in records:
+                write_tracefile_record(f, source_file, lines, functions, branches)
+
+    def default_records(self):
+        return [
+            ('/src/a/x.c', X_LINES, X_FUNCTIONS, X_BRANCHES),
+            ('/src/a/b/y.c', [(1, 1), (2, 1)], [('main', 1, 1)], []),
+            ('/src/z.c', [(1, 0)], [('z', 1, 0)], []),
+        ]
+
+    def test_totals(self):
+        self.write(self.default_records())
+        index = CoverageIndex.load(self.tracefile)
+        self.assertEqual(index.summary(), { 'LF': 9, 'LH': 5, 'FNF': 5, 'FNH': 3, 'BRF': 4, 'BRH': 1, 'files': 3 })
+        self.assertEqual(index.file('/src/a/x.c').totals, { 'LF': 6, 'LH': 3, 'FNF': 3, 'FNH': 2, 'BRF': 4, 'BRH': 1 })
+        self.assertEqual(index.directory('/src/a').totals, { 'LF': 8, 'LH': 5, 'FNF': 4, 'FNH': 3, 'BRF': 4, 'BRH': 1 })
+        self.assertEqual(index.directory('/src').totals, dict(index.root.totals))
+        self.assertIsNone(index.directory('/nowhere'))
+
+    def test_lines_and_functions(self):
+        self.write(self.default_records())
+        index = CoverageIndex.load(self.tracefile)
+        self.assertEqual(index.line('/src/a/x.c', 4), 2)
+        self.assertIsNone(index.line('/src/a/x.c', 6))
+        # a function ends where the next one starts
+        self.assertEqual(index.function_at('/src/a/x.c', 5).name, '_ZN2ns1fEi')
+        self.assertEqual(index.function_at('/src/a/x.c', 11).name, 'g')
+        self.assertIsNone(index.function_at('/src/a/x.c', 2))
+        g = index.function('g')[0]
+        self.assertEqual((g.start_line, g.end_line, g.lines_found, g.lines_hit), (9, 11, 2, 0))
+        self.assertEqual(index.file('/src/a/x.c').uncovered_lines(), [5, 9, 10])
+        self.assertEqual(sorted(fn.name for fn in index.uncovered_functions('/src/a')), ['g'])
+        self.assertEqual(sorted(fn.name for fn in index.uncovered_functions()), ['g', 'z'])
+
+    def test_unqualified_names(self):
+        self.write([('/src/x.cc', [(1, 1)], [('ns::f(int)', 1, 1)], [])])
+        index = CoverageIndex.load(self.tracefile)
+        self.assertEqual([fn.name for fn in index.function('ns::f')], ['ns::f(int)'])
+        self.assertEqual(index.function('ns::f', '/src/other.cc'), [])
+
+    @unittest.skipUnless(shutil.which('c++filt'), "c++filt not found")
+    def test_mangled_names(self):
+        records = [('/src/foo.cc', [(3, 1), (7, 0)], [('_ZN3foo3barEv', 3, 1), ('_ZN3foo3bazEi', 7, 0)], []),
+            ('/src/main.c', [(1, 1)], [('main', 1, 1)], [])]
+        self.write(records)
+        index = CoverageIndex.load(self.tracefile)
+        for name in ('foo::bar', 'foo::bar()', '_ZN3foo3barEv'):
+            self.assertEqual([fn.name for fn in index.function(name)], ['_ZN3foo3barEv'])
+        self.assertEqual([fn.demangled_name for fn in index.function('foo::baz')], ['foo::baz(int)'])
+        self.assertEqual([fn.demangled_name for fn in index.uncovered_functions()], ['foo::baz(int)'])
+        self.assertEqual([fn.name for fn in index.function('main')], ['main'])
+        self.write(records[1:])
+        self.assertEqual(index.refresh(force=True), 1)
+        for name in ('foo::bar', 'foo::bar()', '_ZN3foo3barEv', 'foo::baz(int)'):
+            self.assertEqual(index.function(name), [])
+
+    def test_refresh_reindexes_changed_files(self):
+        records = self.default_records()
+        self.write(records)
+        index = CoverageIndex.load(self.tracefile)
+        self.assertEqual(index.refresh(), 0)
+        records[2] = ('/src/z.c', [(1, 3)], [('z', 1, 3)], [])
+        self.write(records)
+        self.assertEqual(index.refresh(force=True), 1)
+        self.assertEqual(index.summary()['LH'], 6)
+        self.assertEqual(index.uncovered_functions('/src/z.c'), [])
+        # a removed file leaves no empty directories behind
+        self.write(records[:1] + records[2:])
+        self.assertEqual(index.refresh(force=True), 1)
+        self.assertIsNone(index.directory('/src/a/b'))
+        self.assertEqual(index.directory('/src/a').totals['LF'], 6)
+        self.assertEqual(index.function('main'), [])
+
+if __name__ == '__main__':
+    unittest.main()
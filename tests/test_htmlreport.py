@@ -0,0 +1,64 @@
+
+import os
+import shutil
+import tempfile
+import types
+import unittest
+
+from fuzzer_cov.core import CoverageReporter, Logger
+from fuzzer_cov.core.container import BuildContainerImpl, SCOPED, SINGLETON
+from fuzzer_cov.core.logger import LoggerImpl
+from fuzzer_cov.platform.htmlreport import HtmlReportRunner
+from fuzzer_cov.platform.pool import WorkerPool
+from fuzzer_cov.platform.tracefile import write_tracefile_record
+
+class HtmlReportTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='fuzzer-cov-test-')
+        self.output_dir = os.path.join(self.work_dir, 'web')
+        self.policy = types.SimpleNamespace(gen_html_output_dir=self.output_dir,
+            lcov_info_final_file=os.path.join(self.work_dir, 'trace.info'))
+        opts = types.SimpleNamespace(enable_branch_coverage=False, metrics_file=None, profile_dir=None)
+        self.container = BuildContainerImpl(opts)
+        self.container.register_impl(LoggerImpl, Logger, lifetime=SCOPED)
+        self.container.register_impl(WorkerPool, lifetime=SINGLETON)
+        self.container.register_impl(HtmlReportRunner, CoverageReporter, lifetime=SCOPED)
+
+    def tearDown(self):
+        self.container.close()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def report(self, source_files: list):
+        with open(self.policy.lcov_info_final_file, 'w') as f:
+            for source_file in source_files:
+                write_tracefile_record(f, source_file, [(1, 1), (2, 0)], [], [])
+        self.container.resolve(CoverageReporter).gen_cov_report(self.policy)
+        pages = []
+        for root, _, files in os.walk(self.output_dir):
+            pages.extend(os.path.relpath(os.path.join(root, name), self.output_dir)
+                for name in files if name.endswith('.html'))
+        return sorted(pages)
+
+    def test_stale_pages_are_removed(self):
+        self.assertEqual(self.report(['/src/a/x.c', '/src/b/y.c', '/src/b/c/z.c']),
+            ['a/index.html', 'a/x.c.gcov.html', 'b/c/index.html', 'b/c/z.c.gcov.html', 'b/index.html',
+             'b/y.c.gcov.html', 'index.html'])
+        # the prefix moves to /src/b: every page path changes
+        self.assertEqual(self.report(['/src/b/y.c', '/src/b/c/z.c']),
+            ['c/index.html', 'c/z.c.gcov.html', 'index.html', 'y.c.gcov.html'])
+        self.assertEqual(sorted(os.listdir(self.output_dir)),
+            ['.fingerprints.json', 'c', 'index.html', 'report.css', 'summary.json', 'y.c.gcov.html'])
+
+    def test_colliding_pages(self):
+        cwd = os.getcwd()
+        os.chdir(self.work_dir)
+        try:
+            pages = self.report([os.path.join(self.work_dir, 'x.c'), 'x.c', '/other/y.c'])
+        finally:
+            os.chdir(cwd)
+        prefix = os.path.relpath(self.work_dir, '/')
+        self.assertEqual([page for page in pages if page.endswith('.gcov.html')],
+            sorted([os.path.join(prefix, 'x.c.gcov.html'), os.path.join(prefix, 'x.c.1.gcov.html'), 'other/y.c.gcov.html']))
+
+if __name__ == '__main__':
+    unittest.main()
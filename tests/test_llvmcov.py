@@ -0,0 +1,163 @@
+
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import types
+import unittest
+
+from fuzzer_cov.core import CommandExecutor, CoverageCapturer, Logger
+from fuzzer_cov.core.container import BuildContainerImpl, SCOPED
+from fuzzer_cov.core.logger import LoggerImpl
+from fuzzer_cov.platform.asyncexec import AsyncCommandExecutorImpl
+from fuzzer_cov.platform.executor import CommandExecutorImpl
+from fuzzer_cov.platform.llvmcov import LLVMCovCapturer
+from fuzzer_cov.platform.tracefile import read_tracefile
+
+# stand-ins for llvm-profdata merge and llvm-cov export: each records its
+# argv, the merge writes the profraw list it was given as the profdata and
+# the export prints an lcov record for it, with noise on stderr
+_FAKE_TOOL = r'''#!{python}
+import json, os, sys
+with open(os.path.join({work_dir!r}, 'calls.jsonl'), 'a') as f:
+    f.write(json.dumps(sys.argv[1:]) + '\n')
+args = dict(arg.split('=', 1) for arg in sys.argv[2:] if '=' in arg)
+if sys.argv[1] == 'merge':
+    with open(args['-input-files']) as f, open(sys.argv[sys.argv.index('-o') + 1], 'w') as out:
+        out.write(f.read())
+else:
+    with open(args['-instr-profile']) as f:
+        profiles = f.read().split()
+    sys.stderr.write('warning: stand-in llvm-cov\n')
+    sys.stdout.write('SF:' + sys.argv[-1] + '.c\nDA:1,' + str(len(profiles)) + '\nend_of_record\n')
+'''
+
+_SOURCE = r'''
+#include <stdlib.h>
+
+static int unused(int x) {
+  return x * 2;
+}
+
+int main(int argc, char **argv) {
+  int total = 0;
+  for (int i = 1; i < argc; i++)
+    total += atoi(argv[i]);
+  return total < 0 ? 1 : 0;
+}
+'''
+
+def llvm_tools():
+    return shutil.which('clang') and shutil.which('llvm-profdata') and shutil.which('llvm-cov')
+
+class LLVMCovCaptureTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='fuzzer-cov-test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def fake_tool(self, name: str):
+        path = os.path.join(self.work_dir, name)
+        with open(path, 'w') as f:
+            f.write(_FAKE_TOOL.format(python=sys.executable, work_dir=self.work_dir))
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+        return path
+
+    def container(self, executor: type, llvm_profdata_path: str, llvm_cov_path: str):
+        opts = types.SimpleNamespace(llvm_profdata_path=llvm_profdata_path, llvm_cov_path=llvm_cov_path,
+            source_dir=self.work_dir, profraw_dir=os.path.join(self.work_dir, 'profraw'),
+            fuzzer_path=os.path.join(self.work_dir, 'fuzzer'), max_concurrency=2, command_timeout=None,
+            command_log_dir=os.path.join(self.work_dir, 'logs'), metrics_file=None, profile_dir=None)
+        container = BuildContainerImpl(opts)
+        container.register_impl(LoggerImpl, Logger, lifetime=SCOPED)
+        container.register_impl(executor, CommandExecutor, lifetime=SCOPED)
+        container.register_impl(LLVMCovCapturer, CoverageCapturer, lifetime=SCOPED)
+        return container
+
+    def profile_dir(self, name: str, profiles: int, binary: str=None):
+        directory = os.path.join(self.work_dir, name)
+        os.makedirs(directory)
+        for i in range(profiles):
+            open(os.path.join(directory, f"{i}.profraw"), 'w').close()
+        if binary:
+            with open(os.path.join(directory, 'llvm-cov.binary'), 'w') as f:
+                f.write(binary)
+        return directory
+
+    def check_capture_many(self, executor: type):
+        container = self.container(executor, self.fake_tool('llvm-profdata'), self.fake_tool('llvm-cov'))
+        try:
+            capturer = container.resolve(CoverageCapturer)
+            jobs = [
+                (self.profile_dir('a', 2, '/bin/a'), os.path.join(self.work_dir, 'a.info')),
+                (self.profile_dir('b', 3), os.path.join(self.work_dir, 'b.info')),
+                (self.profile_dir('c', 0), os.path.join(self.work_dir, 'c.info')),
+            ]
+            capturer.capture_many(jobs)
+        finally:
+            container.close()
+        # stdout alone makes the tracefile, stderr stays out of it
+        self.assertEqual([record.lines for record in read_tracefile(jobs[0][1])], [{ 1: 2 }])
+        self.assertEqual([record.source_file for record in read_tracefile(jobs[1][1])],
+            [os.path.join(self.work_dir, 'fuzzer.c')])
+        self.assertEqual([record.lines for record in read_tracefile(jobs[1][1])], [{ 1: 3 }])
+        self.assertEqual(os.path.getsize(jobs[2][1]), 0)
+        # the intermediate profraw lists and profdata are removed
+        self.assertEqual([name for name in os.listdir(self.work_dir) if name.endswith(('.list', '.profdata'))], [])
+        with open(os.path.join(self.work_dir, 'calls.jsonl')) as f:
+            calls = sorted(f.read().splitlines())
+        self.assertEqual(len(calls), 4)
+        self.assertTrue(all('>' not in call for call in calls))
+
+    def test_capture_many(self):
+        self.check_capture_many(CommandExecutorImpl)
+
+    def test_capture_many_async(self):
+        self.check_capture_many(AsyncCommandExecutorImpl)
+
+    def test_export_failure(self):
+        container = self.container(CommandExecutorImpl, self.fake_tool('llvm-profdata'), '/bin/false')
+        try:
+            capturer = container.resolve(CoverageCapturer)
+            with self.assertRaises(Exception):
+                capturer.capture(self.profile_dir('a', 1), os.path.join(self.work_dir, 'a.info'))
+        finally:
+            container.close()
+
+    @unittest.skipUnless(llvm_tools(), "clang/llvm-profdata/llvm-cov not found")
+    def test_capture_matches_llvm_cov(self):
+        source_file = os.path.join(self.work_dir, 'prog.c')
+        with open(source_file, 'w') as f:
+            f.write(_SOURCE)
+        binary = os.path.join(self.work_dir, 'prog')
+        subprocess.check_call(['clang', '-fprofile-instr-generate', '-fcoverage-mapping', '-O0',
+            '-o', binary, source_file])
+        container = self.container(CommandExecutorImpl, 'llvm-profdata', 'llvm-cov')
+        try:
+            capturer = container.resolve(CoverageCapturer)
+            counter_dir = os.path.join(self.work_dir, 'counters')
+            env = dict(os.environ, **capturer.replay_env(counter_dir, binary))
+            subprocess.call([binary, '1', '2'], env=env)
+            subprocess.call([binary, '-5'], env=env)
+            output_file = os.path.join(self.work_dir, 'prog.info')
+            capturer.capture(counter_dir, output_file)
+        finally:
+            container.close()
+        profdata_file = os.path.join(self.work_dir, 'expected.profdata')
+        profraw_files = [os.path.join(counter_dir, name) for name in os.listdir(counter_dir) if name.endswith('.profraw')]
+        subprocess.check_call(['llvm-profdata', 'merge', '-sparse', '-o', profdata_file] + profraw_files)
+        expected_file = os.path.join(self.work_dir, 'expected.info')
+        with open(expected_file, 'w') as f:
+            subprocess.check_call(['llvm-cov', 'export', '-format=lcov', f'-instr-profile={profdata_file}', binary],
+                stdout=f)
+        records = { record.source_file: record.lines for record in read_tracefile(output_file) }
+        expected = { record.source_file: record.lines for record in read_tracefile(expected_file) }
+        self.assertEqual(records, expected)
+        self.assertEqual(records[source_file][5], 0)
+        self.assertEqual(records[source_file][9], 2)
+
+if __name__ == '__main__':
+    unittest.main()
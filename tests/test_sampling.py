@@ -0,0 +1,100 @@
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from fuzzer_cov.platform.lcov import filter_lcov_file
+from fuzzer_cov.platform.sampling import sample_size, stratified_sample, split_groups, extrapolate_coverage, \
+    estimate_coverage, exact_coverage, strip_sample_arguments
+from fuzzer_cov.platform.tracefile import merge_tracefiles, write_tracefile_record
+
+class SamplingTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='fuzzer-cov-test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def corpus(self, sizes: dict):
+        case_files = []
+        for subdir, lengths in sorted(sizes.items()):
+            os.makedirs(os.path.join(self.work_dir, subdir), exist_ok=True)
+            for i, length in enumerate(lengths):
+                path = os.path.join(self.work_dir, subdir, f"{i}")
+                with open(path, 'wb') as f:
+                    f.write(b'x' * length)
+                case_files.append(path)
+        return case_files
+
+    def test_sample_size(self):
+        self.assertEqual(sample_size(0.1, 95), 10)
+        self.assertEqual(sample_size(0.001, 95), 1)
+        self.assertEqual(sample_size(30, 95), 30)
+        self.assertEqual(sample_size(300, 95), 95)
+        self.assertEqual(sample_size(0.5, 0), 0)
+
+    def test_stratified_sample(self):
+        case_files = self.corpus({ 'a': [1] * 60 + [100] * 30, 'b': [1] * 9 + [5000] })
+        sample = stratified_sample(case_files, self.work_dir, 20, seed=3)
+        self.assertEqual(sum(map(len, sample.values())), 20)
+        # every stratum is represented, the large ones proportionally
+        self.assertEqual(len(sample), 4)
+        self.assertEqual([len(sample[key]) for key in sorted(sample)], [12, 6, 1, 1])
+        self.assertEqual(sample, stratified_sample(case_files, self.work_dir, 20, seed=3))
+        self.assertEqual(sum(map(len, stratified_sample(case_files, self.work_dir, 2).values())), 2)
+
+    def test_split_groups(self):
+        case_files = self.corpus({ 'a': [1] * 10, 'b': [1] * 7 })
+        sample = stratified_sample(case_files, self.work_dir, 12)
+        groups = split_groups(sample, 4)
+        self.assertEqual(len(groups), 4)
+        self.assertEqual(sorted(path for group in groups for path in group), sorted(sum(sample.values(), [])))
+        self.assertTrue(all(len(group) == 3 for group in groups))
+        self.assertEqual(len(split_groups(sample, 20)), 12)
+
+    def test_extrapolate_bounds(self):
+        common = set(range(50))
+        group_sets = [common | { 100 + i } for i in range(4)]
+        stats = extrapolate_coverage(group_sets, 200, 0.1, seed=1)
+        self.assertEqual(stats['observed'], 54)
+        self.assertTrue(stats['observed'] <= stats['lower'] <= stats['estimate'] <= stats['upper'] <= 200)
+        self.assertGreater(stats['estimate'], stats['observed'])
+        # nothing seen by a single group only: no unseen points to expect
+        stats = extrapolate_coverage([common, common], 200, 0.1)
+        self.assertEqual((stats['lower'], stats['estimate'], stats['upper']), (50, 50, 50))
+
+    def tracefile(self, name: str, records: list):
+        path = os.path.join(self.work_dir, name)
+        with open(path, 'w') as f:
+            for source_file, lines, functions in records:
+                write_tracefile_record(f, source_file, lines, functions, [])
+        return path
+
+    def test_observed_matches_final_tracefile(self):
+        # the groups are raw captures: function-start lines and excluded
+        # sources are only dropped from the final tracefile
+        groups = [
+            self.tracefile('g0.info', [('/src/x.c', [(1, 1), (2, 1), (3, 0)], [('f', 1, 1)]),
+                ('/usr/include/y.h', [(1, 4)], [])]),
+            self.tracefile('g1.info', [('/src/x.c', [(1, 1), (2, 0), (3, 2), (7, 1)], [('f', 1, 1), ('g', 7, 1)]),
+                ('/usr/include/y.h', [(1, 2), (2, 1)], [])]),
+        ]
+        final_file = os.path.join(self.work_dir, 'final.info')
+        merge_tracefiles(groups, final_file)
+        filter_lcov_file(final_file, source_filter=lambda path: not path.startswith('/usr/'))
+        exact = exact_coverage(final_file)['lines']
+        self.assertEqual((exact['found'], exact['observed']), (2, 2))
+        estimate = estimate_coverage(groups, final_file, 2, 10, seed=1)['lines']
+        self.assertEqual((estimate['found'], estimate['observed']), (exact['found'], exact['observed']))
+        self.assertTrue(estimate['lower'] <= estimate['estimate'] <= estimate['upper'] <= exact['found'])
+        # a group that dumped no counters still counts as a sampling unit
+        estimate = estimate_coverage(groups + [None], final_file, 3, 10, seed=1)
+        self.assertEqual((estimate['groups'], estimate['lines']['observed']), (3, exact['observed']))
+
+    def test_strip_sample_arguments(self):
+        self.assertEqual(strip_sample_arguments(['-o', 'out', '--sample', '0.1', '--sample-groups=4',
+            '--sample-seed', '2', '--sample-continue', '-j', '4']), ['-o', 'out', '-j', '4'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from fuzzer_cov.platform.gcov import _run_gcov, write_lcov_records
+from fuzzer_cov.platform.tracefile import merge_tracefiles, read_tracefile
+
+_SOURCE = r'''
+#include <stdlib.h>
+
+static int classify(int x) {
+  if (x < 0) return -1;
+  if (x == 0) return 0;
+  return x > 10 ? 2 : 1;
+}
+
+static int unused(int x) {
+  return x * 2;
+}
+
+int main(int argc, char **argv) {
+  int total = 0;
+  for (int i = 1; i < argc; i++)
+    total += classify(atoi(argv[i]));
+  return total < 0 ? 1 : 0;
+}
+'''
+
+def counts_of(tracefile: str):
+    # everything lcov -a sums: DA, FN/FNDA and BRDA per source file
+    return { record.source_file: (record.lines, record.functions, record.branches)
+        for record in read_tracefile(tracefile) }
+
+class TracefileMergeTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='fuzzer-cov-test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def write(self, name: str, content: str):
+        path = os.path.join(self.work_dir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_lcov_add_rules(self):
+        # DA and FNDA are summed, a BRDA stays '-' only if it is '-' in every
+        # input, FN keeps the first line seen, records of one file merge
+        # across test names
+        a = self.write('a.info',
+            "TN:a\nSF:/src/x.c\nFN:3,f\nFN:9,g\nFNDA:2,f\nFNDA:0,g\n"
+            "BRDA:4,0,0,1\nBRDA:4,0,1,-\nBRDA:5,0,0,-\nBRDA:5,0,1,-\n"
+            "DA:3,2\nDA:4,2\nDA:5,0\nDA:9,0\nend_of_record\n"
+            "TN:a\nSF:/src/y.c\nFN:1,h\nFNDA:1,h\nDA:1,1\nend_of_record\n")
+        b = self.write('b.info',
+            "TN:b\nSF:/src/x.c\nFN:3,f\nFN:9,g\nFN:12,k\nFNDA:1,f\nFNDA:4,g\nFNDA:0,k\n"
+            "BRDA:4,0,0,-\nBRDA:4,0,1,3\nBRDA:5,0,0,-\nBRDA:5,0,1,-\n"
+            "DA:3,1\nDA:4,1\nDA:5,0\nDA:9,4\nDA:10,4\nDA:12,0\nend_of_record\n")
+        merged = os.path.join(self.work_dir, 'merged.info')
+        merge_tracefiles([a, b], merged)
+        counts = counts_of(merged)
+        lines, functions, branches = counts['/src/x.c']
+        self.assertEqual(lines, { 3: 3, 4: 3, 5: 0, 9: 4, 10: 4, 12: 0 })
+        self.assertEqual(functions, { 'f': (3, 3), 'g': (9, 4), 'k': (12, 0) })
+        self.assertEqual(branches, { (4, 0, 0): 1, (4, 0, 1): 3, (5, 0, 0): None, (5, 0, 1): None })
+        self.assertEqual(counts['/src/y.c'], ({ 1: 1 }, { 'h': (1, 1) }, {}))
+
+    def test_lcov_2_function_records(self):
+        a = self.write('a.info', "SF:/src/x.c\nFN:3,7,f\nFNDA:1,f\nDA:3,1\nend_of_record\n")
+        b = self.write('b.info', "SF:/src/x.c\nFN:3,f\nFNDA:2,f\nDA:3,2\nend_of_record\n")
+        merged = os.path.join(self.work_dir, 'merged.info')
+        merge_tracefiles([a, b], merged)
+        self.assertEqual(counts_of(merged)['/src/x.c'][1], { 'f': (3, 3) })
+
+    def build(self):
+        source_file = self.write('prog.c', _SOURCE)
+        binary = os.path.join(self.work_dir, 'prog')
+        subprocess.check_call(['gcc', '--coverage', '-O0', '-o', binary, source_file], cwd=self.work_dir)
+        return binary
+
+    def gcda_files(self):
+        return sorted(os.path.join(self.work_dir, name) for name in os.listdir(self.work_dir) if name.endswith('.gcda'))
+
+    def zero(self):
+        for gcda_file in self.gcda_files():
+            os.unlink(gcda_file)
+
+    def gcov_capture(self, name: str):
+        output_file = os.path.join(self.work_dir, name)
+        with open(output_file, 'w') as f:
+            write_lcov_records(f, _run_gcov('gcov', self.gcda_files(), True), branch_coverage=True)
+        return output_file
+
+    @unittest.skipUnless(shutil.which('gcc') and shutil.which('gcov'), "gcc/gcov not found")
+    def test_merge_matches_accumulated_counters(self):
+        # merging the captures of two runs gives the counts gcov reports when
+        # both runs accumulate into the same .gcda files
+        binary = self.build()
+        runs = [[binary, '-3', '5'], [binary, '0', '42', '7']]
+        captures = []
+        for i, run in enumerate(runs):
+            self.zero()
+            subprocess.call(run)
+            captures.append(self.gcov_capture(f"run{i}.info"))
+        self.zero()
+        for run in runs:
+            subprocess.call(run)
+        accumulated = self.gcov_capture('accumulated.info')
+        merged = os.path.join(self.work_dir, 'merged.info')
+        merge_tracefiles(captures, merged)
+        self.assertEqual(counts_of(merged), counts_of(accumulated))
+
+    @unittest.skipUnless(shutil.which('gcc') and shutil.which('lcov'), "gcc/lcov not found")
+    def test_merge_matches_lcov(self):
+        binary = self.build()
+        rc = ['--rc', 'lcov_branch_coverage=1']
+        captures = []
+        for i, run in enumerate([[binary, '-3', '5'], [binary, '0', '42', '7'], [binary]]):
+            self.zero()
+            subprocess.call(run)
+            capture = os.path.join(self.work_dir, f"run{i}.info")
+            subprocess.check_call(['lcov', '-q', '-c', '-d', self.work_dir, '-o', capture] + rc)
+            captures.append(capture)
+        expected = os.path.join(self.work_dir, 'lcov.info')
+        cmd = ['lcov', '-q']
+        for capture in captures:
+            cmd += ['-a', capture]
+        subprocess.check_call(cmd + ['-o', expected] + rc)
+        merged = os.path.join(self.work_dir, 'merged.info')
+        merge_tracefiles(captures, merged)
+        self.assertEqual(counts_of(merged), counts_of(expected))
+
+if __name__ == '__main__':
+    unittest.main()